@@ -0,0 +1,63 @@
+"""
+Compares two result files written by benchmarks/run.py.
+
+Usage:
+    python benchmarks/compare.py baseline.json results.json [--threshold 1.1]
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument(
+        "--metric", default="p50_sec", help="Latency metric to compare (default: p50_sec)"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.1,
+        help="Flag benchmarks at least this many times slower (default: 1.1)",
+    )
+    args = parser.parse_args()
+
+    baseline = load(args.baseline)
+    current = load(args.current)
+    if baseline.get("config") != current.get("config"):
+        print("Warning: The two runs used different configurations, the numbers may not be comparable.\n")
+    print(f"baseline: tig {baseline.get('tig_version')}, python {baseline.get('python')}")
+    print(f"current:  tig {current.get('tig_version')}, python {current.get('python')}\n")
+    print(f"{'benchmark':<34}{'baseline':>12}{'current':>12}{'ratio':>8}{'peak mem':>18}")
+
+    regressions = 0
+    for name, result in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<34}{'-':>12}{result[args.metric] * 1000:>10.2f}ms")
+            continue
+        ratio = result[args.metric] / old[args.metric] if old[args.metric] else float("inf")
+        flag = ""
+        if ratio >= args.threshold:
+            flag = "  slower"
+            regressions += 1
+        elif ratio <= 1 / args.threshold:
+            flag = "  faster"
+        memory = f"{old['peak_memory_kb']} -> {result['peak_memory_kb']} KB"
+        print(
+            f"{name:<34}{old[args.metric] * 1000:>10.2f}ms{result[args.metric] * 1000:>10.2f}ms"
+            f"{ratio:>7.2f}x{memory:>18}{flag}"
+        )
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
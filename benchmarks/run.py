@@ -0,0 +1,349 @@
+"""
+Benchmarks the tool hot paths on a synthetic repository.
+
+Usage:
+    python benchmarks/run.py --files 2000 --lines 300 --output results.json
+    python benchmarks/compare.py baseline.json results.json
+
+Each benchmark is run `--repeat` times. The first run is reported on its own
+(it pays for cold caches: file index, parsers, symbol index), the latency
+percentiles are taken over all runs. Peak memory is measured with tracemalloc
+in a separate run, so that tracing does not skew the timings.
+"""
+
+import argparse
+import contextlib
+import importlib.metadata
+import io
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic_repo import LANGUAGE_EXTENSIONS, RepoConfig, generate_repo, generate_source  # noqa: E402
+
+from tig.services.workspace import bump_workspace_generation  # noqa: E402
+from tig.tools.apply_diff import apply_diff  # noqa: E402
+from tig.tools.list_code_definitions import get_code_definitions  # noqa: E402
+from tig.tools.list_files import list_files  # noqa: E402
+from tig.tools.read_file import read_file  # noqa: E402
+from tig.tools.search_files import regex_search_files  # noqa: E402
+from tig.utils.syntax_checker import check_syntax  # noqa: E402
+from tig.utils.xml import parse_tool_call  # noqa: E402
+
+# Lines of the large file used by the read_file and check_syntax benchmarks
+LARGE_FILE_LINES = 20_000
+# Lines read by each ranged read_file call
+READ_RANGE_LINES = 200
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def run_benchmark(
+    fn: Callable[[], object],
+    repeat: int,
+    setup: Callable[[], None] | None = None,
+) -> dict:
+    """Times `fn` `repeat` times (calling `setup` untimed before each run), then measures its peak memory."""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started_at = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started_at)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "runs": repeat,
+        "first_sec": samples[0],
+        "p50_sec": percentile(samples, 0.5),
+        "p90_sec": percentile(samples, 0.9),
+        "p99_sec": percentile(samples, 0.99),
+        "mean_sec": statistics.fmean(samples),
+        "max_sec": max(samples),
+        "peak_memory_kb": peak // 1024,
+    }
+
+
+def _quiet(fn: Callable[[], object]) -> Callable[[], object]:
+    """Drops what `fn` prints, e.g. the diff shown by apply_diff."""
+
+    def wrapper():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn()
+
+    return wrapper
+
+
+def _non_empty_listing(fn: Callable[[], str]) -> Callable[[], str]:
+    """Fails the benchmark if `fn` lists no files, which would time a broken code path."""
+
+    def wrapper():
+        result = fn()
+        if result.startswith("No files found"):
+            raise RuntimeError(f"Expected a non-empty listing, got: {result}")
+        return result
+
+    return wrapper
+
+
+def _pick_subdirectory() -> str:
+    """A top-level directory of the generated repository that has subdirectories."""
+    for name in sorted(os.listdir(".")):
+        if name in ("bench", "build") or name.startswith(".") or not os.path.isdir(name):
+            continue
+        if any(os.path.isdir(os.path.join(name, child)) for child in os.listdir(name)):
+            return name
+    return "."
+
+
+def _write_large_files(rng: random.Random) -> dict[str, str]:
+    os.makedirs("bench", exist_ok=True)
+    paths = {}
+    for language in ("python", "javascript"):
+        path = os.path.join("bench", f"large.{LANGUAGE_EXTENSIONS[language]}")
+        with open(path, "w") as f:
+            f.write(generate_source(language, rng, LARGE_FILE_LINES))
+        paths[language] = path
+    return paths
+
+
+def _apply_diff_message(start_line: int, lines: list[str]) -> str:
+    search = "\n".join(lines)
+    replace = "\n".join(line.replace("result", "values") for line in lines)
+    return f"<<<<<<< SEARCH\n:start_line:{start_line}\n-------\n{search}\n=======\n{replace}\n>>>>>>> REPLACE"
+
+
+def build_benchmarks(rng: random.Random) -> dict[str, tuple[Callable, Callable | None]]:
+    """Returns name -> (function, setup) of the benchmarks to run in the current directory."""
+    large = _write_large_files(rng)
+    subdirectory = _pick_subdirectory()
+    with open(large["python"], "r") as f:
+        large_python = f.read()
+    python_lines = large_python.splitlines()
+
+    def random_range() -> dict:
+        start = rng.randrange(1, LARGE_FILE_LINES - READ_RANGE_LINES)
+        return {
+            "path": large["python"],
+            "start_line": str(start),
+            "end_line": str(start + READ_RANGE_LINES - 1),
+        }
+
+    def search(regex: str, file_pattern: str = "*", index: bool = False):
+        def fn():
+            # The search cache is keyed by the workspace generation
+            bump_workspace_generation()
+            if index:
+                os.environ["TIG_SEARCH_INDEX"] = "true"
+            try:
+                return regex_search_files(
+                    {"path": ".", "regex": regex, "file_pattern": file_pattern},
+                    auto_approve=True,
+                )
+            finally:
+                os.environ.pop("TIG_SEARCH_INDEX", None)
+
+        return fn
+
+    diff_start = LARGE_FILE_LINES // 2
+    diff = _apply_diff_message(diff_start, python_lines[diff_start - 1 : diff_start + 9])
+
+    def restore_large_python():
+        with open(large["python"], "w") as f:
+            f.write(large_python)
+
+    write_message = (
+        f"I will create the file.\n<write_to_file>\n<path>bench/new.py</path>\n<content>\n"
+        f"{large_python}</content>\n<line_count>{LARGE_FILE_LINES}</line_count>\n</write_to_file>"
+    )
+    diff_message = (
+        f"Let me fix this.\n<apply_diff>\n<path>{large['python']}</path>\n<diff>\n"
+        f"{diff}\n</diff>\n</apply_diff>"
+    )
+
+    return {
+        "list_files_recursive": (
+            _non_empty_listing(lambda: list_files({"path": ".", "recursive": "true"})),
+            None,
+        ),
+        "list_files_recursive_subdir": (
+            _non_empty_listing(
+                lambda: list_files({"path": subdirectory, "recursive": "true"})
+            ),
+            None,
+        ),
+        "list_files_top_level": (
+            lambda: list_files({"path": ".", "recursive": "false"}),
+            None,
+        ),
+        "regex_search_files_literal": (search("TODO: cache"), None),
+        "regex_search_files_regex": (search(r"def \w+_\d+\(", "*.py"), None),
+        "regex_search_files_index": (search("TODO: cache", index=True), None),
+        "read_file_range": (
+            lambda: read_file(random_range(), auto_approve=True),
+            None,
+        ),
+        "read_file_whole_large": (
+            lambda: read_file({"path": large["javascript"]}, auto_approve=True),
+            None,
+        ),
+        "get_code_definitions_recursive": (
+            lambda: get_code_definitions(".", recursive=True),
+            None,
+        ),
+        "check_syntax_large_python": (
+            lambda: check_syntax(large_python, "py"),
+            None,
+        ),
+        "apply_diff_large_python": (
+            _quiet(
+                lambda: apply_diff(
+                    {"path": large["python"], "diff": diff}, "code", auto_approve=True
+                )
+            ),
+            restore_large_python,
+        ),
+        "parse_tool_call_write_to_file": (
+            lambda: parse_tool_call(write_message),
+            None,
+        ),
+        "parse_tool_call_apply_diff": (
+            lambda: parse_tool_call(diff_message),
+            None,
+        ),
+    }
+
+
+def parse_languages(value: str) -> dict[str, float]:
+    languages = {}
+    for item in value.split(","):
+        name, _, share = item.partition("=")
+        name = name.strip()
+        if name not in LANGUAGE_EXTENSIONS:
+            raise argparse.ArgumentTypeError(
+                f"unknown language '{name}', expected one of {', '.join(LANGUAGE_EXTENSIONS)}"
+            )
+        languages[name] = float(share or 1)
+    return languages
+
+
+def get_tig_version() -> str:
+    try:
+        return importlib.metadata.version("tig-code")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def main():
+    defaults = RepoConfig()
+    parser = argparse.ArgumentParser(description="Benchmark Tig's tools on a synthetic repository.")
+    parser.add_argument("--files", type=int, default=defaults.file_count, help="Number of source files")
+    parser.add_argument("--lines", type=int, default=defaults.lines_per_file, help="Lines per source file")
+    parser.add_argument(
+        "--languages",
+        type=parse_languages,
+        default=defaults.languages,
+        help="Language mix, e.g. 'python=0.5,javascript=0.3,text=0.2'",
+    )
+    parser.add_argument(
+        "--nested-gitignore-every",
+        type=int,
+        default=defaults.nested_gitignore_every,
+        help="Add a .gitignore to every n-th directory (0 for none)",
+    )
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per benchmark")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--only", help="Comma separated names of the benchmarks to run")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    config = RepoConfig(
+        file_count=args.files,
+        lines_per_file=args.lines,
+        languages=args.languages,
+        nested_gitignore_every=args.nested_gitignore_every,
+        seed=args.seed,
+    )
+    output = os.path.abspath(args.output) if args.output else None
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="tig-bench-") as root:
+        started_at = time.perf_counter()
+        repo_stats = generate_repo(root, config)
+        print(
+            f"Generated {repo_stats['files']} files in {repo_stats['dirs']} directories "
+            f"({time.perf_counter() - started_at:.1f}s)"
+        )
+        os.chdir(root)
+        try:
+            benchmarks = build_benchmarks(random.Random(args.seed))
+            if args.only:
+                selected = {name.strip() for name in args.only.split(",")}
+                benchmarks = {k: v for k, v in benchmarks.items() if k in selected}
+            results = {}
+            print(f"\n{'benchmark':<34}{'first':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'peak mem':>12}")
+            for name, (fn, setup) in benchmarks.items():
+                result = run_benchmark(fn, args.repeat, setup)
+                results[name] = result
+                print(
+                    f"{name:<34}"
+                    f"{result['first_sec'] * 1000:>8.2f}ms"
+                    f"{result['p50_sec'] * 1000:>8.2f}ms"
+                    f"{result['p90_sec'] * 1000:>8.2f}ms"
+                    f"{result['p99_sec'] * 1000:>8.2f}ms"
+                    f"{result['peak_memory_kb']:>9} KB"
+                )
+        finally:
+            os.chdir(original_dir)
+
+    report = {
+        "tig_version": get_tig_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "files": config.file_count,
+            "lines": config.lines_per_file,
+            "languages": config.languages,
+            "nested_gitignore_every": config.nested_gitignore_every,
+            "repeat": args.repeat,
+            "seed": config.seed,
+        },
+        "repo": repo_stats,
+        # ru_maxrss is in KB on Linux, in bytes on macOS
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        // (1024 if sys.platform == "darwin" else 1),
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
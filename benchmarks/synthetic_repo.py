@@ -0,0 +1,177 @@
+"""
+Generates synthetic repositories for the benchmarks.
+
+The layout is deterministic for a given seed: source files spread over
+nested directories, a configurable mix of languages, and .gitignore files at
+several depths that ignore some of the generated build output and logs.
+"""
+
+import os
+import random
+from dataclasses import dataclass, field
+
+LANGUAGE_EXTENSIONS = {
+    "python": "py",
+    "javascript": "js",
+    "typescript": "ts",
+    "text": "md",
+}
+
+WORDS = [
+    "alpha", "beta", "gamma", "delta", "epsilon", "user", "order", "cache",
+    "index", "parse", "render", "session", "token", "stream", "buffer", "query",
+]
+
+
+@dataclass
+class RepoConfig:
+    file_count: int = 1000
+    lines_per_file: int = 200
+    # language -> share of the files
+    languages: dict[str, float] = field(
+        default_factory=lambda: {
+            "python": 0.5,
+            "javascript": 0.2,
+            "typescript": 0.2,
+            "text": 0.1,
+        }
+    )
+    files_per_dir: int = 20
+    dirs_per_dir: int = 4
+    # Every n-th directory gets its own .gitignore (0 for none besides the root one)
+    nested_gitignore_every: int = 5
+    seed: int = 0
+
+
+def _name(rng: random.Random) -> str:
+    return f"{rng.choice(WORDS)}_{rng.choice(WORDS)}"
+
+
+def _python_source(rng: random.Random, lines: int) -> str:
+    out = ["import os", "import re", ""]
+    while len(out) < lines:
+        name = _name(rng)
+        if rng.random() < 0.3:
+            class_name = name.title().replace("_", "")
+            out += [
+                f"class {class_name}:",
+                f"    def __init__(self, {name}):",
+                f"        self.{name} = {name}",
+                "",
+                f"    def get_{name}(self):",
+                f"        return self.{name}  # TODO: cache {name}",
+                "",
+            ]
+        else:
+            out += [
+                f"def {name}_{len(out)}(value, limit=10):",
+                "    result = [value] * limit",
+                "    for i in range(limit):",
+                f"        result[i] = '{name}' + str(i)",
+                "    return result",
+                "",
+            ]
+    return "\n".join(out[:lines]) + "\n"
+
+
+def _javascript_source(rng: random.Random, lines: int, typed: bool) -> str:
+    arg = "value: string" if typed else "value"
+    out = ["import fs from 'fs';", ""]
+    while len(out) < lines:
+        name = _name(rng)
+        if rng.random() < 0.3:
+            class_name = name.title().replace("_", "")
+            out += [
+                f"export class {class_name} {{",
+                f"  constructor({arg}) {{",
+                f"    this.{name} = value;",
+                "  }",
+                f"  get{class_name}() {{",
+                f"    return this.{name}; // TODO: cache {name}",
+                "  }",
+                "}",
+                "",
+            ]
+        else:
+            out += [
+                f"export function {name}{len(out)}({arg}) {{",
+                f"  const items = [value, '{name}'];",
+                "  return items.map((item) => item + '!');",
+                "}",
+                "",
+            ]
+    return "\n".join(out[:lines]) + "\n"
+
+
+def _text_source(rng: random.Random, lines: int) -> str:
+    return "\n".join(
+        " ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines)
+    ) + "\n"
+
+
+def generate_source(language: str, rng: random.Random, lines: int) -> str:
+    if language == "python":
+        return _python_source(rng, lines)
+    if language in ("javascript", "typescript"):
+        return _javascript_source(rng, lines, typed=language == "typescript")
+    return _text_source(rng, lines)
+
+
+def generate_repo(root: str, config: RepoConfig) -> dict[str, int]:
+    """
+    Writes a synthetic repository to `root` (which must be empty or missing).
+    Returns counts of what was generated.
+    """
+    rng = random.Random(config.seed)
+    languages = list(config.languages)
+    weights = [config.languages[language] for language in languages]
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".gitignore"), "w") as f:
+        f.write("*.log\nbuild/\n")
+
+    stats = {"files": 0, "ignored_files": 0, "dirs": 0, "gitignores": 1}
+    pending = [""]
+    dir_number = 0
+    while stats["files"] < config.file_count:
+        rel_dir = pending.pop(0) if pending else ""
+        abs_dir = os.path.join(root, rel_dir)
+        os.makedirs(abs_dir, exist_ok=True)
+        stats["dirs"] += 1
+        dir_number += 1
+        if (
+            rel_dir
+            and config.nested_gitignore_every
+            and dir_number % config.nested_gitignore_every == 0
+        ):
+            # Ignore the generated fixtures, except the ones a negation re-includes
+            with open(os.path.join(abs_dir, ".gitignore"), "w") as f:
+                f.write("fixtures/\n*.tmp\n!keep.tmp\n")
+            os.makedirs(os.path.join(abs_dir, "fixtures"), exist_ok=True)
+            for i in range(3):
+                fixture = os.path.join(abs_dir, "fixtures", f"fixture_{i}.json")
+                with open(fixture, "w") as f:
+                    f.write("{}\n")
+            for name in ("scratch.tmp", "keep.tmp"):
+                with open(os.path.join(abs_dir, name), "w") as f:
+                    f.write("temporary\n")
+            stats["gitignores"] += 1
+            stats["ignored_files"] += 4
+        if dir_number % 7 == 0:
+            os.makedirs(os.path.join(abs_dir, "build"), exist_ok=True)
+            with open(os.path.join(abs_dir, "build", "bundle.js"), "w") as f:
+                f.write("// generated\n" * 50)
+            with open(os.path.join(abs_dir, "debug.log"), "w") as f:
+                f.write("log line\n" * 50)
+            stats["ignored_files"] += 2
+
+        for _ in range(min(config.files_per_dir, config.file_count - stats["files"])):
+            language = rng.choices(languages, weights)[0]
+            ext = LANGUAGE_EXTENSIONS[language]
+            path = os.path.join(abs_dir, f"{_name(rng)}_{stats['files']}.{ext}")
+            with open(path, "w") as f:
+                f.write(generate_source(language, rng, config.lines_per_file))
+            stats["files"] += 1
+        for i in range(config.dirs_per_dir):
+            child = os.path.join(rel_dir, f"{rng.choice(WORDS)}_{dir_number}_{i}")
+            pending.append(child)
+    return stats
@@ -10,6 +10,8 @@ from dotenv import load_dotenv
 from tig.workflows.tig import TigWorkflow
 from tig.utils.intro import print_intro
 from tig.services.llms import get_llm
+from tig.services.tracing import DEFAULT_TRACE_FILE, Tracer, format_trace_summary
+from tig.services.usage import SessionUsage, format_tool_outputs
 
 
 async def cli():
@@ -29,6 +31,18 @@ async def cli():
         action="store_true",
         help="Automatically approve actions without user confirmation (use with caution).",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the LLM response as it is generated, and stop the generation as soon as a tool call that is not read-only is complete.",
+    )
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        const=DEFAULT_TRACE_FILE,
+        metavar="FILE",
+        help=f"Record timed spans of each task (LLM calls, tools, approvals) to a JSONL file (default: {DEFAULT_TRACE_FILE}) and print a summary at the end of each task.",
+    )
     parser.add_argument(
         "--verbose-prompt",
         action="store_true",
@@ -57,6 +71,8 @@ async def cli():
 
     llm, provider, model_name = get_llm()
     print_intro(args.mode, provider, model_name, args.auto_approve)
+    tracer = Tracer(args.trace) if args.trace else None
+    session_usage = SessionUsage()
 
     long_input_mode = False
 
@@ -98,20 +114,42 @@ async def cli():
             args.mode = new_mode
             print_intro(args.mode, provider, model_name, args.auto_approve)
             continue
+        if new_task.lower() == "/usage":
+            print(f"\nSession usage: {session_usage.totals.format()}")
+            largest = format_tool_outputs(session_usage.largest_tool_outputs())
+            if largest:
+                print(f"Largest tool outputs sent to the LLM:\n{largest}")
+            print()
+            continue
         if new_task.lower().startswith("/"):
             print(
-                "\n❌ Invalid command. Type '/exit' to quit or '/mode <mode_name>' to switch modes.\n"
+                "\n❌ Invalid command. Type '/exit' to quit, '/mode <mode_name>' to switch modes or '/usage' to show the session's token usage.\n"
             )
             continue
         workflow = TigWorkflow(
             llm=llm,
             mode=args.mode,
+            provider=provider,
+            model=model_name,
             auto_approve=args.auto_approve,
             verbose_prompt=args.verbose_prompt,
+            stream=args.stream,
+            tracer=tracer,
+            session_usage=session_usage,
             timeout=3600,
         )
         # draw_all_possible_flows(workflow)
-        await workflow.run(task=new_task)
+        if tracer is None:
+            await workflow.run(task=new_task)
+            continue
+        tracer.start_trace(
+            "task", task=new_task, mode=args.mode, provider=provider, model=model_name
+        )
+        try:
+            await workflow.run(task=new_task)
+        finally:
+            print(f"\n{format_trace_summary(tracer.end_trace())}\n")
+            print(f"Trace written to {tracer.path}\n")
 
 
 def main():
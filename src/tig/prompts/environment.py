@@ -1,10 +1,17 @@
 import platform
 import os
+import time
 from datetime import datetime
+from functools import lru_cache
 from tzlocal import get_localzone
 
 from textwrap import dedent
 
+from tig.services.context import estimate_tokens
+
+# Minimum number of seconds between two updates of the current time in the reminder
+REMINDER_TIME_INTERVAL_SEC = 15 * 60
+
 SYSTEM_INFO_REMINDER_PROMPT = dedent("""
 ====
 SYSTEM INFORMATION
@@ -27,22 +34,91 @@ Only attempt_completion if all the steps for the above task are done and the tas
 ====""")
 
 
-def get_environment_reminder_prompt(task: str):
-    os_info = platform.system()  # Returns the OS name (e.g., 'Linux', 'Darwin', etc.)
-    default_shell = os.getenv("SHELL")  # The environment variable for default shell
-    home_dir = os.path.expanduser("~")  # Expands to the current user's home directory
-    current_dir = os.getcwd()  # Gets the current working directory
-    local_timezone = get_localzone()
+DELTA_REMINDER_PROMPT = dedent("""
+====
+REMINDER
+{changes}The main task you are trying to accomplish is the one in the <task> tags at the end of the system prompt. Only attempt_completion if all the steps for it are done and the task is complete. Do a lot of thinking inside <thinking>...</thinking> tags to evaluate current progress.
+====""")
+
+FIELD_LABELS = {
+    "os": "Operating System",
+    "shell": "Default Shell",
+    "home_dir": "Home Directory",
+    "pwd": "Current Workspace Directory",
+    "current_time": "Current Time",
+}
+
+
+@lru_cache(maxsize=1)
+def get_local_timezone():
+    """The local timezone, looked up once per process."""
+    return get_localzone()
+
+
+def get_formatted_time() -> str:
+    local_timezone = get_local_timezone()
     current_time = datetime.now(local_timezone)
     timezone_name = local_timezone.key
-    formatted_time = current_time.strftime(
-        f"%m/%d/%Y, %I:%M:%S %p ({timezone_name}, GMT%z)"
-    )
-    return SYSTEM_INFO_REMINDER_PROMPT.format(
-        os=os_info,
-        shell=default_shell,
-        home_dir=home_dir,
-        pwd=current_dir,
-        current_time=formatted_time,
-        task=task,
-    )
+    return current_time.strftime(f"%m/%d/%Y, %I:%M:%S %p ({timezone_name}, GMT%z)")
+
+
+def get_environment_fields() -> dict[str, str | None]:
+    return {
+        "os": platform.system(),  # Returns the OS name (e.g., 'Linux', 'Darwin', etc.)
+        "shell": os.getenv("SHELL"),  # The environment variable for default shell
+        "home_dir": os.path.expanduser("~"),  # Expands to the current user's home directory
+        "pwd": os.getcwd(),  # Gets the current working directory
+        "current_time": get_formatted_time(),
+    }
+
+
+def get_environment_reminder_prompt(task: str):
+    return SYSTEM_INFO_REMINDER_PROMPT.format(**get_environment_fields(), task=task)
+
+
+class EnvironmentReminder:
+    """
+    Builds the reminder appended to each user message of a task.
+
+    The system prompt already holds the system information and the task, so
+    the reminder only points back to the task and lists the fields that now
+    differ from the system prompt. The current time is only resent every
+    REMINDER_TIME_INTERVAL_SEC. Keeps count of the estimated tokens sent, and
+    of those the full reminder would have taken, to measure the savings.
+    """
+
+    def __init__(self, task: str):
+        self.task = task
+        # Values as given in the system prompt
+        self._baseline = get_environment_fields()
+        self._last_time_sent = time.monotonic()
+        self.reminders_sent = 0
+        self.tokens_sent = 0
+        self.full_tokens = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.full_tokens - self.tokens_sent
+
+    def next_prompt(self) -> str:
+        fields = get_environment_fields()
+        now = time.monotonic()
+        send_time = now - self._last_time_sent >= REMINDER_TIME_INTERVAL_SEC
+        if send_time:
+            self._last_time_sent = now
+        changes = [
+            f"{FIELD_LABELS[name]}: {value}"
+            for name, value in fields.items()
+            if value != self._baseline[name]
+            and (name != "current_time" or send_time)
+        ]
+        if changes:
+            changes.insert(0, "Changed since the system prompt was written:")
+            changes.append("")
+        prompt = DELTA_REMINDER_PROMPT.format(changes="\n".join(changes))
+        self.reminders_sent += 1
+        self.tokens_sent += estimate_tokens(prompt)
+        self.full_tokens += estimate_tokens(
+            SYSTEM_INFO_REMINDER_PROMPT.format(**fields, task=self.task)
+        )
+        return prompt
@@ -1,10 +1,11 @@
 import os
 import platform
-from datetime import datetime
-from tzlocal import get_localzone
 
 from tig.tools import list_files
 from tig.modes import MODES
+from tig.prompts.environment import get_formatted_time
+from tig.services.file_index import get_file_index
+from tig.services.workspace import get_workspace_generation
 
 from tig.prompts.tools_formatting import TOOLS_FORMATTING_PROMPT
 from tig.prompts.tools_guidelines import TOOLS_GUIDELINES_PROMPT
@@ -23,26 +24,48 @@ from tig.prompts.tools.ask_followup_question import ASK_FOLLOWUP_QUESTIONS_PROMP
 from tig.prompts.tools.attempt_completion import ATTEMPT_COMPLETION_PROMPT
 
 
-def get_system_prompt(
-    mode: str,
-    task: str,
-) -> str:
-    os_info = platform.system()  # Returns the OS name (e.g., 'Linux', 'Darwin', etc.)
-    default_shell = os.getenv("SHELL")  # The environment variable for default shell
-    home_dir = os.path.expanduser("~")  # Expands to the current user's home directory
+# (mode, workspace directory) -> static system prompt
+_static_prompts: dict[tuple[str, str], str] = {}
+# workspace directory -> ((file index generation, workspace generation), file listing)
+_file_listings: dict[str, tuple[tuple[int, int], str]] = {}
+
+
+def get_static_system_prompt(mode: str) -> str:
+    """
+    The part of the system prompt that only depends on the mode and the
+    workspace directory (role, tools, rules, objectives). It comes first so
+    that providers can cache it across turns and tasks, and is only built
+    once per mode and workspace in a session.
+    """
     current_dir = os.getcwd()  # Gets the current working directory
-    local_timezone = get_localzone()
-    current_time = datetime.now(local_timezone)
-    timezone_name = local_timezone.key
-    formatted_time = current_time.strftime(
-        f"%m/%d/%Y, %I:%M:%S %p ({timezone_name}, GMT%z)"
-    )
-    cwd_files_list = list_files(
+    key = (mode, current_dir)
+    if key not in _static_prompts:
+        _static_prompts[key] = _build_static_system_prompt(mode, current_dir)
+    return _static_prompts[key]
+
+
+def get_workspace_file_listing(current_dir: str) -> str:
+    """
+    The recursive file listing of the workspace, reused from the previous
+    task unless the file index or Tig itself changed the workspace since.
+    """
+    index = get_file_index(current_dir)
+    index.refresh()
+    key = (index.generation, get_workspace_generation())
+    cached = _file_listings.get(current_dir)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    listing = list_files(
         {
             "path": current_dir,
             "recursive": True,
         }
     )
+    _file_listings[current_dir] = (key, listing)
+    return listing
+
+
+def _build_static_system_prompt(mode: str, current_dir: str) -> str:
     current_mode = MODES[mode]
     system_prompt = ""
     system_prompt += current_mode["role"] + "\n"
@@ -60,6 +83,21 @@ def get_system_prompt(
     system_prompt += ATTEMPT_COMPLETION_PROMPT.format() + "\n\n"
     system_prompt += TOOLS_GUIDELINES_PROMPT.format(pwd=current_dir) + "\n"
     system_prompt += RULES_PROMPT.format(pwd=current_dir) + "\n"
+    if current_mode["mode_specific_instructions"]:
+        system_prompt += f"\nMode Specific Instructions\n{current_mode['mode_specific_instructions']}\n"
+    system_prompt += OBJECTIVES_PROMPT.format() + "\n"
+    return system_prompt
+
+
+def get_volatile_system_prompt(task: str) -> str:
+    """The part of the system prompt that changes from task to task (system information, files, task)."""
+    os_info = platform.system()  # Returns the OS name (e.g., 'Linux', 'Darwin', etc.)
+    default_shell = os.getenv("SHELL")  # The environment variable for default shell
+    home_dir = os.path.expanduser("~")  # Expands to the current user's home directory
+    current_dir = os.getcwd()  # Gets the current working directory
+    formatted_time = get_formatted_time()
+    cwd_files_list = get_workspace_file_listing(current_dir)
+    system_prompt = ""
     system_prompt += (
         SYSTEM_INFO_PROMPT.format(
             os=os_info,
@@ -70,11 +108,20 @@ def get_system_prompt(
         )
         + "\n"
     )
-    if current_mode["mode_specific_instructions"]:
-        system_prompt += f"\nMode Specific Instructions\n{current_mode['mode_specific_instructions']}\n"
-    system_prompt += OBJECTIVES_PROMPT.format() + "\n"
     system_prompt += (
         f"Project Directory ({current_dir}) Files: \n{cwd_files_list}\n====\n"
     )
     system_prompt += f"\n<task>\n{task}\n</task>\n"
     return system_prompt
+
+
+def get_system_prompt_blocks(mode: str, task: str) -> tuple[str, str]:
+    """Returns the `(static, volatile)` parts of the system prompt."""
+    return get_static_system_prompt(mode), get_volatile_system_prompt(task)
+
+
+def get_system_prompt(
+    mode: str,
+    task: str,
+) -> str:
+    return "".join(get_system_prompt_blocks(mode, task))
@@ -2,12 +2,14 @@ from textwrap import dedent
 
 LIST_CODE_DEFINITION_NAMES_PROMPT = dedent("""
 ## list_code_definition_names
-Description: Request to list definition names (classes, functions, methods, etc.) from source code. This tool can analyze either a single file or all files at the top level of a specified directory. It provides insights into the codebase structure and important constructs, encapsulating high-level concepts and relationships that are crucial for understanding the overall architecture.
+Description: Request to list definition names (classes, functions, methods, etc.) from source code. This tool can analyze either a single file, all files at the top level of a specified directory, or all source files below a directory when recursive is true. It provides insights into the codebase structure and important constructs, encapsulating high-level concepts and relationships that are crucial for understanding the overall architecture.
 Parameters:
 - path: (required) The path of the file or directory (relative to the current working directory {pwd}) to analyze. When given a directory, it lists definitions from all top-level source files.
+- recursive: (optional) Whether to analyze all source files in the directory and its subdirectories. Use true for recursive analysis, false or omit for top-level files only.
 Usage:
 <list_code_definition_names>
 <path>Directory path here</path>
+<recursive>true or false (optional)</recursive>
 </list_code_definition_names>
 
 Examples:
@@ -21,4 +23,10 @@ Examples:
 <list_code_definition_names>
 <path>src/</path>
 </list_code_definition_names>
+
+3. List definitions from all source files below a directory:
+<list_code_definition_names>
+<path>src/</path>
+<recursive>true</recursive>
+</list_code_definition_names>
 """)
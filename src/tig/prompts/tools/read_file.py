@@ -7,6 +7,7 @@ Parameters:
 - path: (required) The path of the file to read (relative to the current workspace directory {pwd})
 - start_line: (optional) The starting line number to read from (1-based, inclusive). If not provided, it starts from the beginning of the file.
 - end_line: (optional) The ending line number to read to (1-based, inclusive). If not provided, it reads to the end of the file.
+- file: (optional) To read several files in one call, wrap the path, start_line and end_line of each file in its own <file> block instead (at most 10 files). Prefer this over several consecutive read_file calls when you already know which files you need.
 Usage:
 <read_file>
 <path>File path here</path>
@@ -41,5 +42,17 @@ Examples:
 <end_line>68</end_line>
 </read_file>
 
-Note: When both start_line and end_line are provided, this tool efficiently streams only the requested lines, making it suitable for processing large files like logs, CSV files, and other large datasets without memory issues.
+5. Reading several files at once:
+<read_file>
+<file>
+<path>src/app.ts</path>
+</file>
+<file>
+<path>src/utils/format.ts</path>
+<start_line>10</start_line>
+<end_line>40</end_line>
+</file>
+</read_file>
+
+Note: When both start_line and end_line are provided, this tool efficiently streams only the requested lines, making it suitable for processing large files like logs, CSV files, and other large datasets without memory issues. Reading an entire file that is too large returns only its first and last lines together with an outline of the definitions in between; use start_line and end_line to read the rest.
 """)
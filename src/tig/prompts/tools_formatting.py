@@ -17,6 +17,16 @@ For example:
 <path>src/main.js</path>
 </read_file>
 
+To explore several things at once, read-only tools can follow each other in one message:
+
+<read_file>
+<path>src/main.js</path>
+</read_file>
+<search_files>
+<path>src</path>
+<regex>createApp</regex>
+</search_files>
+
 Always adhere to this format for the tool use to ensure proper parsing and execution. Inside the xml-style tags, DO NOT escape special characters like &, <, > etc. use them as it is, the parser will handle them correctly.
 
 """)
@@ -5,7 +5,7 @@ TOOLS_GUIDELINES_PROMPT = dedent("""
 Guidelines
 
 - Choose the right tool for the task.
-- Use one tool at a time.
+- Use one tool at a time. Only read-only tools (read_file, search_files, list_files, list_code_definition_names) can be used together: write several of them one after the other in the same message, up to 8, and their results will come back together in one message. Any other tool must be the only tool of its message.
 - Format tool use correctly.
 - Wait for user confirmation after each tool use.
 - Don’t assume tool success; wait for user feedback.
@@ -1,86 +1,105 @@
 import asyncio
-import subprocess
 import sys
 import os
-import threading
 from collections import deque
+from contextlib import ExitStack
 from typing import Deque
 
 import psutil
-from prompt_toolkit import PromptSession
-from prompt_toolkit.filters import Condition
-from prompt_toolkit.key_binding import KeyBindings
+from prompt_toolkit.input import Input, create_input
+from prompt_toolkit.keys import Keys
 
+from tig.services.executor import run_in_thread
 
-# Helper function to run in the reader thread
-def _reader_thread_func(
-    process: subprocess.Popen,
-    output_deque: Deque[str],
-    stop_event: threading.Event,
-    stream_to_terminal: bool = True,
-):
-    """Reads output lines, prints them, and stores them in a deque."""
-    try:
-        # process.stdout should be valid as we set PIPE
-        # Use iter to read lines until EOF ('')
-        if not process.stdout:
-            return
-        if stream_to_terminal:
-            sys.stdout.write(
-                "# Command output:  (press 'x' to terminate running command)\n"
-                + "-" * 80
-                + "\n"
-            )
-            sys.stdout.flush()
-        for line in iter(process.stdout.readline, ""):
-            if stop_event.is_set():
-                # print("[Reader Thread] Stop event set, breaking.", file=sys.stderr)
-                break
-
-            # line already decoded if text=True in Popen
-            line_stripped = line.rstrip()  # Keep original line ending for print
-
-            if stream_to_terminal:
-                try:
-                    # Write directly to stdout and flush to ensure visibility
-                    sys.stdout.write(f"| {line}")
-                    sys.stdout.flush()
-                except Exception as stream_err:
-                    # Handle cases where stdout might be closed or unavailable
-                    print(f"[Reader Thread Stream Error] {stream_err}", file=sys.stderr)
-
-            output_deque.append(line_stripped)  # Store line without trailing newline
+# Longest output line read at once; longer lines are left out of the captured output
+MAX_OUTPUT_LINE_BYTES = 1024 * 1024
+# Seconds to wait for the rest of the output once the command exited or was
+# terminated (a background child may keep the pipe open)
+OUTPUT_DRAIN_TIMEOUT = 2.0
+# Seconds between checks of the return code, while the output is still open
+EXIT_POLL_INTERVAL_SEC = 0.1
 
-        if stream_to_terminal:
-            sys.stdout.write("-" * 77 + "\n")
-            sys.stdout.flush()
+# Output of commands whose background children still hold it open, read and discarded
+_output_discards: set[asyncio.Task] = set()
 
-        # print("[Reader Thread] Reached EOF or stop event.", file=sys.stderr)
 
-    except ValueError:
-        # Can happen if the process closes stdout abruptly after stop_event is set
-        # or if Popen failed and process.stdout is None (though caught earlier usually)
-        if not stop_event.is_set():
-            print(
-                "[Reader Thread Error] ValueError (possibly closed pipe)",
-                file=sys.stderr,
-            )
-    except Exception as e:
-        # Catch other potential errors during reading
-        print(
-            f"[Reader Thread Error] An unexpected error occurred: {e}", file=sys.stderr
-        )
+async def _wait_for_exit(process: asyncio.subprocess.Process) -> int | None:
+    """
+    Waits for the process to exit. Process.wait() only returns once the
+    output pipe is closed too, which a background child of the command (e.g.
+    a server started with '&') can keep open, so the return code, which is
+    set as soon as the process exits, is checked as well.
+    """
+    waiter = asyncio.ensure_future(process.wait())
+    try:
+        while not waiter.done() and process.returncode is None:
+            await asyncio.wait({waiter}, timeout=EXIT_POLL_INTERVAL_SEC)
     finally:
-        # print("[Reader Thread] Exiting.", file=sys.stderr)
-        # Ensure stdout is closed if Popen didn't handle it (should be automatic)
-        if process.stdout and not process.stdout.closed:
-            try:
-                process.stdout.close()
-            except Exception:
-                pass  # Ignore errors during cleanup close
+        waiter.cancel()
+    return process.returncode
 
 
-def _terminate_process_tree(process: subprocess.Popen):
+async def _discard_output(process: asyncio.subprocess.Process, reader: asyncio.Task):
+    """Reads the output until it is closed, so that background children do not block on a full pipe."""
+    # Only one coroutine may read the stream, let the cancelled reader stop first
+    await asyncio.wait({reader})
+    if not process.stdout:
+        return
+    try:
+        while await process.stdout.read(64 * 1024):
+            pass
+    except Exception:
+        pass
+
+
+async def _read_output(
+    process: asyncio.subprocess.Process,
+    output_deque: Deque[str],
+    stream_to_terminal: bool = True,
+):
+    """Reads output lines, prints them, and stores them in a deque."""
+    if not process.stdout:
+        return
+    if stream_to_terminal:
+        sys.stdout.write(
+            "# Command output:  (press 'x' to terminate running command)\n"
+            + "-" * 80
+            + "\n"
+        )
+        sys.stdout.flush()
+    skipping = False  # Inside a line longer than MAX_OUTPUT_LINE_BYTES
+    while True:
+        try:
+            raw_line = await process.stdout.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            raw_line = e.partial  # Last line without a newline, or b"" at EOF
+        except asyncio.LimitOverrunError as e:
+            # Drop what is buffered of the long line and the rest of it
+            await process.stdout.readexactly(e.consumed)
+            if not skipping:
+                output_deque.append("[line too long, omitted]")
+                skipping = True
+            continue
+        if not raw_line:
+            break
+        if skipping:
+            skipping = False
+            continue
+        line = raw_line.decode("utf-8", errors="replace")
+        if stream_to_terminal:
+            try:
+                sys.stdout.write(f"| {line}")
+                sys.stdout.flush()
+            except Exception as stream_err:
+                # Handle cases where stdout might be closed or unavailable
+                print(f"[Output Stream Error] {stream_err}", file=sys.stderr)
+        output_deque.append(line.rstrip())  # Store line without trailing newline
+    if stream_to_terminal:
+        sys.stdout.write("-" * 77 + "\n")
+        sys.stdout.flush()
+
+
+def _terminate_process_tree(process: asyncio.subprocess.Process):
     """Terminates the process and its children using psutil or platform fallback."""
     pid = process.pid
     try:
@@ -138,7 +157,6 @@ def _terminate_process_tree(process: subprocess.Popen):
         #     f"--- Process PID {pid} not found by psutil (already terminated?). ---",
         #     file=sys.stderr,
         # )
-        # Fall through to Popen methods just in case Popen object still exists
     except Exception as psutil_err:
         print(
             f"--- An error occurred during psutil termination: {psutil_err}. Falling back... ---",
@@ -146,49 +164,72 @@ def _terminate_process_tree(process: subprocess.Popen):
         )
 
 
-async def prompt_with_timeout(session: PromptSession, kb):
-    try:
-        await asyncio.wait_for(
-            session.prompt_async("", key_bindings=kb, multiline=False), timeout=0.5
-        )
-    except asyncio.TimeoutError:
-        output = session.app.output
-        output.cursor_up(1)
-        output.erase_end_of_line()
-        output.erase_down()
-        output.flush()
+class _KeyListener:
+    """
+    Terminal input handler shared by all the commands running in the event
+    loop. While at least one command runs, it reads key presses in raw mode
+    through the event loop (no thread, no polling), and 'x' (or Ctrl-C)
+    terminates the running commands.
+    """
 
+    def __init__(self):
+        self._processes: set[asyncio.subprocess.Process] = set()
+        self._input: Input | None = None
+        self._attached: ExitStack | None = None
+        self._terminations: set[asyncio.Task] = set()
 
-def _terminate_on_keypress(
-    process: subprocess.Popen,
-    stop_event: threading.Event,
-):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    session = PromptSession()
-    kb = KeyBindings()
-
-    @Condition
-    def is_listening():
-        return not stop_event.is_set()
-
-    @kb.add("x", filter=is_listening)
-    def _(event):
-        stop_event.set()
-        _terminate_process_tree(process)
+    def add(self, process: asyncio.subprocess.Process):
+        self._processes.add(process)
+        if self._attached is None:
+            self._attach()
+
+    def remove(self, process: asyncio.subprocess.Process):
+        self._processes.discard(process)
+        if not self._processes:
+            self._detach()
+
+    def _attach(self):
+        if not sys.stdin.isatty():
+            return
         try:
-            process.wait(timeout=1)  # Allow Popen object to update
-        except Exception:
-            pass
-        finally:
-            event.app.exit()
+            self._input = create_input()
+            self._attached = ExitStack()
+            self._attached.enter_context(self._input.raw_mode())
+            self._attached.enter_context(self._input.attach(self._on_input))
+        except Exception as e:
+            # The commands still run, they just cannot be terminated from the keyboard
+            print(f"[Key Listener Error] {e}", file=sys.stderr)
+            self._detach()
+
+    def _detach(self):
+        if self._attached is not None:
+            self._attached.close()
+            self._attached = None
+        if self._input is not None:
+            self._input.close()
+            self._input = None
+
+    def _on_input(self):
+        if self._input is None:
+            return
+        for key_press in self._input.read_keys():
+            if key_press.data.lower() == "x" or key_press.key == Keys.ControlC:
+                for process in list(self._processes):
+                    self._terminate(process)
 
-    while not stop_event.is_set():
-        loop.run_until_complete(prompt_with_timeout(session, kb))
-    loop.close()
+    def _terminate(self, process: asyncio.subprocess.Process):
+        if process.returncode is not None:
+            return
+        # psutil waits for the processes to exit, so it runs off the event loop
+        task = asyncio.ensure_future(run_in_thread(_terminate_process_tree, process))
+        self._terminations.add(task)
+        task.add_done_callback(self._terminations.discard)
 
 
-def run_shell_command(
+_key_listener = _KeyListener()
+
+
+async def arun_shell_command(
     command: str, cwd: str, timeout_seconds: int = 3600, max_lines: int = 50
 ) -> str:
     """
@@ -200,6 +241,9 @@ def run_shell_command(
     partial output. It always returns only the last 'max_lines' of the
     captured output (either full or partial).
 
+    The command runs as an asyncio subprocess supervised by the event loop,
+    so several commands can run at once; pressing 'x' terminates them.
+
     Args:
         command: The shell command string to execute.
         cwd: The directory (current working directory) in which to run the command.
@@ -214,7 +258,7 @@ def run_shell_command(
         stdout and stderr, or an error message if execution fails.
 
     Note:
-        - Using shell=True can be a security hazard if the command string
+        - Running through the shell can be a security hazard if the command string
           is constructed from untrusted external input. Ensure the command is trusted.
         - Combines stdout and stderr into one output stream.
     """
@@ -224,70 +268,46 @@ def run_shell_command(
     is_timeout = False
     process = None  # Initialize process to None
     output_deque: Deque[str] = deque(maxlen=max_lines)
-    stop_reader_event = threading.Event()
-    reader_thread = None
-    key_listener_thread = None
 
     try:
         # Basic validation for CWD
         if not os.path.isdir(cwd):
             return f"Error: CWD does not exist or is not a directory: '{cwd}'"
 
-        # Start the process
-        # Using text=True (Python 3.7+) automatically handles decoding.
-        # stderr=subprocess.STDOUT combines stderr into the stdout stream.
-        # Use Popen for non-blocking start and ability to timeout/kill later.
-        process = subprocess.Popen(
+        # stderr=STDOUT combines stderr into the stdout stream
+        process = await asyncio.create_subprocess_shell(
             command,
-            shell=True,  # Often necessary for commands like 'npm run dev' or complex shell syntax
             cwd=cwd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,  # Capture stderr along with stdout
-            text=True,  # Decode output as text
-            encoding="utf-8",  # Be explicit about encoding
-            bufsize=1,  # Line-buffered
-            universal_newlines=True,  # Ensure text mode works correctly           errors="replace",  # Handle potential decoding errors gracefully
-        )
-        reader_thread = threading.Thread(
-            target=_reader_thread_func,
-            args=(process, output_deque, stop_reader_event, True),
-            daemon=True,  # Allows main program to exit even if thread is stuck (though we join later)
-        )
-        reader_thread.start()
-
-        # Start a thread to listen for 'x' keypress to terminate the process
-        key_listener_thread = threading.Thread(
-            target=_terminate_on_keypress,
-            args=(
-                process,
-                stop_reader_event,
-            ),
-            daemon=True,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            limit=MAX_OUTPUT_LINE_BYTES,
         )
-        key_listener_thread.start()
-
+        _key_listener.add(process)
+        reader = None
         try:
-            process.wait(timeout=timeout_seconds)
-            returncode = process.returncode
-
-        except subprocess.TimeoutExpired:
-            is_timeout = True
-            stop_reader_event.set()
-            _terminate_process_tree(process)
-            reader_thread.join(timeout=2.0)
+            reader = asyncio.create_task(_read_output(process, output_deque, True))
             try:
-                process.wait(timeout=2)
-                process.kill()  # Ensure process is killed
-            except subprocess.TimeoutExpired:
-                print(
-                    "--- Warning: Process did not update status quickly after termination signal. ---",
-                    file=sys.stderr,
-                )
-            except Exception as wait_err:
-                print(
-                    f"--- Warning: Error waiting after termination signal: {wait_err} ---",
-                    file=sys.stderr,
+                returncode = await asyncio.wait_for(
+                    _wait_for_exit(process), timeout_seconds
                 )
+            except asyncio.TimeoutError:
+                is_timeout = True
+                await run_in_thread(_terminate_process_tree, process)
+            try:
+                await asyncio.wait_for(reader, OUTPUT_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass  # A background child of the command keeps the output open
+        finally:
+            _key_listener.remove(process)
+            if reader is not None and not reader.done():
+                reader.cancel()
+            if process.returncode is None and not is_timeout:
+                # Cancelled while running, e.g. the task was stopped
+                await asyncio.shield(run_in_thread(_terminate_process_tree, process))
+            if reader is not None and process.stdout and not process.stdout.at_eof():
+                task = asyncio.create_task(_discard_output(process, reader))
+                _output_discards.add(task)
+                task.add_done_callback(_output_discards.discard)
 
     except FileNotFoundError:
         error_message = f"Error: Command or components not found for: '{command}'"
@@ -298,31 +318,9 @@ def run_shell_command(
             f"Error: Permission denied to execute command or access CWD '{cwd}'"
         )
     except Exception as e:
-        # Catch other potential exceptions during Popen or communicate
+        # Catch other potential exceptions while starting or reading the process
         error_message = f"An unexpected error occurred: {type(e).__name__}: {e}"
 
-    finally:
-        # Ensure the reader thread is stopped and joined
-        if reader_thread and reader_thread.is_alive():
-            stop_reader_event.set()
-            # print("[Main Thread] Joining reader thread...", file=sys.stderr)
-            reader_thread.join(timeout=2.0)  # Wait briefly for reader to finish
-            if reader_thread.is_alive():
-                print(
-                    "[Main Thread] Warning: Reader thread did not exit cleanly.",
-                    file=sys.stderr,
-                )
-        if key_listener_thread and key_listener_thread.is_alive():
-            stop_reader_event.set()
-            key_listener_thread.join(
-                timeout=2.0
-            )  # Wait briefly for key listener to finish
-            if key_listener_thread.is_alive():
-                print(
-                    "[Main Thread] Warning: Key listener thread did not exit cleanly.",
-                    file=sys.stderr,
-                )
-
     if len(output_deque) == max_lines and max_lines > 0:
         output_lines.append("...")  # Indicate truncation if deque is full
 
@@ -344,3 +342,22 @@ def run_shell_command(
         else:
             # If it finished successfully or timed out with genuinely no output
             return f"[execute_command for command: '{command}' inside '{cwd}'] Result:\n{f'Exit code: {returncode}\n' if returncode is not None else ''}No output captured.{f'(After running for {timeout_seconds} seconds)' if is_timeout else ''}\n"
+
+
+def run_shell_command(
+    command: str, cwd: str, timeout_seconds: int = 3600, max_lines: int = 50
+) -> str:
+    """Blocking version of arun_shell_command, for callers outside an event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError(
+            "run_shell_command cannot block a running event loop, await arun_shell_command instead"
+        )
+    return asyncio.run(
+        arun_shell_command(
+            command, cwd, timeout_seconds=timeout_seconds, max_lines=max_lines
+        )
+    )
@@ -0,0 +1,233 @@
+import os
+import re
+
+from llama_index.core.llms import ChatMessage, MessageRole
+
+# Rough conversion used for budgeting, exact counts depend on the model's tokenizer
+CHARS_PER_TOKEN = 4
+# Estimated tokens the chat history may take up before older turns are compacted
+DEFAULT_CONTEXT_TOKEN_BUDGET = 64_000
+# Latest messages that are always sent verbatim
+KEEP_RECENT_MESSAGES = 6
+# Smaller tool outputs and parameters are not worth eliding
+MIN_ELIDED_TOKENS = 200
+# Parameters of old tool calls that can be large, e.g. a whole file written
+ELIDABLE_TOOL_PARAMS = ("content", "diff")
+
+# Header of a tool result: "[tool for target]", followed by "Result:" or
+# "Results:" for most tools, or the heading of a list_files listing. A message
+# starting with one is a tool result, and may combine several read-only tools.
+_TOOL_RESULT_HEADER = re.compile(
+    r"^\s*(?:\[(?P<tool>\w+) for (?P<target>[^\n]*?)\](?:\s*Results?:)?"
+    r'|Files and directories in (?P<listing>"[^\n]*"):)',
+    re.MULTILINE,
+)
+_QUOTED_PATH = re.compile(r"'([^']*)'")
+_FILE_BLOCK = re.compile(
+    r"<file>\n<path>(?P<path>.*?)</path>\n<content lines=(?P<start>\d+)-(?P<end>\d+)>.*?\n</file>",
+    re.DOTALL,
+)
+_ELIDABLE_PARAM = re.compile(
+    r"<(?P<param>" + "|".join(ELIDABLE_TOOL_PARAMS) + r")>(?P<value>.*)</(?P=param)>",
+    re.DOTALL,
+)
+# Start of the result of an edit that changed the file, as opposed to a denied one
+_EDIT_APPLIED = re.compile(
+    r"\s*(?:The content was successfully written|(?:All )?\d+ out of \d+ diffs were successfully applied)"
+)
+# Start of the environment reminder that follows every tool result
+_ENVIRONMENT_REMINDER = "\n====\nREMINDER\n"
+ELIDED_MARKER = "(elided"
+
+
+def estimate_tokens(text: str | None) -> int:
+    return len(text or "") // CHARS_PER_TOKEN
+
+
+def estimate_messages_tokens(messages: list[ChatMessage]) -> int:
+    return sum(estimate_tokens(message.content) for message in messages)
+
+
+def _normalize_path(path: str) -> str:
+    return os.path.normpath(os.path.abspath(path.strip()))
+
+
+def _tool_result_headers(content: str) -> list[re.Match]:
+    """Headers of the tool results in a message, empty if it is not a tool result."""
+    if not _TOOL_RESULT_HEADER.match(content):
+        return []
+    return list(_TOOL_RESULT_HEADER.finditer(content))
+
+
+def _header_tool(header: re.Match) -> str:
+    return header.group("tool") or "list_files"
+
+
+def _edit_applied(content: str, headers: list[re.Match]) -> bool:
+    """Whether the first tool result of a message reports a file edit that was made."""
+    end = headers[1].start() if len(headers) > 1 else len(content)
+    return _EDIT_APPLIED.match(content, headers[0].end(), end) is not None
+
+
+def _split_reminder(content: str) -> tuple[str, str]:
+    """Splits a tool result message into the tool output and the trailing environment reminder."""
+    start = content.rfind(_ENVIRONMENT_REMINDER)
+    if start == -1:
+        return content, ""
+    return content[:start], content[start:]
+
+
+class ContextCompactor:
+    """
+    Keeps the chat history sent to the LLM within a token budget.
+
+    The system prompt and the latest KEEP_RECENT_MESSAGES messages are never
+    touched. Older messages are compacted in place, in increasing order of
+    information lost, until the history fits:
+
+    1. file reads superseded by a later read of the same lines or by an edit
+       of the file are replaced by a stub (always, as they are stale anyway);
+    2. old tool outputs are replaced by a stub, oldest first;
+    3. large parameters (file contents, diffs) of old tool calls are elided;
+    4. the oldest turns are dropped.
+
+    Compacting in place keeps the already compacted prefix of the history
+    stable from one turn to the next.
+    """
+
+    def __init__(
+        self,
+        token_budget: int | None = None,
+        keep_recent: int = KEEP_RECENT_MESSAGES,
+    ):
+        if token_budget is None:
+            token_budget = int(
+                os.getenv("TIG_CONTEXT_TOKENS", DEFAULT_CONTEXT_TOKEN_BUDGET)
+            )
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.tokens_saved = 0
+
+    def compact(self, chat_history: list[ChatMessage]) -> int:
+        """Compacts `chat_history` in place, returning the estimated tokens saved."""
+        before = estimate_messages_tokens(chat_history)
+        # Each step returns the tokens it saved, so the total is not recounted
+        tokens = before - self._elide_superseded_reads(chat_history)
+        for compact_step in (
+            self._elide_tool_outputs,
+            self._elide_tool_call_params,
+            self._drop_oldest_turns,
+        ):
+            if tokens <= self.token_budget:
+                break
+            tokens -= compact_step(chat_history, tokens)
+        saved = before - tokens
+        self.tokens_saved += saved
+        return saved
+
+    def _compactable(self, chat_history: list[ChatMessage]) -> range:
+        """Indexes of the messages that may be compacted, oldest first."""
+        first = 0
+        # The system prompt may be split into several messages
+        while first < len(chat_history) and chat_history[first].role == MessageRole.SYSTEM:
+            first += 1
+        return range(first, max(first, len(chat_history) - self.keep_recent))
+
+    def _elide_superseded_reads(self, chat_history: list[ChatMessage]) -> int:
+        compactable = self._compactable(chat_history)
+        saved = 0
+        # path -> line ranges read later on, None once the file was edited later on
+        later_reads: dict[str, list[tuple[int, int]] | None] = {}
+        for i in reversed(range(len(chat_history))):
+            message = chat_history[i]
+            if message.role != MessageRole.USER or not message.content:
+                continue
+            headers = _tool_result_headers(message.content)
+            tools = [_header_tool(header) for header in headers]
+            if tools and tools[0] in ("write_to_file", "apply_diff"):
+                if not _edit_applied(message.content, headers):
+                    # Denied, the file is unchanged and earlier reads still hold
+                    continue
+                for path in _QUOTED_PATH.findall(headers[0].group("target"))[:1]:
+                    later_reads[_normalize_path(path)] = None
+                continue
+            if "read_file" not in tools:
+                continue
+
+            blocks = []
+
+            def replace_block(match: re.Match) -> str:
+                path = _normalize_path(match.group("path"))
+                lines = (int(match.group("start")), int(match.group("end")))
+                blocks.append((path, lines))
+                if i not in compactable or path not in later_reads:
+                    return match.group(0)
+                ranges = later_reads[path]
+                if ranges is not None and not any(
+                    start <= lines[0] and lines[1] <= end for start, end in ranges
+                ):
+                    return match.group(0)
+                reason = "edited" if ranges is None else "read again"
+                return f"<file>\n<path>{match.group('path')}</path>\n{ELIDED_MARKER}: lines {lines[0]}-{lines[1]}, the file was {reason} later on)\n</file>"
+
+            content = _FILE_BLOCK.sub(replace_block, message.content)
+            if content != message.content:
+                saved += estimate_tokens(message.content) - estimate_tokens(content)
+                message.content = content
+            for path, lines in blocks:
+                if later_reads.get(path, []) is not None:
+                    later_reads.setdefault(path, []).append(lines)
+        return saved
+
+    def _elide_tool_outputs(self, chat_history: list[ChatMessage], tokens: int) -> int:
+        saved = 0
+        for i in self._compactable(chat_history):
+            message = chat_history[i]
+            if message.role != MessageRole.USER or not message.content:
+                continue
+            headers = _tool_result_headers(message.content)
+            output, reminder = _split_reminder(message.content)
+            output_tokens = estimate_tokens(output)
+            if not headers or output_tokens < MIN_ELIDED_TOKENS:
+                continue
+            stub = "\n".join(header.group(0).strip() for header in headers)
+            content = f"{stub}\n{ELIDED_MARKER} to save context, about {output_tokens} tokens. Use the tool again if you still need this output.){reminder}"
+            saved += estimate_tokens(message.content) - estimate_tokens(content)
+            message.content = content
+            if tokens - saved <= self.token_budget:
+                break
+        return saved
+
+    def _elide_tool_call_params(self, chat_history: list[ChatMessage], tokens: int) -> int:
+        def replace_param(match: re.Match) -> str:
+            value = match.group("value")
+            if estimate_tokens(value) < MIN_ELIDED_TOKENS:
+                return match.group(0)
+            param = match.group("param")
+            return f"<{param}>{ELIDED_MARKER}: {value.count(chr(10)) + 1} lines)</{param}>"
+
+        saved = 0
+        for i in self._compactable(chat_history):
+            message = chat_history[i]
+            if message.role != MessageRole.ASSISTANT or not message.content:
+                continue
+            content = _ELIDABLE_PARAM.sub(replace_param, message.content)
+            if content != message.content:
+                saved += estimate_tokens(message.content) - estimate_tokens(content)
+                message.content = content
+                if tokens - saved <= self.token_budget:
+                    break
+        return saved
+
+    def _drop_oldest_turns(self, chat_history: list[ChatMessage], tokens: int) -> int:
+        saved = 0
+        while tokens - saved > self.token_budget:
+            compactable = self._compactable(chat_history)
+            if len(compactable) < 2:
+                break
+            # Drop an assistant message with the user message answering it,
+            # so that roles keep alternating
+            dropped = chat_history[compactable.start : compactable.start + 2]
+            saved += estimate_messages_tokens(dropped)
+            del chat_history[compactable.start : compactable.start + 2]
+        return saved
@@ -0,0 +1,42 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+# Threads running blocking tool work (file I/O, parsing, approval prompts) off the event loop
+TOOL_THREAD_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+
+T = TypeVar("T")
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+# Held while a tool prompts the user, so that tools running concurrently ask one at a time
+prompt_lock = threading.Lock()
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    """Returns the session's bounded thread pool for blocking tool work."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=TOOL_THREAD_WORKERS, thread_name_prefix="tig-tool"
+            )
+        return _executor
+
+
+async def run_in_thread(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Runs a blocking function in the tool thread pool and awaits its result,
+    so that the event loop keeps running meanwhile. Context variables (e.g.
+    the current tracing span) are carried over to the thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_tool_executor(), functools.partial(context.run, func, *args, **kwargs)
+    )
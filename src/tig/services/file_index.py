@@ -0,0 +1,462 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+from ordered_set import OrderedSet
+
+from tig.services.gitignore import IGNORE_FILE_NAMES, IgnoreMatcher
+from tig.services.workspace import get_workspace_generation
+
+# Minimum number of seconds between two mtime polls when inotify is not available
+POLL_INTERVAL_SEC = 1.0
+# Seconds the background scan of a large tree holds the index lock at a time
+SCAN_SLICE_SEC = 0.05
+# Number of changed paths remembered for changed_paths_since()
+MAX_TRACKED_CHANGES = 10_000
+
+# inotify(7) constants
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+# File content changes, which only affect the listing for ignore files
+_CONTENT_EVENTS = _IN_MODIFY | _IN_CLOSE_WRITE
+_WATCH_MASK = (
+    _CONTENT_EVENTS
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+    | _IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _InotifyWatcher:
+    """
+    Minimal ctypes binding to Linux inotify, reporting which watched
+    directories changed (their entries, or the contents of their ignore
+    files) and which paths in them were created, deleted, moved or written.
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wd_to_dir: dict[int, str] = {}
+        self._dir_to_wd: dict[str, int] = {}
+
+    def watch(self, abs_dir: str, rel_dir: str):
+        wd = self._add_watch(self._fd, os.fsencode(abs_dir), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {abs_dir}")
+        self._wd_to_dir[wd] = rel_dir
+        self._dir_to_wd[rel_dir] = wd
+
+    def unwatch(self, rel_dir: str):
+        wd = self._dir_to_wd.pop(rel_dir, None)
+        if wd is None:
+            return
+        if self._wd_to_dir.get(wd) == rel_dir:
+            del self._wd_to_dir[wd]
+        # Fails harmlessly if the kernel already removed the watch with the directory
+        self._rm_watch(self._fd, wd)
+
+    def _forget(self, wd: int):
+        rel_dir = self._wd_to_dir.pop(wd, None)
+        if rel_dir is not None and self._dir_to_wd.get(rel_dir) == wd:
+            del self._dir_to_wd[rel_dir]
+
+    def read_changes(self) -> tuple[set[str], set[str], bool]:
+        """
+        Returns the relative paths of the changed directories and of the
+        changed entries in them, and whether the event queue overflowed.
+        """
+        changed_dirs: set[str] = set()
+        changed_paths: set[str] = set()
+        overflowed = False
+        while True:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(buffer, offset)
+                name_start = offset + _EVENT_HEADER.size
+                offset = name_start + name_len
+                if mask & _IN_Q_OVERFLOW:
+                    overflowed = True
+                    continue
+                rel_dir = self._wd_to_dir.get(wd)
+                if mask & _IN_IGNORED:
+                    # The kernel removed the watch, e.g. the directory was deleted
+                    self._forget(wd)
+                if rel_dir is None:
+                    continue
+                name = os.fsdecode(buffer[name_start:offset].rstrip(b"\0"))
+                if name:
+                    changed_paths.add(_join(rel_dir, name))
+                if not mask & _CONTENT_EVENTS or name in IGNORE_FILE_NAMES:
+                    changed_dirs.add(rel_dir)
+        return changed_dirs, changed_paths, overflowed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def _join(rel_dir: str, name: str) -> str:
+    return f"{rel_dir}/{name}" if rel_dir else name
+
+
+@dataclass
+class _DirEntry:
+    mtime_ns: int
+    subdirs: list[str] = field(default_factory=list)
+    files: list[str] = field(default_factory=list)
+
+
+class FileIndex:
+    """
+    Resident index of the non-ignored files in a workspace.
+
+    The tree is walked once, then kept current by inotify on Linux, or by
+    polling the mtime of every indexed directory (adding or removing an entry
+    updates its parent directory's mtime) at most once per POLL_INTERVAL_SEC.
+    Listings are then served from memory without touching the disk.
+
+    `generation` changes whenever the indexed files change, and with inotify
+    also when their contents do; `changed_paths_since()` then tells which.
+
+    A walk that does not finish within `timeout_sec` goes on in a background
+    thread. Until it is `complete`, queries return None, so that callers read
+    the disk instead of trusting a partial index.
+    """
+
+    def __init__(self, root: str, timeout_sec: float = 10.0):
+        self.root = os.path.realpath(root)
+        self.timeout_sec = timeout_sec
+        self._lock = threading.RLock()
+        self._dirs: dict[str, _DirEntry] = {}
+        self._watcher: _InotifyWatcher | None = None
+        self._last_poll = 0.0
+        self._last_poll_generation = get_workspace_generation()
+        # Directories still to be scanned, and the thread scanning them once a walk timed out
+        self._pending: list[str] = []
+        self._scanner: threading.Thread | None = None
+        self.matcher: IgnoreMatcher = IgnoreMatcher(self.root)
+        self.complete = False
+        self.generation = 0
+        # rel_path -> generation of its last change, complete since _changes_start
+        self._changes: dict[str, int] = {}
+        self._changes_start = 0
+        self._build()
+
+    # --- building -----------------------------------------------------------
+
+    def _build(self):
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+        if sys.platform.startswith("linux"):
+            try:
+                self._watcher = _InotifyWatcher()
+            except (OSError, AttributeError, TypeError):
+                self._watcher = None
+        self.matcher = IgnoreMatcher(self.root)
+        self._dirs = {}
+        self._pending = []
+        self._scan_tree("")
+        self._last_poll = time.monotonic()
+        self._last_poll_generation = get_workspace_generation()
+        self.generation += 1
+        self._changes = {}
+        self._changes_start = self.generation
+
+    def _scan_dir(self, rel_dir: str) -> _DirEntry | None:
+        abs_dir = os.path.join(self.root, rel_dir)
+        try:
+            entry = _DirEntry(mtime_ns=os.stat(abs_dir).st_mtime_ns)
+            with os.scandir(abs_dir) as it:
+                children = sorted(it, key=lambda child: child.name)
+        except OSError:
+            return None
+        for child in children:
+            try:
+                is_dir = child.is_dir()
+                if is_dir and child.is_symlink():
+                    # Like os.walk, do not follow symlinked directories
+                    continue
+            except OSError:
+                continue
+            rel_path = _join(rel_dir, child.name)
+            if is_dir:
+                if not child.name.startswith(".") and not self.matcher.is_ignored(
+                    rel_path, is_dir=True
+                ):
+                    entry.subdirs.append(child.name)
+            elif not self.matcher.is_ignored(rel_path):
+                entry.files.append(child.name)
+        if self._watcher is not None:
+            try:
+                self._watcher.watch(abs_dir, rel_dir)
+            except OSError:
+                # Most likely the inotify watch limit, poll from now on instead
+                self._watcher.close()
+                self._watcher = None
+        return entry
+
+    def _scan_pending(self, deadline: float) -> bool:
+        """Scans pending directories until none are left (returns True) or the deadline passes."""
+        while self._pending:
+            if time.monotonic() > deadline:
+                return False
+            current = self._pending.pop()
+            entry = self._scan_dir(current)
+            if entry is None:
+                continue
+            self._dirs[current] = entry
+            self._pending.extend(_join(current, name) for name in reversed(entry.subdirs))
+        return True
+
+    def _scan_tree(self, rel_dir: str):
+        self._pending.append(rel_dir)
+        if self._scanner is not None:
+            # The background scan picks it up
+            return
+        self.complete = self._scan_pending(time.monotonic() + self.timeout_sec)
+        if not self.complete:
+            print(
+                f"\nWarning: Indexing the workspace timed out after {self.timeout_sec} seconds, "
+                "finishing in the background (reading the disk meanwhile).\n",
+            )
+            self._scanner = threading.Thread(
+                target=self._finish_scan, name="tig-file-index", daemon=True
+            )
+            self._scanner.start()
+
+    def _finish_scan(self):
+        while True:
+            with self._lock:
+                if self._scan_pending(time.monotonic() + SCAN_SLICE_SEC):
+                    self._scanner = None
+                    self.complete = True
+                    self.generation += 1
+                    return
+            # Let queries and refreshes in between slices
+            time.sleep(0)
+
+    def _drop_tree(self, rel_dir: str):
+        prefix = rel_dir + "/" if rel_dir else ""
+        for key in [k for k in self._dirs if k == rel_dir or k.startswith(prefix)]:
+            del self._dirs[key]
+            if self._watcher is not None:
+                self._watcher.unwatch(key)
+        self._pending = [
+            d for d in self._pending if d != rel_dir and not d.startswith(prefix)
+        ]
+
+    def _rescan(self, rel_dir: str):
+        if self.matcher.reload(rel_dir):
+            # The directory's ignore rules changed, which can affect its whole subtree
+            self._drop_tree(rel_dir)
+            self._scan_tree(rel_dir)
+            return
+        old_entry = self._dirs.get(rel_dir)
+        new_entry = self._scan_dir(rel_dir)
+        if new_entry is None:
+            self._drop_tree(rel_dir)
+            return
+        self._dirs[rel_dir] = new_entry
+        old_subdirs = set(old_entry.subdirs) if old_entry else set()
+        for name in old_subdirs - set(new_entry.subdirs):
+            self._drop_tree(_join(rel_dir, name))
+        for name in new_entry.subdirs:
+            if name not in old_subdirs:
+                self._scan_tree(_join(rel_dir, name))
+
+    # --- keeping current ----------------------------------------------------
+
+    def refresh(self):
+        """Brings the index up to date with the disk."""
+        with self._lock:
+            changed_paths: set[str] = set()
+            if self._watcher is not None:
+                changed_dirs, changed_paths, overflowed = self._watcher.read_changes()
+                if overflowed:
+                    self._build()
+                    return
+                # The repository-wide excludes live in .git/info, which is not watched
+                changed_dirs.update(self.matcher.changed_dirs([""]))
+            else:
+                now = time.monotonic()
+                generation = get_workspace_generation()
+                # Tig's own writes must show up right away, not after the interval
+                if (
+                    now - self._last_poll < POLL_INTERVAL_SEC
+                    and generation == self._last_poll_generation
+                ):
+                    return
+                self._last_poll = now
+                self._last_poll_generation = generation
+                changed_dirs = set(self.matcher.changed_dirs())
+                for rel_dir, entry in list(self._dirs.items()):
+                    try:
+                        mtime_ns = os.stat(os.path.join(self.root, rel_dir)).st_mtime_ns
+                    except OSError:
+                        mtime_ns = -1
+                    if mtime_ns != entry.mtime_ns:
+                        changed_dirs.add(rel_dir)
+            changed_dirs = {d for d in changed_dirs if d in self._dirs}
+            # Writes to ignored files, e.g. logs, do not change the index
+            changed_paths = {
+                p
+                for p in changed_paths
+                if p.rpartition("/")[0] in changed_dirs or self._is_indexed_file(p)
+            }
+            if not changed_dirs and not changed_paths:
+                return
+            # Parents first, so that a dropped subtree is not rescanned needlessly
+            for rel_dir in sorted(changed_dirs, key=lambda d: d.count("/") if d else -1):
+                if rel_dir in self._dirs:
+                    self._rescan(rel_dir)
+            self.generation += 1
+            self._record_changes(changed_paths)
+
+    def _is_indexed_file(self, rel_path: str) -> bool:
+        rel_dir, _, name = rel_path.rpartition("/")
+        entry = self._dirs.get(rel_dir)
+        return entry is not None and name in entry.files
+
+    def _record_changes(self, changed_paths: set[str]):
+        if len(self._changes) + len(changed_paths) > MAX_TRACKED_CHANGES:
+            # Forget the history, callers asking for older changes check everything
+            self._changes = {}
+            self._changes_start = self.generation
+            return
+        for rel_path in changed_paths:
+            self._changes[rel_path] = self.generation
+
+    def changed_paths_since(self, generation: int) -> set[str] | None:
+        """
+        Returns the paths, relative to the index root, that were created,
+        deleted, moved or written after `generation`. Returns None if that is
+        not known (no inotify, or too many changes since), in which case the
+        caller has to check every file.
+        """
+        with self._lock:
+            if self._watcher is None or generation < self._changes_start:
+                return None
+            return {
+                rel_path
+                for rel_path, changed in self._changes.items()
+                if changed > generation
+            }
+
+    # --- queries ------------------------------------------------------------
+
+    def relative_path(self, path: str) -> str | None:
+        """Returns `path` relative to the index root, or None if it lies outside of it."""
+        abs_path = os.path.realpath(path)
+        if abs_path == self.root:
+            return ""
+        if not abs_path.startswith(self.root + os.sep):
+            return None
+        return os.path.relpath(abs_path, self.root).replace(os.sep, "/")
+
+    def is_ignored(self, path: str) -> bool:
+        """Matches `path` and its parent directories against the workspace ignore rules."""
+        rel_path = self.relative_path(path)
+        if rel_path is None:
+            rel_path = str(path)
+        return self.matcher.is_path_ignored(rel_path, is_dir=os.path.isdir(path))
+
+    def read_dir(self, rel_dir: str) -> tuple[list[str], list[str]] | None:
+        """
+        Returns the sorted `(subdirs, files)` names of an indexed directory, or
+        None if it is not indexed (or the index is incomplete). Does not refresh the index.
+        """
+        with self._lock:
+            entry = self._dirs.get(rel_dir) if self.complete else None
+            if entry is None:
+                return None
+            return list(entry.subdirs), list(entry.files)
+
+    def files_under(self, path: str) -> list[str] | None:
+        """
+        Returns the paths, relative to the index root, of all indexed files
+        below `path`, or None if `path` is not an indexed directory (or the
+        index is incomplete).
+        """
+        self.refresh()
+        rel_root = self.relative_path(path)
+        with self._lock:
+            if not self.complete or rel_root is None or rel_root not in self._dirs:
+                return None
+            prefix = rel_root + "/" if rel_root else ""
+            return [
+                _join(rel_dir, name)
+                for rel_dir, entry in self._dirs.items()
+                if rel_dir == rel_root or rel_dir.startswith(prefix)
+                for name in entry.files
+            ]
+
+    def list_recursively(self, path: str) -> OrderedSet[str] | None:
+        """
+        Lists the files below `path` in the same format as
+        list_files_recursively_respecting_gitignore, without touching the disk.
+        Returns None if `path` is not an indexed directory or the index is incomplete.
+        """
+        self.refresh()
+        rel_root = self.relative_path(path)
+        all_files: OrderedSet[str] = OrderedSet([])
+        with self._lock:
+            if not self.complete or rel_root is None or rel_root not in self._dirs:
+                return None
+            pending = [rel_root]
+            while pending:
+                current = pending.pop()
+                entry = self._dirs.get(current)
+                if entry is None:
+                    continue
+                rel_dir = os.path.relpath(current or ".", rel_root or ".")
+                rel_dir = rel_dir.replace(os.sep, "/")
+                for name in entry.files:
+                    all_files.append(rel_dir + "/")
+                    all_files.append(name if rel_dir == "." else f"{rel_dir}/{name}")
+                pending.extend(_join(current, name) for name in reversed(entry.subdirs))
+        return all_files
+
+
+_indexes: dict[str, FileIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_file_index(workspace: str | None = None) -> FileIndex:
+    """Returns the session's file index of the workspace (defaults to the current directory)."""
+    workspace = os.path.abspath(workspace or os.getcwd())
+    with _indexes_lock:
+        if workspace not in _indexes:
+            _indexes[workspace] = FileIndex(workspace)
+        return _indexes[workspace]
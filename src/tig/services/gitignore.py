@@ -0,0 +1,154 @@
+import os
+import threading
+
+import pathspec
+
+DEFAULT_IGNORE_PATTERNS = [
+    "node_modules",
+    "__pycache__",
+    "env",
+    ".env",
+    "venv",
+    ".venv",  # Common Python venv name
+    "target/dependency",  # Rust/Java?
+    "build/dependencies",  # Gradle?
+    "dist",
+    "out",
+    "build",  # General build dir
+    "bin",  # Common compiled output dir
+    "obj",  # Common compiled output dir
+    "bundle",
+    "vendor",
+    "tmp",
+    "temp",
+    "deps",
+    "pkg",
+    "Pods",  # iOS Cocoapods
+    ".git",  # Git internal directory
+    ".hg",  # Mercurial
+    ".svn",  # Subversion
+    ".vscode",  # VSCode settings
+    ".idea",  # JetBrains IDE settings
+    ".DS_Store",  # macOS metadata
+    ".tig",  # Tig workspace cache (symbol index etc.)
+]
+
+
+# Per-directory ignore files, in increasing order of precedence
+IGNORE_FILE_NAMES = (".gitignore", ".ignore")
+# Repository-wide excludes, only read at the root with the lowest precedence
+ROOT_EXCLUDE_FILE = os.path.join(".git", "info", "exclude")
+
+_DEFAULT_SPEC = pathspec.PathSpec.from_lines("gitwildmatch", DEFAULT_IGNORE_PATTERNS)
+
+
+def _read_lines(path: str) -> list[str]:
+    try:
+        with open(path, "r", errors="replace") as f:
+            return f.read().splitlines()
+    except OSError:
+        return []
+
+
+class IgnoreMatcher:
+    """
+    Hierarchical gitignore matcher for a directory tree.
+
+    Every directory's `.gitignore` and `.ignore` files are compiled into one
+    PathSpec the first time that directory is visited, and matched against
+    paths relative to it. As in git, the deepest directory with a matching
+    pattern decides, so nested files can re-include (`!pattern`) what a parent
+    excluded. Walkers should test directories with `is_dir=True` and skip the
+    ignored ones, which prunes their whole subtree without visiting it.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._lock = threading.Lock()
+        # rel_dir -> (compiled spec or None, ((ignore file path, mtime_ns), ...))
+        self._specs: dict[str, tuple[pathspec.PathSpec | None, tuple]] = {}
+
+    def _source_paths(self, rel_dir: str) -> list[str]:
+        abs_dir = os.path.join(self.root, rel_dir)
+        paths = [os.path.join(abs_dir, name) for name in IGNORE_FILE_NAMES]
+        if rel_dir == "":
+            paths.insert(0, os.path.join(self.root, ROOT_EXCLUDE_FILE))
+        return paths
+
+    def _stat_sources(self, rel_dir: str) -> tuple:
+        sources = []
+        for path in self._source_paths(rel_dir):
+            try:
+                sources.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                continue
+        return tuple(sources)
+
+    def _compile(self, rel_dir: str) -> tuple[pathspec.PathSpec | None, tuple]:
+        sources = self._stat_sources(rel_dir)
+        lines = []
+        for path, _ in sources:
+            lines += _read_lines(path)
+        spec = pathspec.PathSpec.from_lines("gitwildmatch", lines) if lines else None
+        return spec, sources
+
+    def _get_spec(self, rel_dir: str) -> pathspec.PathSpec | None:
+        compiled = self._specs.get(rel_dir)
+        if compiled is None:
+            compiled = self._compile(rel_dir)
+            with self._lock:
+                self._specs[rel_dir] = compiled
+        return compiled[0]
+
+    def reload(self, rel_dir: str) -> bool:
+        """Recompiles the ignore rules of `rel_dir`, returning True if they changed."""
+        with self._lock:
+            previous = self._specs.pop(rel_dir, None)
+        if previous is None:
+            return False
+        return self._stat_sources(rel_dir) != previous[1]
+
+    def changed_dirs(self, rel_dirs: list[str] | None = None) -> list[str]:
+        """
+        Returns the loaded directories (out of `rel_dirs`, if given) whose
+        ignore files were modified, created or deleted.
+        """
+        with self._lock:
+            loaded = [
+                (rel_dir, compiled)
+                for rel_dir, compiled in self._specs.items()
+                if rel_dirs is None or rel_dir in rel_dirs
+            ]
+        return [
+            rel_dir
+            for rel_dir, (_, sources) in loaded
+            if self._stat_sources(rel_dir) != sources
+        ]
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """
+        Checks a single entry, assuming its parent directories are not ignored.
+        `rel_path` is relative to the matcher root and uses '/' separators.
+        """
+        suffix = "/" if is_dir else ""
+        if _DEFAULT_SPEC.match_file(rel_path + suffix):
+            return True
+        rel_dir = rel_path
+        while rel_dir:
+            rel_dir = rel_dir.rpartition("/")[0]
+            spec = self._get_spec(rel_dir)
+            if spec is None:
+                continue
+            sub_path = rel_path[len(rel_dir) + 1 :] if rel_dir else rel_path
+            result = spec.check_file(sub_path + suffix)
+            if result.include is not None:
+                return result.include
+        return False
+
+    def is_path_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """Checks an entry and all of its parent directories."""
+        parts = rel_path.strip("/").split("/")
+        for i in range(1, len(parts)):
+            if self.is_ignored("/".join(parts[:i]), is_dir=True):
+                return True
+        return self.is_ignored("/".join(parts), is_dir=is_dir)
@@ -0,0 +1,112 @@
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Iterator
+
+# Byte offset of every LINE_INDEX_STRIDE-th line is kept
+LINE_INDEX_STRIDE = 256
+# Number of files whose line index is kept in memory
+LINE_INDEX_CACHE_SIZE = 32
+_CHUNK_SIZE = 1024 * 1024
+
+
+class LineIndex:
+    """
+    Sparse line-offset index of a file: `offsets[i]` is the byte offset at which
+    line `i * LINE_INDEX_STRIDE` (0-based) starts.
+    """
+
+    def __init__(self, mtime_ns: int, size: int, offsets: array, line_count: int):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.offsets = offsets
+        self.line_count = line_count
+
+
+def build_line_index(path: str) -> LineIndex:
+    offsets = array("Q", [0])
+    # Number of line starts seen so far (line 0 starts at offset 0)
+    line_starts = 1
+    base = 0
+    ends_with_newline = False
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        while True:
+            chunk = f.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            parts = chunk.split(b"\n")
+            # ends[j] + j + 1 is the offset (in chunk) right after the j-th newline
+            ends = list(accumulate(map(len, parts[:-1])))
+            first = (-line_starts) % LINE_INDEX_STRIDE
+            for j in range(first, len(ends), LINE_INDEX_STRIDE):
+                offsets.append(base + ends[j] + j + 1)
+            line_starts += len(ends)
+            base += len(chunk)
+            ends_with_newline = chunk.endswith(b"\n")
+    # An empty file, or a trailing newline, does not start another line
+    line_count = line_starts - 1 if base == 0 or ends_with_newline else line_starts
+    return LineIndex(stat.st_mtime_ns, stat.st_size, offsets, line_count)
+
+
+_cache: OrderedDict[str, LineIndex] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_line_index(path: str) -> LineIndex:
+    """Returns the line index of `path`, rebuilding it if the file's mtime or size changed."""
+    key = os.path.realpath(path)
+    stat = os.stat(key)
+    with _cache_lock:
+        index = _cache.get(key)
+        if (
+            index is not None
+            and index.mtime_ns == stat.st_mtime_ns
+            and index.size == stat.st_size
+        ):
+            _cache.move_to_end(key)
+            return index
+    index = build_line_index(key)
+    with _cache_lock:
+        _cache[key] = index
+        _cache.move_to_end(key)
+        while len(_cache) > LINE_INDEX_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return index
+
+
+def iter_line_range(
+    path: str, start_line: int, end_line: int | None, max_line_bytes: int | None = None
+) -> Iterator[bytes]:
+    """
+    Yields the raw lines `start_line` to `end_line` (0-based, inclusive, None for
+    the end of the file), each with its trailing newline if it has one. Only the
+    requested range (plus at most LINE_INDEX_STRIDE lines) is read, through mmap.
+    Lines longer than `max_line_bytes` are cut short (without their newline).
+    """
+    index = get_line_index(path)
+    if index.size == 0 or start_line >= index.line_count:
+        return
+    checkpoint = start_line // LINE_INDEX_STRIDE
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        position = index.offsets[checkpoint]
+        size = len(mm)
+        line_num = checkpoint * LINE_INDEX_STRIDE
+        while position < size and (end_line is None or line_num <= end_line):
+            newline = mm.find(b"\n", position)
+            line_end = size if newline == -1 else newline + 1
+            if line_num >= start_line:
+                if max_line_bytes is not None and line_end - position > max_line_bytes:
+                    yield mm[position : position + max_line_bytes]
+                else:
+                    yield mm[position:line_end]
+            position = line_end
+            line_num += 1
+
+
+def read_line_range(path: str, start_line: int, end_line: int | None) -> list[bytes]:
+    """Returns the lines yielded by `iter_line_range` as a list."""
+    return list(iter_line_range(path, start_line, end_line))
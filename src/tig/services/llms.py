@@ -1,9 +1,11 @@
 import os
+from dataclasses import dataclass
+from typing import Any, Sequence
 
 from dotenv import load_dotenv
 
 from llama_index.llms.google_genai import GoogleGenAI
-from llama_index.core.llms import LLM
+from llama_index.core.llms import LLM, ChatMessage, MessageRole
 
 
 SUPPORTED_PROVIDERS = [
@@ -14,11 +16,17 @@ SUPPORTED_PROVIDERS = [
     "ollama",
     "groq",
     "openrouter",
+    "replay",
 ]
 
 DEFAULT_PROVIDER = "google"
 DEFAULT_MODEL = "gemini-2.0-flash"
 
+# Providers that only cache the parts of the prompt marked with cache_control.
+# The others (openai, deepseek, groq, google) cache repeated prompt prefixes on
+# their own, which only requires the static part of the prompt to come first.
+CACHE_CONTROL_PROVIDERS = ["anthropic"]
+
 
 def get_llm() -> tuple[LLM, str, str]:
     """Load the LLM from the environment variables or use default values. Returns a tuple of (LLM, provider, model_name)."""
@@ -91,6 +99,20 @@ def get_llm() -> tuple[LLM, str, str]:
         )
         return llm, provider, llm.model
 
+    if provider == "replay":
+        from tig.services.replay import ReplayLLM
+
+        transcript_path = os.getenv("TIG_REPLAY_TRANSCRIPT") or model_name
+        if not transcript_path:
+            raise ValueError(
+                "The replay provider needs a transcript: set TIG_REPLAY_TRANSCRIPT to a file recorded with TIG_RECORD_TRANSCRIPT."
+            )
+        llm = ReplayLLM(
+            transcript_path=transcript_path,
+            simulate_latency=os.getenv("TIG_REPLAY_LATENCY", "false").lower() == "true",
+        )
+        return llm, provider, llm.model
+
     if provider == "openrouter":
         from llama_index.llms.openrouter import OpenRouter
 
@@ -108,3 +130,118 @@ def get_llm() -> tuple[LLM, str, str]:
             else GoogleGenAI(model=DEFAULT_MODEL)
         )
         return llm, provider, llm.model
+
+
+def mark_cache_breakpoints(messages: Sequence[ChatMessage], provider: str | None):
+    """
+    Adds the provider's prompt caching markers to `messages`, in place: one
+    after the static system prompt (the first message), reused across turns
+    and tasks, and one after the latest user message, so that each turn reads
+    the whole conversation so far from the cache. Markers from earlier turns
+    are removed, as providers limit how many a request may have.
+    """
+    if provider not in CACHE_CONTROL_PROVIDERS:
+        return
+    last_user_index = max(
+        (i for i, message in enumerate(messages) if message.role == MessageRole.USER),
+        default=None,
+    )
+    for i, message in enumerate(messages):
+        if i == 0 or i == last_user_index:
+            message.additional_kwargs["cache_control"] = {"type": "ephemeral"}
+        else:
+            message.additional_kwargs.pop("cache_control", None)
+
+
+def copy_messages(messages: Sequence[ChatMessage]) -> list[ChatMessage]:
+    """
+    Copies the messages to send to the LLM, so that the provider cannot change
+    the chat history: e.g. Google GenAI merges neighboring messages of the same
+    role (such as the static and volatile system prompts) by extending the
+    blocks of a shallow copy of the first one, which would grow it on every call.
+    """
+    return [
+        message.model_copy(
+            update={
+                "blocks": list(message.blocks),
+                "additional_kwargs": dict(message.additional_kwargs),
+            }
+        )
+        for message in messages
+    ]
+
+
+@dataclass
+class TokenUsage:
+    """Tokens used by one LLM call, as reported by the provider (0 if not reported)."""
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # Input tokens read from the provider's prompt cache
+    cached_input_tokens: int = 0
+    # Input tokens written to the provider's prompt cache
+    cache_write_tokens: int = 0
+
+    def merge(self, other: "TokenUsage") -> "TokenUsage":
+        """Combines the usage reported by the chunks of a streamed response."""
+        return TokenUsage(
+            input_tokens=max(self.input_tokens, other.input_tokens),
+            output_tokens=max(self.output_tokens, other.output_tokens),
+            cached_input_tokens=max(self.cached_input_tokens, other.cached_input_tokens),
+            cache_write_tokens=max(self.cache_write_tokens, other.cache_write_tokens),
+        )
+
+
+def _get(obj: Any, key: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(key)
+    return getattr(obj, key, None)
+
+
+def get_token_usage(raw: Any) -> TokenUsage | None:
+    """
+    Extracts the token usage from the raw response of any supported provider,
+    or returns None if the response does not report it.
+    """
+    # Replayed responses carry their recorded usage as is
+    if isinstance(raw, TokenUsage):
+        return raw
+    # Google GenAI
+    usage = _get(raw, "usage_metadata")
+    if usage is not None:
+        return TokenUsage(
+            input_tokens=_get(usage, "prompt_token_count") or 0,
+            output_tokens=_get(usage, "candidates_token_count") or 0,
+            cached_input_tokens=_get(usage, "cached_content_token_count") or 0,
+        )
+    # Ollama
+    if _get(raw, "prompt_eval_count") is not None:
+        return TokenUsage(
+            input_tokens=_get(raw, "prompt_eval_count") or 0,
+            output_tokens=_get(raw, "eval_count") or 0,
+        )
+    # Anthropic streams report the usage in their message_start event
+    usage = _get(raw, "usage") or _get(_get(raw, "message"), "usage")
+    if usage is None:
+        return None
+    # Anthropic
+    if _get(usage, "input_tokens") is not None or _get(usage, "output_tokens") is not None:
+        cached = _get(usage, "cache_read_input_tokens") or 0
+        written = _get(usage, "cache_creation_input_tokens") or 0
+        return TokenUsage(
+            input_tokens=(_get(usage, "input_tokens") or 0) + cached + written,
+            output_tokens=_get(usage, "output_tokens") or 0,
+            cached_input_tokens=cached,
+            cache_write_tokens=written,
+        )
+    # OpenAI compatible (openai, deepseek, groq, openrouter)
+    cached = _get(_get(usage, "prompt_tokens_details"), "cached_tokens")
+    if cached is None:
+        cached = _get(usage, "prompt_cache_hit_tokens")
+    return TokenUsage(
+        input_tokens=_get(usage, "prompt_tokens") or 0,
+        output_tokens=_get(usage, "completion_tokens") or 0,
+        cached_input_tokens=cached or 0,
+    )
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from dataclasses import asdict
+from typing import Any, Sequence
+
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseGen,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+from llama_index.core.llms.custom import CustomLLM
+from pydantic import Field, PrivateAttr
+
+from tig.services.llms import TokenUsage
+
+# Size of the deltas a replayed response is streamed in
+REPLAY_STREAM_CHUNK_CHARS = 16
+# Served once the transcript runs out, so that an offline run always terminates
+TRANSCRIPT_EXHAUSTED_RESPONSE = "<attempt_completion>\n<result>\nThe replay transcript has no more recorded responses.\n</result>\n</attempt_completion>"
+
+
+def load_transcript(path: str) -> list[dict]:
+    """Reads the records of a transcript written by TranscriptRecorder, one JSON object per line."""
+    records = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
+class ReplayLLM(CustomLLM):
+    """
+    LLM that serves the responses of a recorded session, in order, instead of
+    calling a provider. Runs are deterministic and offline, so that Tig's own
+    overhead (tools, parsing, prompt building) can be measured on its own.
+    The recorded latencies are only reproduced with `simulate_latency`.
+    """
+
+    transcript_path: str = Field(description="Path of the transcript to replay.")
+    simulate_latency: bool = Field(
+        default=False, description="Wait for the recorded latency of each response."
+    )
+    _records: list[dict] = PrivateAttr(default_factory=list)
+    _position: int = PrivateAttr(default=0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._records = load_transcript(self.transcript_path)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "replay_llm"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(is_chat_model=True, model_name=self.model)
+
+    @property
+    def model(self) -> str:
+        return os.path.basename(self.transcript_path)
+
+    @property
+    def remaining(self) -> int:
+        return len(self._records) - self._position
+
+    def _next_record(self) -> dict:
+        with self._lock:
+            if self._position >= len(self._records):
+                return {"response": TRANSCRIPT_EXHAUSTED_RESPONSE}
+            record = self._records[self._position]
+            self._position += 1
+            return record
+
+    @staticmethod
+    def _usage(record: dict) -> TokenUsage | None:
+        usage = record.get("usage")
+        return TokenUsage(**usage) if usage else None
+
+    @staticmethod
+    def _chunks(text: str) -> list[str]:
+        return [
+            text[i : i + REPLAY_STREAM_CHUNK_CHARS]
+            for i in range(0, len(text), REPLAY_STREAM_CHUNK_CHARS)
+        ]
+
+    def _chat_response(self, record: dict) -> ChatResponse:
+        return ChatResponse(
+            message=ChatMessage(role=MessageRole.ASSISTANT, content=record["response"]),
+            raw=self._usage(record),
+        )
+
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        record = self._next_record()
+        if self.simulate_latency:
+            time.sleep(record.get("latency_sec", 0))
+        return self._chat_response(record)
+
+    @llm_chat_callback()
+    async def achat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponse:
+        record = self._next_record()
+        if self.simulate_latency:
+            await asyncio.sleep(record.get("latency_sec", 0))
+        return self._chat_response(record)
+
+    @llm_chat_callback()
+    def stream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponseGen:
+        record = self._next_record()
+
+        def gen() -> ChatResponseGen:
+            text = ""
+            for delta in self._chunks(record["response"]):
+                text += delta
+                yield ChatResponse(
+                    message=ChatMessage(role=MessageRole.ASSISTANT, content=text),
+                    delta=delta,
+                    raw=self._usage(record),
+                )
+
+        return gen()
+
+    @llm_chat_callback()
+    async def astream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponseAsyncGen:
+        record = self._next_record()
+        chunks = self._chunks(record["response"])
+        delay = record.get("latency_sec", 0) / max(len(chunks), 1)
+
+        async def gen() -> ChatResponseAsyncGen:
+            text = ""
+            for delta in chunks:
+                if self.simulate_latency:
+                    await asyncio.sleep(delay)
+                text += delta
+                yield ChatResponse(
+                    message=ChatMessage(role=MessageRole.ASSISTANT, content=text),
+                    delta=delta,
+                    raw=self._usage(record),
+                )
+
+        return gen()
+
+    @llm_completion_callback()
+    def complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponse:
+        record = self._next_record()
+        return CompletionResponse(text=record["response"], raw=self._usage(record))
+
+    @llm_completion_callback()
+    def stream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseGen:
+        record = self._next_record()
+
+        def gen() -> CompletionResponseGen:
+            text = ""
+            for delta in self._chunks(record["response"]):
+                text += delta
+                yield CompletionResponse(text=text, delta=delta)
+
+        return gen()
+
+
+class TranscriptRecorder:
+    """
+    Appends each LLM call of a live session to a transcript that ReplayLLM
+    can serve later: the response, the token usage and the latency.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        messages: Sequence[ChatMessage],
+        response: str,
+        usage: TokenUsage | None,
+        latency_sec: float,
+    ):
+        record = {
+            "message_count": len(messages),
+            "response": response,
+            "usage": asdict(usage) if usage else None,
+            "latency_sec": round(latency_sec, 4),
+        }
+        with self._lock:
+            try:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                print(f"\nWarning: Could not record the LLM response to '{self.path}': {e}\n")
+
+
+_recorders: dict[str, TranscriptRecorder] = {}
+_recorders_lock = threading.Lock()
+
+
+def get_transcript_recorder() -> TranscriptRecorder | None:
+    """Returns the recorder of the transcript set in TIG_RECORD_TRANSCRIPT, if any."""
+    path = os.getenv("TIG_RECORD_TRANSCRIPT")
+    if not path:
+        return None
+    path = os.path.abspath(path)
+    with _recorders_lock:
+        if path not in _recorders:
+            _recorders[path] = TranscriptRecorder(path)
+        return _recorders[path]
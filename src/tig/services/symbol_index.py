@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Callable
+
+INDEX_DIR_NAME = ".tig"
+INDEX_FILE_NAME = "symbol_index.json"
+# Bump whenever the definition format or the tree-sitter queries change
+INDEX_VERSION = 1
+
+
+def hash_content(content: bytes) -> str:
+    return hashlib.sha1(content).hexdigest()
+
+
+def read_source(path: str) -> tuple[int, int, str, str]:
+    """Reads a source file, returning `(mtime_ns, size, content_hash, code)`."""
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        raw = f.read()
+    return stat.st_mtime_ns, stat.st_size, hash_content(raw), raw.decode("utf8")
+
+
+class SymbolIndex:
+    """
+    On-disk cache of code definitions, keyed by absolute file path.
+
+    An entry is reused without reading the file when its mtime and size are
+    unchanged. If only the mtime changed (e.g. after a `touch` or checkout),
+    the content hash decides whether the stored definitions are still valid.
+    """
+
+    def __init__(self, workspace: str):
+        self.workspace = os.path.abspath(workspace)
+        self.index_path = os.path.join(
+            self.workspace, INDEX_DIR_NAME, INDEX_FILE_NAME
+        )
+        self._lock = threading.Lock()
+        # Serializes saves, so that an older snapshot cannot replace a newer one
+        self._save_lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, OSError):
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        self._entries = data.get("files", {})
+
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                # Entries are replaced, never changed in place, so a shallow copy is a snapshot
+                data = {"version": INDEX_VERSION, "files": dict(self._entries)}
+                self._dirty = False
+            tmp_path = None
+            try:
+                index_dir = os.path.dirname(self.index_path)
+                os.makedirs(index_dir, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(
+                    dir=index_dir, prefix=INDEX_FILE_NAME, suffix=".tmp"
+                )
+                with os.fdopen(fd, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.index_path)
+            except OSError:
+                # The index is only a cache, a read-only workspace must not break the tool
+                if tmp_path is not None and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def lookup(self, path: str) -> tuple[list[str] | None, str | None]:
+        """
+        Returns `(definitions, content_hash)` for `path` without reading the file.
+        `definitions` is None when the mtime or size changed since it was indexed,
+        in which case the stored content hash (if any) is returned for comparison.
+        """
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None, None
+        if entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["definitions"], entry["hash"]
+        return None, entry["hash"]
+
+    def store(
+        self,
+        path: str,
+        mtime_ns: int,
+        size: int,
+        content_hash: str,
+        definitions: list[str] | None,
+    ) -> list[str]:
+        """
+        Records the definitions of `path`. Passing None for `definitions` keeps the
+        previously stored ones, for when the content hash showed they are still valid.
+        """
+        key = os.path.abspath(path)
+        with self._lock:
+            if definitions is None:
+                definitions = self._entries[key]["definitions"]
+            self._entries[key] = {
+                "mtime": mtime_ns,
+                "size": size,
+                "hash": content_hash,
+                "definitions": definitions,
+            }
+            self._dirty = True
+        return definitions
+
+    def get_definitions(
+        self, path: str, extract: Callable[[str], list[str]]
+    ) -> list[str]:
+        """
+        Returns the definitions for `path`, calling `extract(code)` only when the
+        file is new or its content has changed since it was last indexed.
+        """
+        definitions, known_hash = self.lookup(path)
+        if definitions is not None:
+            return definitions
+        mtime_ns, size, content_hash, code = read_source(path)
+        if content_hash != known_hash:
+            definitions = extract(code)
+        return self.store(path, mtime_ns, size, content_hash, definitions)
+
+    def prune(self):
+        """Drops entries for files that no longer exist."""
+        with self._lock:
+            paths = list(self._entries)
+        # Checked outside the lock, so that other tools are not held up
+        missing = [path for path in paths if not os.path.isfile(path)]
+        with self._lock:
+            for path in missing:
+                self._entries.pop(path, None)
+            if missing:
+                self._dirty = True
+
+
+_indexes: dict[str, SymbolIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_symbol_index(workspace: str | None = None) -> SymbolIndex:
+    """Returns the symbol index of the workspace (defaults to the current directory)."""
+    workspace = os.path.abspath(workspace or os.getcwd())
+    with _indexes_lock:
+        if workspace not in _indexes:
+            _indexes[workspace] = SymbolIndex(workspace)
+        return _indexes[workspace]
@@ -0,0 +1,230 @@
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+INDEX_DIR_NAME = ".tig"
+# Default trace file, relative to the workspace
+DEFAULT_TRACE_FILE = os.path.join(INDEX_DIR_NAME, "traces.jsonl")
+# Span kinds
+KIND_TASK = "task"
+KIND_STEP = "step"
+KIND_LLM = "llm"
+KIND_TOOL = "tool"
+KIND_APPROVAL = "approval"
+KIND_INTERNAL = "internal"
+
+
+@dataclass
+class Span:
+    name: str
+    kind: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration_sec(self) -> float:
+        return max(self.end_ns - self.start_ns, 0) / 1e9
+
+    def set(self, **attributes: Any):
+        """Sets attributes of the span, ignoring None values."""
+        self.attributes.update(
+            {key: value for key, value in attributes.items() if value is not None}
+        )
+
+    def to_dict(self) -> dict:
+        """
+        One line of the trace file. The field names are borrowed from
+        OpenTelemetry, but this is not OTLP: `kind` is one of the KIND_*
+        strings and `attributes` is a plain object.
+        """
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+        }
+
+
+_current_tracer: contextvars.ContextVar["Tracer | None"] = contextvars.ContextVar(
+    "tig_tracer", default=None
+)
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar(
+    "tig_span", default=None
+)
+
+
+class Tracer:
+    """
+    Records timed spans of a task (workflow steps, LLM calls, tools, approval
+    waits) and appends them to a JSONL file once the task ends, one span per
+    line. Spans started in the same context are nested; spans started
+    elsewhere (e.g. in another workflow step) are children of the task span.
+    """
+
+    def __init__(self, path: str = DEFAULT_TRACE_FILE):
+        self.path = os.path.abspath(path)
+        self.spans: list[Span] = []
+        self.root: Span | None = None
+        self._lock = threading.Lock()
+
+    def start_trace(self, name: str, **attributes: Any) -> Span:
+        self.spans = []
+        self.root = Span(
+            name=name,
+            kind=KIND_TASK,
+            trace_id=secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=None,
+            start_ns=time.time_ns(),
+        )
+        self.root.set(**attributes)
+        return self.root
+
+    @contextmanager
+    def span(self, name: str, kind: str = KIND_INTERNAL, **attributes: Any) -> Iterator[Span]:
+        if self.root is None:
+            self.start_trace("task")
+        parent = _current_span.get() or self.root
+        span = Span(
+            name=name,
+            kind=kind,
+            trace_id=self.root.trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id,
+            start_ns=time.time_ns(),
+        )
+        span.set(**attributes)
+        tracer_token = _current_tracer.set(self)
+        span_token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(span_token)
+            _current_tracer.reset(tracer_token)
+            with self._lock:
+                self.spans.append(span)
+
+    def end_trace(self) -> list[Span]:
+        """Ends the task span, writes the task's spans to the trace file and returns them."""
+        if self.root is None:
+            return []
+        self.root.end_ns = time.time_ns()
+        with self._lock:
+            spans = [self.root] + sorted(self.spans, key=lambda span: span.start_ns)
+            self.spans = []
+        self.root = None
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a") as f:
+                for span in spans:
+                    f.write(json.dumps(span.to_dict(), default=str) + "\n")
+        except OSError as e:
+            print(f"\nWarning: Could not write the trace to '{self.path}': {e}\n")
+        return spans
+
+
+@contextmanager
+def trace_span(name: str, kind: str = KIND_INTERNAL, **attributes: Any) -> Iterator[Span | None]:
+    """Records a span with the tracer of the current task, if tracing is enabled."""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield None
+        return
+    with tracer.span(name, kind, **attributes) as span:
+        yield span
+
+
+def set_span_attributes(**attributes: Any):
+    """Sets attributes of the innermost span being recorded, if tracing is enabled."""
+    span = _current_span.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+def traced_step(func: Callable) -> Callable:
+    """Records a span around a workflow step, when the workflow has a tracer."""
+
+    @functools.wraps(func)
+    async def wrapper(self, *args: Any, **kwargs: Any):
+        tracer: Tracer | None = getattr(self, "tracer", None)
+        if tracer is None:
+            return await func(self, *args, **kwargs)
+        with tracer.span(f"step.{func.__name__}", KIND_STEP):
+            return await func(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _format_bytes(size: float) -> str:
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f} MB"
+    if size >= 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{int(size)} B"
+
+
+def format_trace_summary(spans: list[Span]) -> str:
+    """Formats a per-span-name table of the spans of a task, followed by LLM and tool totals."""
+    if not spans:
+        return ""
+    root = spans[0]
+    by_name: dict[str, list[Span]] = {}
+    for span in spans[1:]:
+        by_name.setdefault(span.name, []).append(span)
+
+    lines = [
+        f"Trace summary: {root.duration_sec:.2f}s in total",
+        f"{'span':<36}{'count':>6}{'total':>10}{'mean':>10}{'max':>10}",
+    ]
+    for name, named_spans in sorted(
+        by_name.items(), key=lambda item: -sum(span.duration_sec for span in item[1])
+    ):
+        durations = [span.duration_sec for span in named_spans]
+        lines.append(
+            f"{name:<36}{len(durations):>6}{sum(durations):>9.2f}s"
+            f"{sum(durations) / len(durations):>9.2f}s{max(durations):>9.2f}s"
+        )
+
+    llm_spans = [span for span in spans if span.kind == KIND_LLM]
+    if llm_spans:
+        ttfts = [
+            span.attributes["ttft_sec"]
+            for span in llm_spans
+            if "ttft_sec" in span.attributes
+        ]
+        input_tokens = sum(span.attributes.get("input_tokens", 0) for span in llm_spans)
+        output_tokens = sum(span.attributes.get("output_tokens", 0) for span in llm_spans)
+        line = f"LLM: {len(llm_spans)} calls, {sum(span.duration_sec for span in llm_spans):.2f}s"
+        if ttfts:
+            line += f", {sum(ttfts) / len(ttfts):.2f}s to first token on average"
+        line += f", {input_tokens} input / {output_tokens} output tokens"
+        lines.append(line)
+
+    tool_spans = [span for span in spans if span.kind == KIND_TOOL]
+    if tool_spans:
+        approval = sum(span.duration_sec for span in spans if span.kind == KIND_APPROVAL)
+        returned = sum(span.attributes.get("bytes_returned", 0) for span in tool_spans)
+        lines.append(
+            f"Tools: {len(tool_spans)} calls, {sum(span.duration_sec for span in tool_spans):.2f}s "
+            f"(of which {approval:.2f}s waiting for approval), {_format_bytes(returned)} returned"
+        )
+    return "\n".join(lines)
@@ -1,3 +1,6 @@
+import threading
+from typing import Callable
+
 from tree_sitter import Language, Parser, Query
 
 from tig.services.tree_sitter.queries import (
@@ -8,34 +11,112 @@ from tig.services.tree_sitter.queries import (
 )
 
 
-def get_parser(ext: str) -> tuple[Parser, Query]:
-    if ext == "py":
-        import tree_sitter_python as tspython
+def _python_language():
+    import tree_sitter_python as tspython
 
-        PY_LANG = Language(tspython.language())
-        parser = Parser(PY_LANG)
-        query = PY_LANG.query(py_query)
-        return parser, query
-    if ext == "js" or ext == "jsx":
-        import tree_sitter_javascript as tsjavascript
+    return tspython.language()
 
-        LANG = Language(tsjavascript.language())
-        parser = Parser(LANG)
-        query = LANG.query(js_query)
-        return parser, query
-    if ext == "ts":
-        import tree_sitter_typescript as tstypescript
 
-        LANG = Language(tstypescript.language_typescript())
-        parser = Parser(LANG)
-        query = LANG.query(ts_query)
-        return parser, query
-    if ext == "tsx":
-        import tree_sitter_typescript as tstypescript
+def _javascript_language():
+    import tree_sitter_javascript as tsjavascript
+
+    return tsjavascript.language()
+
+
+def _typescript_language():
+    import tree_sitter_typescript as tstypescript
+
+    return tstypescript.language_typescript()
+
+
+def _tsx_language():
+    import tree_sitter_typescript as tstypescript
+
+    return tstypescript.language_tsx()
+
+
+# file extension -> (grammar name, grammar loader, query source)
+GRAMMARS: dict[str, tuple[str, Callable, str]] = {
+    "py": ("python", _python_language, py_query),
+    "js": ("javascript", _javascript_language, js_query),
+    "jsx": ("javascript", _javascript_language, js_query),
+    "ts": ("typescript", _typescript_language, ts_query),
+    "tsx": ("tsx", _tsx_language, tsx_query),
+}
 
-        LANG = Language(tstypescript.language_tsx())
-        parser = Parser(LANG)
-        query = LANG.query(tsx_query)
+
+class ParserRegistry:
+    """
+    Process-wide cache of compiled tree-sitter grammars and queries.
+
+    Each Language and Query is built once per grammar and shared by every thread.
+    Parsers keep per-parse state, so each thread gets its own Parser per grammar.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._compiled: dict[str, tuple[Language, Query]] = {}
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_compiled(self, grammar_name: str, loader: Callable, query_source: str):
+        compiled = self._compiled.get(grammar_name)
+        if compiled is not None:
+            return compiled, True
+        with self._lock:
+            # Another thread may have compiled it while we waited for the lock
+            compiled = self._compiled.get(grammar_name)
+            if compiled is not None:
+                return compiled, True
+            language = Language(loader())
+            compiled = (language, language.query(query_source))
+            self._compiled[grammar_name] = compiled
+            return compiled, False
+
+    def get(self, ext: str) -> tuple[Parser, Query]:
+        if ext not in GRAMMARS:
+            raise ValueError(f"Unsupported file extension: {ext}")
+        grammar_name, loader, query_source = GRAMMARS[ext]
+        (language, query), was_cached = self._get_compiled(
+            grammar_name, loader, query_source
+        )
+        parsers = getattr(self._local, "parsers", None)
+        if parsers is None:
+            parsers = self._local.parsers = {}
+        parser = parsers.get(grammar_name)
+        if parser is None:
+            parser = parsers[grammar_name] = Parser(language)
+        with self._lock:
+            if was_cached:
+                self.hits += 1
+            else:
+                self.misses += 1
         return parser, query
-    else:
-        raise ValueError(f"Unsupported file extension: {ext}")
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "grammars": len(self._compiled),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._compiled.clear()
+            self._local = threading.local()
+            self.hits = 0
+            self.misses = 0
+
+
+_registry = ParserRegistry()
+
+
+def get_parser(ext: str) -> tuple[Parser, Query]:
+    return _registry.get(ext)
+
+
+def get_parser_cache_stats() -> dict[str, int]:
+    """Returns the hit and miss counts of the process-wide parser cache."""
+    return _registry.stats()
@@ -0,0 +1,314 @@
+import os
+import re
+import sqlite3
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+from tig.services.file_index import FileIndex
+
+# Queries are derived from the parse tree of CPython's private regex parser,
+# whose layout is known for these versions. Elsewhere no regex is narrowed
+# down, and search_files prefers ripgrep.
+if (3, 11) <= sys.version_info[:2] < (3, 15):
+    try:
+        import re._constants as sre_constants
+        import re._parser as sre_parse
+    except ImportError:
+        sre_constants = sre_parse = None
+else:
+    sre_constants = sre_parse = None
+REGEX_QUERIES_SUPPORTED = sre_parse is not None
+
+INDEX_DIR_NAME = ".tig"
+INDEX_FILE_NAME = "trigram_index.sqlite"
+# Larger files are not indexed and always verified directly
+MAX_INDEXED_FILE_SIZE = 4 * 1024 * 1024
+# A query with more alternatives than this is not worth narrowing down
+MAX_QUERY_ALTERNATIVES = 16
+
+
+def _trigrams(data: bytes) -> array:
+    """Returns the sorted, distinct, case-folded byte trigrams of `data`."""
+    data = data.lower()
+    grams = {data[i : i + 3] for i in range(len(data) - 2)}
+    return array("I", sorted(int.from_bytes(gram, "big") for gram in grams))
+
+
+def _literal_trigrams(literal: str) -> set[int]:
+    data = literal.encode("utf-8").lower()
+    return {int.from_bytes(data[i : i + 3], "big") for i in range(len(data) - 2)}
+
+
+def _is_binary(data: bytes) -> bool:
+    return b"\0" in data[:8192]
+
+
+def _required_literals(items, ignore_case: bool) -> list[list[str]]:
+    """
+    Walks a parsed regex and returns the literal strings a match must contain,
+    as a list of alternatives (any one of which may hold), each a list of
+    literals that all have to be present. `[[]]` means no constraint.
+    """
+    alternatives: list[list[str]] = [[]]
+    run = ""
+
+    def flush():
+        nonlocal run
+        if len(run) >= 3:
+            for alternative in alternatives:
+                alternative.append(run)
+        run = ""
+
+    def combine(inner: list[list[str]]):
+        nonlocal alternatives
+        combined = [a + b for a in alternatives for b in inner]
+        # Too many alternatives: keep only what all of them require (sound, less precise)
+        alternatives = combined if len(combined) <= MAX_QUERY_ALTERNATIVES else [[]]
+
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            char = chr(av)
+            if ignore_case and not char.isascii():
+                # Byte-level case folding is only valid for ASCII
+                flush()
+                continue
+            run += char
+            continue
+        flush()
+        if op is sre_constants.SUBPATTERN:
+            combine(_required_literals(av[-1], ignore_case))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            combine(_required_literals(av[2], ignore_case))
+        elif op is sre_constants.BRANCH:
+            inner = []
+            for branch in av[1]:
+                inner += _required_literals(branch, ignore_case)
+            combine(inner)
+    flush()
+    return alternatives
+
+
+def regex_trigram_query(regex: str) -> list[set[int]] | None:
+    """
+    Returns the trigram sets a file must contain (any one of them) to possibly
+    match `regex`, or None if the regex cannot be narrowed down.
+    """
+    if not REGEX_QUERIES_SUPPORTED:
+        return None
+    try:
+        parsed = sre_parse.parse(regex, 0)
+        ignore_case = bool(parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE)
+        alternatives = _required_literals(list(parsed), ignore_case)
+    except (re.error, RecursionError):
+        return None
+    except (AttributeError, TypeError, ValueError, IndexError):
+        # A parse tree layout this module does not know
+        return None
+    query = []
+    for literals in alternatives:
+        trigrams = set()
+        for literal in literals:
+            trigrams |= _literal_trigrams(literal)
+        if not trigrams:
+            return None
+        query.append(trigrams)
+    return query
+
+
+def _contains_all(trigrams: array, required: set[int]) -> bool:
+    for trigram in required:
+        i = bisect_left(trigrams, trigram)
+        if i == len(trigrams) or trigrams[i] != trigram:
+            return False
+    return True
+
+
+class TrigramIndex:
+    """
+    Persistent trigram index of the workspace files, used by search_files to
+    narrow a regex down to candidate files before verifying them.
+
+    Each file's distinct trigrams are stored as a sorted array in SQLite at
+    <workspace>/.tig/trigram_index.sqlite. The first `update()` checks the
+    mtime and size of every file in a background thread; later ones only
+    check the files the file index reports as changed since, so repeated
+    searches in a session are cheap.
+    """
+
+    def __init__(self, workspace: str):
+        self.workspace = os.path.abspath(workspace)
+        self.index_path = os.path.join(self.workspace, INDEX_DIR_NAME, INDEX_FILE_NAME)
+        self._lock = threading.Lock()
+        # rel_path -> (mtime_ns, size, trigrams); trigrams is None if not indexable
+        self._files: dict[str, tuple[int, int, array | None]] = {}
+        # File index generation the index is current with, None before the first update
+        self._generation: int | None = None
+        self._builder: threading.Thread | None = None
+        self._db: sqlite3.Connection | None = None
+        self._open()
+
+    def _open(self):
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            self._db = sqlite3.connect(self.index_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, trigrams BLOB)"
+            )
+            rows = self._db.execute("SELECT path, mtime_ns, size, trigrams FROM files")
+            for path, mtime_ns, size, blob in rows:
+                trigrams = None
+                if blob is not None:
+                    trigrams = array("I")
+                    trigrams.frombytes(blob)
+                self._files[path] = (mtime_ns, size, trigrams)
+        except sqlite3.Error:
+            # The index then only lives in memory for this session
+            self._db = None
+
+    def update(self, file_index: FileIndex) -> bool:
+        """
+        Brings the index in line with the workspace files of `file_index`.
+        Returns False while the first update still runs in the background (or
+        the file index is incomplete), in which case `candidates()` cannot
+        narrow a search down yet.
+        """
+        if self._builder is not None:
+            return False
+        with self._lock:
+            if self._builder is not None:
+                return False
+            if self._generation is None:
+                self._builder = threading.Thread(
+                    target=self._build,
+                    args=(file_index,),
+                    name="tig-trigram-index",
+                    daemon=True,
+                )
+                self._builder.start()
+                return False
+            return self._sync(file_index)
+
+    def _build(self, file_index: FileIndex):
+        with self._lock:
+            try:
+                self._sync(file_index)
+            finally:
+                self._builder = None
+
+    def _sync(self, file_index: FileIndex) -> bool:
+        file_index.refresh()
+        # Read before listing, so that changes made meanwhile are checked next time
+        generation = file_index.generation
+        if (
+            generation == self._generation
+            and file_index.complete
+            # Otherwise changed file contents do not show in the generation
+            and file_index.changed_paths_since(generation) is not None
+        ):
+            return True
+        rel_paths = file_index.files_under(file_index.root)
+        if rel_paths is None:
+            return False
+        current = set(rel_paths)
+        changed_paths = (
+            file_index.changed_paths_since(self._generation)
+            if self._generation is not None
+            else None
+        )
+        if changed_paths is None:
+            to_check = current
+        else:
+            to_check = (changed_paths & current) | (current - self._files.keys())
+        changed = []
+        for rel_path in to_check:
+            try:
+                stat = os.stat(os.path.join(self.workspace, rel_path))
+            except OSError:
+                continue
+            entry = self._files.get(rel_path)
+            if (
+                entry is not None
+                and entry[0] == stat.st_mtime_ns
+                and entry[1] == stat.st_size
+            ):
+                continue
+            trigrams = None
+            if stat.st_size <= MAX_INDEXED_FILE_SIZE:
+                try:
+                    with open(os.path.join(self.workspace, rel_path), "rb") as f:
+                        data = f.read()
+                    if not _is_binary(data):
+                        trigrams = _trigrams(data)
+                except OSError:
+                    pass
+            self._files[rel_path] = (stat.st_mtime_ns, stat.st_size, trigrams)
+            changed.append(rel_path)
+        removed = self._files.keys() - current
+        for rel_path in removed:
+            del self._files[rel_path]
+        self._persist(changed, removed)
+        self._generation = generation
+        return True
+
+    def _persist(self, changed: list[str], removed: set[str]):
+        if self._db is None or not (changed or removed):
+            return
+        try:
+            with self._db:
+                self._db.executemany(
+                    "DELETE FROM files WHERE path = ?", [(p,) for p in removed]
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                    [
+                        (
+                            path,
+                            self._files[path][0],
+                            self._files[path][1],
+                            self._files[path][2].tobytes()
+                            if self._files[path][2] is not None
+                            else None,
+                        )
+                        for path in changed
+                    ],
+                )
+        except sqlite3.Error:
+            pass
+
+    def candidates(self, rel_paths: list[str], regex: str) -> list[str]:
+        """
+        Returns the subset of `rel_paths` that may contain a match for `regex`.
+        Binary files are left out; files too large to index are always kept.
+        """
+        query = regex_trigram_query(regex)
+        result = []
+        with self._lock:
+            for rel_path in rel_paths:
+                entry = self._files.get(rel_path)
+                if entry is None:
+                    continue
+                trigrams = entry[2]
+                if trigrams is None:
+                    if entry[1] > MAX_INDEXED_FILE_SIZE:
+                        result.append(rel_path)
+                    continue
+                if query is None or any(
+                    _contains_all(trigrams, required) for required in query
+                ):
+                    result.append(rel_path)
+        return result
+
+
+_indexes: dict[str, TrigramIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_trigram_index(workspace: str | None = None) -> TrigramIndex:
+    """Returns the trigram index of the workspace (defaults to the current directory)."""
+    workspace = os.path.abspath(workspace or os.getcwd())
+    with _indexes_lock:
+        if workspace not in _indexes:
+            _indexes[workspace] = TrigramIndex(workspace)
+        return _indexes[workspace]
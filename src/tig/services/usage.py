@@ -0,0 +1,264 @@
+import re
+import weakref
+from dataclasses import dataclass
+
+from llama_index.core.llms import ChatMessage
+
+from tig.services.context import estimate_messages_tokens, estimate_tokens
+from tig.services.llms import TokenUsage
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """USD per million tokens. Cache prices default to the input price when not set."""
+
+    input: float
+    output: float
+    cached_input: float | None = None
+    cache_write: float | None = None
+
+
+# Local price table, keyed by (provider, model). A model name matches the
+# longest model key it starts with, so that dated versions
+# (e.g. "claude-3-5-haiku-20241022") share the price of their family.
+# "*" matches any model of the provider.
+MODEL_PRICES: dict[tuple[str, str], ModelPrice] = {
+    ("google", "gemini-2.5-pro"): ModelPrice(1.25, 10.0, 0.31),
+    ("google", "gemini-2.5-flash"): ModelPrice(0.30, 2.50, 0.075),
+    ("google", "gemini-2.0-flash"): ModelPrice(0.10, 0.40, 0.025),
+    ("google", "gemini-2.0-flash-lite"): ModelPrice(0.075, 0.30),
+    ("google", "gemini-1.5-pro"): ModelPrice(1.25, 5.0),
+    ("google", "gemini-1.5-flash"): ModelPrice(0.075, 0.30),
+    ("openai", "gpt-4.1"): ModelPrice(2.0, 8.0, 0.50),
+    ("openai", "gpt-4.1-mini"): ModelPrice(0.40, 1.60, 0.10),
+    ("openai", "gpt-4.1-nano"): ModelPrice(0.10, 0.40, 0.025),
+    ("openai", "gpt-4o"): ModelPrice(2.50, 10.0, 1.25),
+    ("openai", "gpt-4o-mini"): ModelPrice(0.15, 0.60, 0.075),
+    ("openai", "o3"): ModelPrice(2.0, 8.0, 0.50),
+    ("openai", "o3-mini"): ModelPrice(1.10, 4.40, 0.55),
+    ("openai", "o4-mini"): ModelPrice(1.10, 4.40, 0.275),
+    ("anthropic", "claude-3-5-haiku"): ModelPrice(0.80, 4.0, 0.08, 1.0),
+    ("anthropic", "claude-3-5-sonnet"): ModelPrice(3.0, 15.0, 0.30, 3.75),
+    ("anthropic", "claude-3-7-sonnet"): ModelPrice(3.0, 15.0, 0.30, 3.75),
+    ("anthropic", "claude-sonnet-4"): ModelPrice(3.0, 15.0, 0.30, 3.75),
+    ("anthropic", "claude-3-opus"): ModelPrice(15.0, 75.0, 1.50, 18.75),
+    ("anthropic", "claude-opus-4"): ModelPrice(15.0, 75.0, 1.50, 18.75),
+    ("deepseek", "deepseek-chat"): ModelPrice(0.27, 1.10, 0.07),
+    ("deepseek", "deepseek-reasoner"): ModelPrice(0.55, 2.19, 0.14),
+    ("groq", "llama-3.3-70b-versatile"): ModelPrice(0.59, 0.79),
+    ("groq", "llama-3.1-8b-instant"): ModelPrice(0.05, 0.08),
+    ("ollama", "*"): ModelPrice(0.0, 0.0),
+    ("replay", "*"): ModelPrice(0.0, 0.0),
+}
+# Number of tool outputs listed in the breakdown of the largest ones
+TOP_TOOL_OUTPUTS = 5
+
+_TOOL_RESULT_TARGET = re.compile(r"^\s*\[\w+ for (?P<target>[^\n]*?)\]")
+
+
+def _normalize_model(model: str) -> str:
+    # OpenRouter writes versions with dots, e.g. "anthropic/claude-3.5-sonnet"
+    return model.lower().split("/")[-1].replace(".", "-")
+
+
+def get_model_price(provider: str | None, model: str | None) -> ModelPrice | None:
+    """Looks up the price of a model, None if it is not in MODEL_PRICES."""
+    if not provider:
+        return None
+    model = _normalize_model(model or "")
+    best_price, best_length = None, -1
+    for (key_provider, key_model), price in MODEL_PRICES.items():
+        # OpenRouter serves the models of every provider
+        if key_provider != provider and (provider != "openrouter" or key_model == "*"):
+            continue
+        if key_model == "*":
+            length = 0
+        elif model.startswith(_normalize_model(key_model)):
+            length = len(key_model)
+        else:
+            continue
+        if length > best_length:
+            best_price, best_length = price, length
+    return best_price
+
+
+def estimate_cost(price: ModelPrice | None, usage: TokenUsage) -> float | None:
+    """Estimated cost of an LLM call in USD, None if the price is unknown."""
+    if price is None:
+        return None
+    cached_price = price.input if price.cached_input is None else price.cached_input
+    write_price = price.input if price.cache_write is None else price.cache_write
+    uncached = max(
+        usage.input_tokens - usage.cached_input_tokens - usage.cache_write_tokens, 0
+    )
+    return (
+        uncached * price.input
+        + usage.cached_input_tokens * cached_price
+        + usage.cache_write_tokens * write_price
+        + usage.output_tokens * price.output
+    ) / 1_000_000
+
+
+@dataclass
+class TurnUsage:
+    """Usage of one LLM call."""
+
+    turn: int
+    usage: TokenUsage
+    cost: float | None
+    # Whether the counts are estimated, because the provider did not report them
+    estimated: bool = False
+
+
+@dataclass
+class ToolOutputUsage:
+    """A tool output added to the chat history, and how much context it took up."""
+
+    tool: str
+    target: str
+    tokens: int
+    # Input tokens spent on sending this output again with every later LLM call
+    context_tokens: int = 0
+    turns_sent: int = 0
+
+
+@dataclass
+class UsageTotals:
+    turns: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_input_tokens: int = 0
+    cache_write_tokens: int = 0
+    cost: float = 0.0
+    # Whether some turns had no price or no reported usage
+    cost_incomplete: bool = False
+    estimated: bool = False
+
+    def add(self, turn: TurnUsage):
+        self.turns += 1
+        self.input_tokens += turn.usage.input_tokens
+        self.output_tokens += turn.usage.output_tokens
+        self.cached_input_tokens += turn.usage.cached_input_tokens
+        self.cache_write_tokens += turn.usage.cache_write_tokens
+        if turn.cost is None:
+            self.cost_incomplete = True
+        else:
+            self.cost += turn.cost
+        self.estimated = self.estimated or turn.estimated
+
+    def format(self) -> str:
+        text = (
+            f"{self.turns} LLM calls, {self.input_tokens:,} input tokens "
+            f"({self.cached_input_tokens:,} read from cache), {self.output_tokens:,} output tokens"
+        )
+        if self.cost or not self.cost_incomplete:
+            text += f", ~${self.cost:.4f}"
+            if self.cost_incomplete:
+                text += " (some models have no price)"
+        if self.estimated:
+            text += " (partly estimated)"
+        return text
+
+
+class TaskUsage:
+    """
+    Token usage and cost of a task, per LLM call and per tool output. Each
+    tool output is charged for every LLM call it is sent with, until it is
+    compacted away, which shows which outputs the context was spent on.
+    """
+
+    def __init__(self, provider: str | None = None, model: str | None = None):
+        self.provider = provider
+        self.model = model
+        self.price = get_model_price(provider, model)
+        self.turns: list[TurnUsage] = []
+        self.tool_outputs: list[ToolOutputUsage] = []
+        # Outputs whose message is still in the chat history. Weak references,
+        # so that messages dropped by compaction are not kept alive
+        self._in_history: list[tuple[weakref.ref[ChatMessage], ToolOutputUsage]] = []
+        self.totals = UsageTotals()
+
+    def record_tool_output(self, tool: str, message: ChatMessage):
+        content = message.content or ""
+        match = _TOOL_RESULT_TARGET.match(content)
+        output = ToolOutputUsage(
+            tool=tool,
+            target=match.group("target") if match else "",
+            tokens=estimate_tokens(content),
+        )
+        self.tool_outputs.append(output)
+        self._in_history.append((weakref.ref(message), output))
+
+    def record_turn(
+        self,
+        usage: TokenUsage | None,
+        chat_history: list[ChatMessage],
+        response_text: str,
+    ) -> TurnUsage:
+        """
+        Records an LLM call. `chat_history` is the history that was sent, plus
+        the response. Usage not reported by the provider is estimated.
+        """
+        estimated = usage is None
+        if usage is None:
+            usage = TokenUsage(
+                input_tokens=estimate_messages_tokens(chat_history[:-1]),
+                output_tokens=estimate_tokens(response_text),
+            )
+        sent = {id(message): message for message in chat_history}
+        in_history = []
+        for message_ref, output in self._in_history:
+            message = message_ref()
+            if message is None or sent.get(id(message)) is not message:
+                # Dropped by compaction, it is not sent again
+                continue
+            # Compaction may have shrunk the output since it was added
+            output.context_tokens += estimate_tokens(message.content)
+            output.turns_sent += 1
+            in_history.append((message_ref, output))
+        self._in_history = in_history
+        turn = TurnUsage(
+            turn=len(self.turns) + 1,
+            usage=usage,
+            cost=estimate_cost(self.price, usage),
+            estimated=estimated,
+        )
+        self.turns.append(turn)
+        self.totals.add(turn)
+        return turn
+
+    def largest_tool_outputs(self, count: int = TOP_TOOL_OUTPUTS) -> list[ToolOutputUsage]:
+        return sorted(self.tool_outputs, key=lambda output: -output.context_tokens)[:count]
+
+
+class SessionUsage:
+    """Usage of all the tasks of a session."""
+
+    def __init__(self):
+        self.tasks: list[TaskUsage] = []
+        self.totals = UsageTotals()
+
+    def add_task(self, task_usage: TaskUsage):
+        self.tasks.append(task_usage)
+
+    def record_turn(self, turn: TurnUsage):
+        self.totals.add(turn)
+
+    def largest_tool_outputs(self, count: int = TOP_TOOL_OUTPUTS) -> list[ToolOutputUsage]:
+        outputs = [output for task in self.tasks for output in task.tool_outputs]
+        return sorted(outputs, key=lambda output: -output.context_tokens)[:count]
+
+
+def format_tool_outputs(outputs: list[ToolOutputUsage]) -> str:
+    """Lists tool outputs by the context tokens they took up."""
+    lines = []
+    for output in outputs:
+        if output.context_tokens == 0:
+            continue
+        label = f"{output.tool} for {output.target}" if output.target else output.tool
+        if len(label) > 60:
+            label = label[:57] + "..."
+        lines.append(
+            f"  {label:<60} ~{output.context_tokens:,} tokens (~{output.tokens:,} sent with {output.turns_sent} LLM calls)"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,20 @@
+import threading
+
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def get_workspace_generation() -> int:
+    """
+    Returns a counter that changes whenever Tig may have modified the workspace.
+    Caches of workspace-derived results include it in their keys.
+    """
+    return _generation
+
+
+def bump_workspace_generation() -> int:
+    """Marks the workspace as modified (by write_to_file, apply_diff, execute_command)."""
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        return _generation
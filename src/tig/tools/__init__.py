@@ -1,11 +1,11 @@
-from .list_files import list_files
-from .ask_followup_question import ask_followup_questions
-from .list_code_definitions import list_code_definitions
-from .read_file import read_file
-from .search_files import regex_search_files
-from .write_to_file import write_to_file
-from .apply_diff import apply_diff
-from .execute_command import execute_command
+from .list_files import list_files, alist_files
+from .ask_followup_question import ask_followup_questions, aask_followup_questions
+from .list_code_definitions import list_code_definitions, alist_code_definitions
+from .read_file import read_file, aread_file
+from .search_files import regex_search_files, aregex_search_files
+from .write_to_file import write_to_file, awrite_to_file
+from .apply_diff import apply_diff, aapply_diff
+from .execute_command import execute_command, aexecute_command
 
 
 __all__ = [
@@ -17,4 +17,12 @@ __all__ = [
     "write_to_file",
     "apply_diff",
     "execute_command",
+    "alist_files",
+    "aask_followup_questions",
+    "alist_code_definitions",
+    "aread_file",
+    "aregex_search_files",
+    "awrite_to_file",
+    "aapply_diff",
+    "aexecute_command",
 ]
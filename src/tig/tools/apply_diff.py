@@ -5,6 +5,9 @@ from functools import partial
 import inquirer
 from diff_match_patch import diff_match_patch
 
+from tig.services.executor import prompt_lock, run_in_thread
+from tig.services.workspace import bump_workspace_generation
+from tig.services.tracing import KIND_APPROVAL, trace_span
 from tig.utils.syntax_checker import check_syntax
 
 # ANSI escape codes
@@ -346,7 +349,8 @@ def apply_diff(arguments: dict, mode: str, auto_approve: bool = False) -> str:
                 default=True,
             ),
         ]
-        answers = inquirer.prompt(questions)
+        with prompt_lock, trace_span("approval", KIND_APPROVAL):
+            answers = inquirer.prompt(questions)
         if answers and not answers["confirm"]:
             feedback = input(
                 "Instruct Tig on what to do instead as you have rejected the changes: "
@@ -354,9 +358,15 @@ def apply_diff(arguments: dict, mode: str, auto_approve: bool = False) -> str:
             return f"[apply_diff for file: '{file_path}'] Result:\nUser denied permission to edit '{file_path}'.\nUser has given this feedback: \n<feedback>{feedback}</feedback>\nFeel free to use ask_followup_question tool for further clarification."
     with open(file_path, "w") as f:
         f.write(full_final_content)
+    bump_workspace_generation()
     result_message = ""
     if len(replacements) == successfull_diffs:
         result_message = f"[apply_diff for '{file_path}'] Result:\nAll {successfull_diffs} out of {len(replacements)} diffs were successfully applied to '{file_path}'.\n"
     elif successfull_diffs > 0 and successfull_diffs < len(replacements):
         result_message = f"[apply_diff for '{file_path}'] Result:\n{successfull_diffs} out of {len(replacements)} diffs were successfully applied to '{file_path}'.\nAs some of the diffs were not applied, make sure to use read_file on '{file_path}' to ensure everything is ok as partially applied diffs may lead to unexpected results.\nHere are some information on why the diffs were not applied:\n{'\n---\n'.join(diff_error_messages)}"
     return result_message
+
+
+async def aapply_diff(arguments: dict, mode: str, auto_approve: bool = False) -> str:
+    """Async version of apply_diff, run in the tool thread pool."""
+    return await run_in_thread(apply_diff, arguments, mode, auto_approve)
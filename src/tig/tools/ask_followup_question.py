@@ -3,6 +3,8 @@ import inquirer
 from textwrap import dedent
 import re
 
+from tig.services.executor import run_in_thread
+
 
 def format_response(question: str, answer: str) -> str:
     return dedent(f"""
@@ -65,3 +67,8 @@ def ask_followup_questions(arguments: Dict) -> str:
                 arguments["question"],
                 "Error: User didn't provide any answer. Try asking again.",
             )
+
+
+async def aask_followup_questions(arguments: Dict) -> str:
+    """Async version of ask_followup_questions, run in the tool thread pool."""
+    return await run_in_thread(ask_followup_questions, arguments)
@@ -1,21 +1,19 @@
 import os
 import inquirer
 
-from tig.services.command_runner import run_shell_command
+from tig.services.command_runner import arun_shell_command, run_shell_command
+from tig.services.executor import prompt_lock, run_in_thread
+from tig.services.tracing import KIND_APPROVAL, trace_span
+from tig.services.workspace import bump_workspace_generation
 
 
-def execute_command(arguments: dict, mode: str = "code", auto_approve=False) -> str:
+def _prepare_command(
+    arguments: dict, mode: str, auto_approve: bool
+) -> str | tuple[str, str, int]:
     """
-    Asks the user to execute a command in the terminal.
-    Args:
-        arguments (dict): A dictionary containing the file path and diff.
-            command (str): The command to execute
-            cwd (str): The directory from where the user should run the command
-            timeout(int): The time in seconds to wait for the command to complete
-        auto_approve (bool): A flag indicating whether to auto-approve the action.
-        mode (str): The mode in which Tig is running.
+    Validates the arguments and asks the user for approval. Returns the
+    (command, cwd, timeout) to run, or the tool result if it must not run.
     """
-
     if mode == "architect":
         return "Error: execute_command is not available in architect mode."
 
@@ -51,11 +49,51 @@ def execute_command(arguments: dict, mode: str = "code", auto_approve=False) ->
                 default=True,
             ),
         ]
-        answers = inquirer.prompt(questions)
+        with prompt_lock, trace_span("approval", KIND_APPROVAL):
+            answers = inquirer.prompt(questions)
         if answers and not answers["confirm"]:
             feedback = input(
                 "Instruct Tig on what to do instead as you have rejected the command execution: "
             )
             return f"[execute_command for command: '{command}' inside '{absolute_cwd}'] Result:\nUser denied permission to execute the command.\nUser has given this instruction: \n<instruction>{feedback}</instruction>\nFeel free to use ask_followup_question tool for further clarification."
 
-    return run_shell_command(command, absolute_cwd, timeout_seconds=timeout)
+    return command, absolute_cwd, timeout
+
+
+def execute_command(arguments: dict, mode: str = "code", auto_approve=False) -> str:
+    """
+    Asks the user to execute a command in the terminal.
+    Args:
+        arguments (dict): A dictionary containing the file path and diff.
+            command (str): The command to execute
+            cwd (str): The directory from where the user should run the command
+            timeout(int): The time in seconds to wait for the command to complete
+        auto_approve (bool): A flag indicating whether to auto-approve the action.
+        mode (str): The mode in which Tig is running.
+    """
+
+    prepared = _prepare_command(arguments, mode, auto_approve)
+    if isinstance(prepared, str):
+        return prepared
+    command, absolute_cwd, timeout = prepared
+    try:
+        return run_shell_command(command, absolute_cwd, timeout_seconds=timeout)
+    finally:
+        # Any command may have changed files in the workspace
+        bump_workspace_generation()
+
+
+async def aexecute_command(arguments: dict, mode: str = "code", auto_approve=False) -> str:
+    """
+    Async version of execute_command: the approval runs in the tool thread
+    pool and the command as an asyncio subprocess.
+    """
+    prepared = await run_in_thread(_prepare_command, arguments, mode, auto_approve)
+    if isinstance(prepared, str):
+        return prepared
+    command, absolute_cwd, timeout = prepared
+    try:
+        return await arun_shell_command(command, absolute_cwd, timeout_seconds=timeout)
+    finally:
+        # Any command may have changed files in the workspace
+        bump_workspace_generation()
@@ -1,19 +1,33 @@
+import multiprocessing
 import os
-from typing import Dict
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Iterator
 import inquirer
 
-from tig.services.tree_sitter.parsers import get_parser
-from tig.tools.list_files import list_files_non_recursively_respecting_gitignore
+from tig.services.executor import prompt_lock, run_in_thread
+from tig.services.tree_sitter.parsers import GRAMMARS, get_parser
+from tig.services.file_index import get_file_index
+from tig.services.symbol_index import get_symbol_index, read_source
+from tig.services.tracing import KIND_APPROVAL, trace_span
+from tig.tools.list_files import (
+    list_files_non_recursively_respecting_gitignore,
+    list_files_recursively_respecting_gitignore,
+)
 
+# Below this many files, starting worker processes costs more than it saves
+PARALLEL_PARSE_MIN_FILES = 32
+MAX_DEFINITION_FILES = 200
+# The pool is started from a tool thread of a multi-threaded process, where
+# forking could copy a lock held by another thread (e.g. the parser registry's)
+WORKER_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
 
-def get_code_definitions_from_file(path: str) -> list[str]:
-    file_ext = path.split(".")[-1]
-    try:
-        parser, query = get_parser(file_ext)
-    except ValueError:
-        return [f"Cannot get code definitions for '{path}'."]
-    with open(path, "r") as file:
-        code = file.read()
+
+def get_code_definitions_from_source(code: str, file_ext: str) -> list[str]:
+    parser, query = get_parser(file_ext)
+    code = code.replace("\r\n", "\n")
     lines = code.split("\n")
     tree = parser.parse(bytes(code, "utf8"))
     root_node = tree.root_node
@@ -35,27 +49,142 @@ def get_code_definitions_from_file(path: str) -> list[str]:
     return list(definitions.values())
 
 
-def get_code_definitions(path: str) -> Dict[str, str]:
+def get_code_definitions_from_file(path: str) -> list[str]:
+    file_ext = path.split(".")[-1]
+    if file_ext not in GRAMMARS:
+        return [f"Cannot get code definitions for '{path}'."]
+    return get_symbol_index().get_definitions(
+        path, lambda code: get_code_definitions_from_source(code, file_ext)
+    )
+
+
+def _parse_file_in_worker(
+    path: str, known_hash: str | None
+) -> tuple[int, int, str, list[str] | None]:
+    """
+    Runs inside a worker process. Returns the file's stat, content hash and
+    definitions, or None as definitions if the content matches `known_hash`.
+    """
+    mtime_ns, size, content_hash, code = read_source(path)
+    if content_hash == known_hash:
+        return mtime_ns, size, content_hash, None
+    definitions = get_code_definitions_from_source(code, path.split(".")[-1])
+    return mtime_ns, size, content_hash, definitions
+
+
+def iter_code_definitions_recursively(
+    root_dir: str, max_workers: int | None = None
+) -> Iterator[tuple[str, list[str]]]:
+    """
+    Yields `(file_path, definitions)` for every supported source file below
+    root_dir, respecting gitignore, in sorted path order.
+
+    Files already in the symbol index are answered directly. The rest are
+    parsed in a process pool, with at most a few tasks in flight per worker so
+    that a caller which stops iterating early does not pay for the whole tree.
+    """
+    index = get_symbol_index()
+    rel_paths = get_file_index().list_recursively(root_dir)
+    if rel_paths is None:
+        rel_paths = list_files_recursively_respecting_gitignore(root_dir)
+    file_paths = sorted(
+        os.path.join(root_dir, rel_path)
+        for rel_path in rel_paths
+        if not rel_path.endswith("/") and rel_path.split(".")[-1] in GRAMMARS
+    )
+    max_workers = max_workers or os.cpu_count() or 1
+    if len(file_paths) < PARALLEL_PARSE_MIN_FILES or max_workers == 1:
+        for file_path in file_paths:
+            yield file_path, get_code_definitions_from_file(file_path)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context(WORKER_START_METHOD),
+    ) as executor:
+        pending: deque[tuple[str, Future | list[str]]] = deque()
+        remaining = iter(file_paths)
+        try:
+            while True:
+                while len(pending) < max_workers * 4:
+                    file_path = next(remaining, None)
+                    if file_path is None:
+                        break
+                    definitions, known_hash = index.lookup(file_path)
+                    if definitions is not None:
+                        pending.append((file_path, definitions))
+                    else:
+                        pending.append(
+                            (
+                                file_path,
+                                executor.submit(
+                                    _parse_file_in_worker, file_path, known_hash
+                                ),
+                            )
+                        )
+                if not pending:
+                    break
+                file_path, result = pending.popleft()
+                if isinstance(result, Future):
+                    result = index.store(file_path, *result.result())
+                yield file_path, result
+        finally:
+            for _, result in pending:
+                if isinstance(result, Future):
+                    result.cancel()
+
+
+def get_code_definitions(
+    path: str, recursive: bool = False, max_files: int | None = None
+) -> tuple[Dict[str, str], bool]:
     """
     Get code definitions from a file or directory.
     Args:
         path (str): Path to the file or directory to analyze.
+        recursive (bool): If True, analyze all source files below the directory
+            using a process pool, otherwise only the top-level files.
+        max_files (int | None): Stop once this many files with definitions
+            have been collected.
     Returns:
-        Dict[str, list[str]]: A dictionary containing the code definitions.
-            - 'file': The file path.
-            - 'definitions': A list of code definitions.
+        tuple[Dict[str, str], bool]: The code definitions, keyed by file path,
+            and whether files were left out because of `max_files`.
     """
     if os.path.isfile(path):
-        return {path: "\n".join(get_code_definitions_from_file(path))}
+        definitions = get_code_definitions_from_file(path)
+        get_symbol_index().save()
+        return {path: "\n".join(definitions)}, False
     file_to_definitions = {}
-    files_in_dir = list_files_non_recursively_respecting_gitignore(path)
-    for file in files_in_dir:
-        file_path = os.path.join(path, file)
-        if os.path.isfile(file_path):
-            code_definitions_from_file = get_code_definitions_from_file(file_path)
+    truncated = False
+    completed = False
+    if recursive:
+        definitions_iter = iter_code_definitions_recursively(path)
+    else:
+        definitions_iter = (
+            (file_path, get_code_definitions_from_file(file_path))
+            for file_path in (
+                os.path.join(path, file)
+                for file in list_files_non_recursively_respecting_gitignore(path)
+            )
+            if os.path.isfile(file_path)
+        )
+    try:
+        for file_path, code_definitions_from_file in definitions_iter:
             if code_definitions_from_file:
                 file_to_definitions[file_path] = "\n".join(code_definitions_from_file)
-    return file_to_definitions
+                if max_files is not None and len(file_to_definitions) >= max_files:
+                    truncated = next(definitions_iter, None) is not None
+                    completed = not truncated
+                    break
+        else:
+            completed = True
+    finally:
+        definitions_iter.close()
+        index = get_symbol_index()
+        if recursive and completed:
+            # A full walk is the time to forget deleted and renamed files
+            index.prune()
+        index.save()
+    return file_to_definitions, truncated
 
 
 def list_code_definitions(arguments: Dict, auto_approve=False) -> str:
@@ -64,6 +193,7 @@ def list_code_definitions(arguments: Dict, auto_approve=False) -> str:
     Args:
         arguments (Dict): A dictionary containing the arguments for the command.
             - 'path': Path to the file or directory to analyze.
+            - 'recursive' (optional): 'true' to analyze all source files below the directory.
         auto_approve (bool): If True, automatically approve the tool call.
     Returns:
         str: A string containing the list of code definitions.
@@ -84,11 +214,22 @@ def list_code_definitions(arguments: Dict, auto_approve=False) -> str:
                 default=True,
             ),
         ]
-        answers = inquirer.prompt(questions)
+        with prompt_lock, trace_span("approval", KIND_APPROVAL):
+            answers = inquirer.prompt(questions)
         if answers and not answers["confirm"]:
             return f"Error: User denied permission to read contents from '{path}' while using list_code_definition_names tool. Try to complete your task without reading these contents."
-    code_definitions = get_code_definitions(path)
+    recursive = str(arguments.get("recursive", "false")).strip().lower() == "true"
+    code_definitions, truncated = get_code_definitions(
+        path, recursive=recursive, max_files=MAX_DEFINITION_FILES
+    )
     return_message = f'[list_code_definition_names for "{path}"] Result:\n\n'
     for file, definitions in code_definitions.items():
         return_message += f"# {file}\n{definitions}\n\n"
+    if truncated:
+        return_message += f"(Result truncated after {MAX_DEFINITION_FILES} files. Use list_code_definition_names on specific subdirectories if you need to explore further.)\n"
     return return_message
+
+
+async def alist_code_definitions(arguments: Dict, auto_approve=False) -> str:
+    """Async version of list_code_definitions, run in the tool thread pool."""
+    return await run_in_thread(list_code_definitions, arguments, auto_approve)
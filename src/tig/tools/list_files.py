@@ -1,11 +1,20 @@
 import os
 import time
+from collections import deque
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict
 
-import pathspec
 from ordered_set import OrderedSet
 
+from tig.services.executor import run_in_thread
+from tig.services.file_index import get_file_index
+from tig.services.gitignore import IgnoreMatcher
+
+# Maximum number of entries returned by list_files
+LIST_FILES_LIMIT = 200
+# Maximum number of not-listed directories summarised after the limit is reached
+MAX_OMITTED_DIRS = 20
+
 
 def _are_paths_equal(path1: Path, path2: Path) -> bool:
     """Checks if two paths point to the same location, resolving symlinks."""
@@ -26,48 +35,31 @@ def _are_paths_equal(path1: Path, path2: Path) -> bool:
             return False
 
 
-def load_gitignore(path="."):
-    default_patterns = [
-        "node_modules",
-        "__pycache__",
-        "env",
-        ".env",
-        "venv",
-        ".venv",  # Common Python venv name
-        "target/dependency",  # Rust/Java?
-        "build/dependencies",  # Gradle?
-        "dist",
-        "out",
-        "build",  # General build dir
-        "bin",  # Common compiled output dir
-        "obj",  # Common compiled output dir
-        "bundle",
-        "vendor",
-        "tmp",
-        "temp",
-        "deps",
-        "pkg",
-        "Pods",  # iOS Cocoapods
-        ".git",  # Git internal directory
-        ".hg",  # Mercurial
-        ".svn",  # Subversion
-        ".vscode",  # VSCode settings
-        ".idea",  # JetBrains IDE settings
-        ".DS_Store",  # macOS metadata
-    ]
-    gitignore_patterns = []
-    gitignore_path = Path(path) / ".gitignore"
-    if gitignore_path.exists():
-        with gitignore_path.open() as f:
-            gitignore_patterns = f.read().splitlines()
-    return pathspec.PathSpec.from_lines(
-        "gitwildmatch", gitignore_patterns + default_patterns
-    )
+def _get_ignore_matcher(root_dir: str) -> tuple[IgnoreMatcher, str]:
+    """
+    Returns the ignore matcher to use below root_dir and root_dir's path relative
+    to that matcher's root. Inside the workspace, the workspace's rules (including
+    parent .gitignore files) apply, unless root_dir itself was explicitly asked for
+    despite being ignored.
+    """
+    index = get_file_index()
+    rel_dir = index.relative_path(root_dir)
+    if rel_dir is not None and (
+        rel_dir == "" or not index.matcher.is_path_ignored(rel_dir, is_dir=True)
+    ):
+        return index.matcher, rel_dir
+    return IgnoreMatcher(root_dir), ""
+
+
+def _join_rel(rel_dir: str, name: str) -> str:
+    if not rel_dir or not name:
+        return rel_dir or name
+    return f"{rel_dir}/{name}"
 
 
 def list_files_recursively_respecting_gitignore(root_dir=".", timeout_sec=10.0):
     root_dir_path = Path(root_dir)
-    spec = load_gitignore(root_dir)
+    matcher, matcher_rel_dir = _get_ignore_matcher(root_dir)
     all_files: OrderedSet[str] = OrderedSet([])
     start_time = time.monotonic()
     for dirpath, sub_dirs, filenames in os.walk(root_dir_path):
@@ -76,55 +68,155 @@ def list_files_recursively_respecting_gitignore(root_dir=".", timeout_sec=10.0):
                 f"\nWarning: Globbing timed out after {timeout_sec} seconds, returning partial results.\n",
             )
             break
+        rel_dir_path = Path(dirpath).relative_to(root_dir_path)
+        rel_dir = matcher_rel_dir
+        if rel_dir_path != Path("."):
+            rel_dir = _join_rel(matcher_rel_dir, rel_dir_path.as_posix())
+        # Pruning ignored directories here skips their whole subtree
         sub_dirs[:] = [
-            d for d in sub_dirs if spec is None or not spec.match_file(str(d))
+            d
+            for d in sub_dirs
+            if not d.startswith(".")
+            and not matcher.is_ignored(_join_rel(rel_dir, d), is_dir=True)
         ]
-        sub_dirs[:] = [d for d in sub_dirs if not d.startswith(".")]
         for filename in filenames:
-            filepath = Path(dirpath) / filename
-            rel_path = filepath.relative_to(root_dir_path)
-            rel_dir_path = Path(dirpath).relative_to(root_dir_path)
-            if spec is None or not spec.match_file(str(rel_path)):
+            if not matcher.is_ignored(_join_rel(rel_dir, filename)):
                 all_files.append(str(rel_dir_path) + "/")
-                all_files.append(str(rel_path))
+                all_files.append(str(rel_dir_path / filename))
     return all_files
 
 
 def list_files_non_recursively_respecting_gitignore(root_dir="."):
     root_dir_path = Path(root_dir)
-    spec = load_gitignore(root_dir)
+    matcher, matcher_rel_dir = _get_ignore_matcher(root_dir)
     all_files: OrderedSet[str] = OrderedSet([])
-    for item in root_dir_path.iterdir():
-        if item.is_dir():
-            rel_path = item.relative_to(root_dir_path)
-            if spec is None or not spec.match_file(str(rel_path)):
-                all_files.append(str(rel_path) + "/")
+    for item in sorted(root_dir_path.iterdir()):
+        rel_path = item.relative_to(root_dir_path)
+        is_dir = item.is_dir()
+        if matcher.is_ignored(_join_rel(matcher_rel_dir, item.name), is_dir=is_dir):
+            continue
+        if is_dir:
+            all_files.append(str(rel_path) + "/")
         else:
-            rel_path = item.relative_to(root_dir_path)
-            if spec is None or not spec.match_file(str(rel_path)):
-                all_files.append(str(rel_path))
+            all_files.append(str(rel_path))
     return all_files
 
 
+def _read_dir_from_disk(root_dir: str) -> Callable:
+    """
+    Returns a function mapping a directory path relative to root_dir to its
+    sorted, non-ignored `(subdirs, files)` names, read from disk.
+    """
+    matcher, matcher_rel_dir = _get_ignore_matcher(root_dir)
+
+    def read_dir(rel_dir: str) -> tuple[list[str], list[str]] | None:
+        subdirs, files = [], []
+        try:
+            with os.scandir(os.path.join(root_dir, rel_dir)) as it:
+                children = sorted(it, key=lambda child: child.name)
+        except OSError:
+            return None
+        for child in children:
+            rel_path = _join_rel(_join_rel(matcher_rel_dir, rel_dir), child.name)
+            try:
+                is_dir = child.is_dir()
+                if is_dir and child.is_symlink():
+                    continue
+            except OSError:
+                continue
+            if is_dir:
+                if not child.name.startswith(".") and not matcher.is_ignored(
+                    rel_path, is_dir=True
+                ):
+                    subdirs.append(child.name)
+            elif not matcher.is_ignored(rel_path):
+                files.append(child.name)
+        return subdirs, files
+
+    return read_dir
+
+
+def list_files_breadth_first(
+    read_dir: Callable, limit: int, timeout_sec: float = 10.0
+) -> tuple[OrderedSet[str], list[tuple[str, int]], int]:
+    """
+    Lists files breadth-first, in the same format as
+    list_files_recursively_respecting_gitignore, and stops reading directories
+    once `limit` entries have been collected.
+
+    Args:
+        read_dir: Maps a directory path relative to the listed root ("" for
+            the root itself) to its sorted `(subdirs, files)` names, or None.
+        limit: Maximum number of entries (directory headers and files) to return.
+
+    Returns:
+        A tuple of:
+        - The listed entries.
+        - `(directory, count)` pairs for directories whose entries were not
+          (all) listed, with the number of entries left out.
+        - The number of further directories that were not even read.
+    """
+    all_files: OrderedSet[str] = OrderedSet([])
+    omitted: list[tuple[str, int]] = []
+    queue: deque[str] = deque([""])
+    start_time = time.monotonic()
+    while queue and len(all_files) < limit:
+        if time.monotonic() - start_time > timeout_sec:
+            print(
+                f"\nWarning: Globbing timed out after {timeout_sec} seconds, returning partial results.\n",
+            )
+            break
+        rel_dir = queue.popleft()
+        listing = read_dir(rel_dir)
+        if listing is None:
+            continue
+        subdirs, files = listing
+        # Leave room for the directory header
+        shown = files[: max(0, limit - len(all_files) - 1)]
+        if shown:
+            all_files.append((rel_dir or ".") + "/")
+            all_files.update(_join_rel(rel_dir, name) for name in shown)
+        if len(shown) < len(files):
+            omitted.append((rel_dir, len(files) - len(shown)))
+        queue.extend(_join_rel(rel_dir, name) for name in subdirs)
+
+    # Summarise the directories that were queued but never listed
+    while queue and len(omitted) < MAX_OMITTED_DIRS:
+        rel_dir = queue.popleft()
+        listing = read_dir(rel_dir)
+        if listing is not None:
+            omitted.append((rel_dir, len(listing[0]) + len(listing[1])))
+    return all_files, omitted, len(queue)
+
+
 def format_list_files(
-    dir_path: str, file_paths: OrderedSet[str], limit_reached: bool
+    dir_path: str,
+    file_paths: OrderedSet[str],
+    omitted: list[tuple[str, int]],
+    more_omitted_dirs: int = 0,
 ) -> str:
     """
     Formats the list of file paths for output.
 
     Args:
         file_paths: A list of file paths.
-        limit_reached: A boolean indicating if the limit was reached.
+        omitted: `(directory, count)` pairs for entries left out by the limit.
+        more_omitted_dirs: Number of further directories left out entirely.
 
     Returns:
         A string containing the formatted file paths.
     """
-    if len(file_paths) == 0:
+    if len(file_paths) == 0 and not omitted:
         return f"No files found in {dir_path}."
     formatted_files_list = f'Files and directories in "{dir_path}":\n'
     formatted_files_list += "\n".join(file_paths)
-    if limit_reached:
-        formatted_files_list += "\n(File list truncated. Use list_files on specific subdirectories if you need to explore further.)"
+    if omitted or more_omitted_dirs:
+        formatted_files_list += f"\n(File list truncated after {len(file_paths)} entries. Not listed:"
+        for rel_dir, count in omitted:
+            formatted_files_list += f"\n{rel_dir or '.'}/ (+{count} entries)"
+        if more_omitted_dirs:
+            formatted_files_list += f"\n... and {more_omitted_dirs} more directories"
+        formatted_files_list += "\nUse list_files on specific subdirectories if you need to explore further.)"
     return formatted_files_list
 
 
@@ -147,8 +239,7 @@ def list_files(arguments: Dict) -> str:
         return "Error: Missing 'recursive' argument."
 
     dir_path = arguments["path"]
-    recursive = arguments["recursive"]
-    limit = 200
+    recursive = str(arguments["recursive"]).strip().lower() == "true"
 
     try:
         # Use pathlib for easier path manipulation
@@ -175,9 +266,30 @@ def list_files(arguments: Dict) -> str:
 
     # --- Perform Listing ---
     if recursive:
-        file_paths = list_files_recursively_respecting_gitignore(str(absolute_path))
+        # Paths inside the workspace are answered from the resident file index
+        index = get_file_index()
+        index.refresh()
+        rel_root = index.relative_path(str(absolute_path))
+        if rel_root is not None and index.read_dir(rel_root) is not None:
+
+            def read_dir(rel_dir: str):
+                return index.read_dir(_join_rel(rel_root, rel_dir))
+
+        else:
+            read_dir = _read_dir_from_disk(str(absolute_path))
+        file_paths, omitted, more_omitted_dirs = list_files_breadth_first(
+            read_dir, LIST_FILES_LIMIT
+        )
+        return format_list_files(dir_path, file_paths, omitted, more_omitted_dirs)
+
+    file_paths = list_files_non_recursively_respecting_gitignore(str(absolute_path))
+    omitted = []
+    if len(file_paths) > LIST_FILES_LIMIT:
+        omitted = [("", len(file_paths) - LIST_FILES_LIMIT)]
+        file_paths = file_paths[:LIST_FILES_LIMIT]
+    return format_list_files(dir_path, file_paths, omitted)
 
-    else:
-        file_paths = list_files_non_recursively_respecting_gitignore(str(absolute_path))
 
-    return format_list_files(dir_path, file_paths, len(file_paths) > limit)
+async def alist_files(arguments: Dict) -> str:
+    """Async version of list_files, run in the tool thread pool."""
+    return await run_in_thread(list_files, arguments)
@@ -1,8 +1,50 @@
 import inquirer
 import os
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator
 
-from tig.tools.list_files import load_gitignore
+from tig.services.executor import prompt_lock, run_in_thread
+from tig.services.file_index import get_file_index
+from tig.services.line_index import get_line_index, iter_line_range
+from tig.services.tracing import KIND_APPROVAL, trace_span
+from tig.services.tree_sitter.parsers import GRAMMARS
+from tig.tools.list_code_definitions import get_code_definitions_from_file
+
+# Budget for one read_file result, roughly 4 bytes per token
+READ_FILE_MAX_TOKENS = 50_000
+READ_FILE_MAX_BYTES = min(200 * 1024, READ_FILE_MAX_TOKENS * 4)
+# Share of the budget given to the head of an oversized file, the rest goes to its tail
+HEAD_BUDGET_RATIO = 0.75
+TAIL_MAX_LINES = 200
+# Longer lines (e.g. minified code) are cut short
+MAX_LINE_BYTES = 4096
+# Larger files are not parsed for an outline
+OUTLINE_MAX_FILE_SIZE = 1024 * 1024
+MAX_OUTLINE_DEFINITIONS = 100
+# Files read by one batched read_file call, which split the budget of a single read
+MAX_BATCH_FILES = 10
+MIN_BATCH_FILE_BYTES = 32 * 1024
+READ_WORKERS = 8
+
+
+def iter_formatted_lines(
+    file_path, start_line=0, end_line=None
+) -> Iterator[tuple[int, str]]:
+    """
+    Lazily yields `(line_num, "line_num | line_content")` for the lines from
+    start_line to end_line, reading them through the cached line-offset index
+    and mmap, so only the requested range is ever touched.
+
+    :param file_path: Path to the file
+    :param start_line: Line number to start reading from (0-based index, default is 0)
+    :param end_line: Line number to stop reading at (inclusive, default is end of file)
+    """
+    raw_lines = iter_line_range(file_path, start_line, end_line, MAX_LINE_BYTES)
+    for line_num, raw_line in enumerate(raw_lines, start_line + 1):
+        line = raw_line.decode("utf-8", errors="replace").replace("\r\n", "\n")
+        if not line.endswith("\n") and len(raw_line) == MAX_LINE_BYTES:
+            line += " [line truncated]\n"
+        yield line_num, f"{line_num:4d} | {line}"
 
 
 def read_lines(file_path, start_line=0, end_line=None):
@@ -11,29 +53,240 @@ def read_lines(file_path, start_line=0, end_line=None):
 
     :param file_path: Path to the file
     :param start_line: Line number to start reading from (0-based index, default is 0)
-    :param end_line: Line number to stop reading at (exclusive, default is end of file)
+    :param end_line: Line number to stop reading at (inclusive, default is end of file)
     :return: List of strings containing file contents where each string is a line in the format "line_num | line_content" and the line number of the end line.
     """
+    lines = [line for _, line in iter_formatted_lines(file_path, start_line, end_line)]
+    last_line_num = start_line + len(lines) - 1 if lines else 0
+    return lines, last_line_num + 1
+
+
+def read_lines_within_budget(
+    file_path, start_line=0, end_line=None, max_bytes=READ_FILE_MAX_BYTES
+) -> tuple[list[str], int, bool]:
+    """
+    Like read_lines, but stops before the formatted output exceeds max_bytes.
+
+    :return: The formatted lines, the line number of the last line returned
+        (1 if none, like read_lines) and whether the range was cut short.
+    """
     lines = []
+    used = 0
+    last_line_num = 1
+    for line_num, line in iter_formatted_lines(file_path, start_line, end_line):
+        used += len(line.encode("utf-8"))
+        if used > max_bytes:
+            return lines, last_line_num, True
+        lines.append(line)
+        last_line_num = line_num
+    return lines, last_line_num, False
+
 
-    # If end_line is not provided, set it to None, which means the entire file till the end
-    if end_line is None:
-        end_line = float("inf")
+def _read_tail(file_path, first_line, line_count, max_bytes) -> tuple[list[str], int]:
+    """
+    Returns the formatted last lines of a file that fit in max_bytes, never
+    going above first_line (0-based), and the line number of the first one.
+    """
+    start = max(first_line, line_count - TAIL_MAX_LINES)
+    lines = [line for _, line in iter_formatted_lines(file_path, start)]
+    used = 0
+    keep = 0
+    for line in reversed(lines):
+        used += len(line.encode("utf-8"))
+        if used > max_bytes:
+            break
+        keep += 1
+    return lines[len(lines) - keep :], line_count - keep + 1
 
-    last_line_num = 0
-    with open(file_path, "r") as file:
-        for current_line_num, line in enumerate(file):
-            # Only append lines starting from start_line
-            if current_line_num >= start_line:
-                last_line_num = current_line_num
-                line_number_1_based = current_line_num + 1
-                lines.append(f"{line_number_1_based:4d} | {line}")
 
-            # Stop if we've reached the end line
-            if current_line_num >= end_line:
-                break
+def _get_outline(file_path, first_line, last_line) -> list[str]:
+    """Returns the code definitions starting between first_line and last_line (1-based)."""
+    file_ext = file_path.split(".")[-1]
+    if file_ext not in GRAMMARS or os.path.getsize(file_path) > OUTLINE_MAX_FILE_SIZE:
+        return []
+    try:
+        definitions = get_code_definitions_from_file(file_path)
+    except (OSError, UnicodeDecodeError):
+        return []
+    definitions = [
+        definition
+        for definition in definitions
+        if first_line <= int(definition.split("-", 1)[0]) <= last_line
+    ]
+    if len(definitions) > MAX_OUTLINE_DEFINITIONS:
+        omitted = len(definitions) - MAX_OUTLINE_DEFINITIONS
+        definitions = definitions[:MAX_OUTLINE_DEFINITIONS]
+        definitions.append(f"... {omitted} more definitions")
+    return definitions
 
-    return lines, last_line_num + 1
+
+def _format_size(size: int) -> str:
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f} MB"
+    return f"{size / 1024:.1f} KB"
+
+
+def _read_file_block(
+    path: str, start_line: int, end_line: int | None, max_bytes: int
+) -> str:
+    """
+    Returns the `<file>` block of a read_file result for one file, with at most
+    max_bytes of file content. start_line is 1-based, end_line 0-based inclusive.
+    """
+    if end_line is not None:
+        file_lines, last_line_num, truncated = read_lines_within_budget(
+            path, start_line - 1, end_line, max_bytes
+        )
+        notice = ""
+        if truncated:
+            notice = f"\n<notice>Only lines {start_line}-{last_line_num} fit in the read budget. Continue with start_line={last_line_num + 1} to read the rest.</notice>"
+        return f"""<file>
+<path>{path}</path>
+<content lines={start_line}-{last_line_num}>
+{"".join(file_lines)}</content>{notice}
+</file>"""
+
+    file_lines, last_line_num, truncated = read_lines_within_budget(
+        path, start_line - 1, None, max_bytes
+    )
+    if not truncated:
+        return f"""<file>
+<path>{path}</path>
+<content lines={start_line}-{last_line_num}>
+{"".join(file_lines)}</content>
+</file>"""
+
+    # Oversized file: show its head, its tail and an outline of what is in between
+    head_budget = int(max_bytes * HEAD_BUDGET_RATIO)
+    used = 0
+    for i, line in enumerate(file_lines):
+        used += len(line.encode("utf-8"))
+        if used > head_budget:
+            file_lines = file_lines[:i]
+            last_line_num = start_line - 1 + i
+            break
+    line_count = get_line_index(path).line_count
+    tail_lines, tail_start = _read_tail(
+        path,
+        last_line_num,
+        line_count,
+        max_bytes - head_budget,
+    )
+    result = f"""<file>
+<path>{path}</path>
+<content lines={start_line}-{last_line_num}>
+{"".join(file_lines)}</content>"""
+    if tail_lines:
+        result += f"""
+<content lines={tail_start}-{line_count}>
+{"".join(tail_lines)}</content>"""
+    omitted_end = tail_start - 1 if tail_lines else line_count
+    outline = _get_outline(path, last_line_num + 1, omitted_end)
+    if outline:
+        result += f"""
+<outline>
+{"\n".join(outline)}
+</outline>"""
+    omitted = f"Lines {last_line_num + 1}-{omitted_end} were omitted"
+    if outline:
+        omitted += ", the outline lists the definitions in them"
+    result += f"""
+<notice>The file has {line_count} lines ({_format_size(os.path.getsize(path))}), more than read_file returns at once. {omitted}. Use start_line and end_line to read the parts you need.</notice>
+</file>"""
+    return result
+
+
+def _parse_file_request(arguments: Dict) -> tuple[str, int, int | None]:
+    """
+    Validates the path and line range of one file to read, returning
+    `(path, start_line, end_line)` or raising ValueError with the error message.
+    """
+    if "path" not in arguments:
+        raise ValueError("Error: 'path' argument is required for read_file tool.")
+
+    path = arguments["path"]
+    if not os.path.isfile(path):
+        raise ValueError(
+            f"Error: The path '{path}' is not a valid file. A valid file path is required for read_file tool."
+        )
+
+    if get_file_index().is_ignored(path):
+        raise ValueError(
+            f"Error: Permission denied to read the file '{path}'. read_file tool is not allowed on this file. Try to complete your task without reading this file."
+        )
+
+    start_line = 1
+    end_line = None
+    if "start_line" in arguments:
+        start_line = int(arguments["start_line"])
+    if "end_line" in arguments:
+        end_line = int(arguments["end_line"]) - 1
+        if start_line > end_line:
+            raise ValueError(
+                f"Error: start_line ({start_line}) cannot be greater than end_line ({end_line}) for read_file tool."
+            )
+    return path, start_line, end_line
+
+
+def read_files(file_arguments: list[Dict], auto_approve=False) -> str:
+    """
+    Reads several files (each with an optional line range) in one tool call.
+    The files are read concurrently and split the budget of a single read,
+    with at least MIN_BATCH_FILE_BYTES each.
+    Args:
+        file_arguments (list[Dict]): One dictionary per file, with the same keys as read_file's arguments.
+        auto_approve (bool): If True, automatically approve the tool call.
+    Returns:
+        str: The contents of the files, and an error message for each file that could not be read.
+    """
+    if not file_arguments:
+        return "Error: At least one file is required for read_file tool."
+    if len(file_arguments) > MAX_BATCH_FILES:
+        return f"Error: read_file tool can read at most {MAX_BATCH_FILES} files at once, {len(file_arguments)} were requested. Split them into several read_file calls."
+
+    requests: list[tuple[str, int, int | None] | str] = []
+    for arguments in file_arguments:
+        try:
+            requests.append(_parse_file_request(arguments))
+        except ValueError as e:
+            requests.append(str(e))
+    paths = [request[0] for request in requests if not isinstance(request, str)]
+
+    if paths and not auto_approve:
+        # Ask for confirmation once for all the files
+        questions = [
+            inquirer.Confirm(
+                "confirm",
+                message=f"Allow Tig to read the files {', '.join(repr(path) for path in paths)}?",
+                default=True,
+            ),
+        ]
+        with prompt_lock, trace_span("approval", KIND_APPROVAL):
+            answers = inquirer.prompt(questions)
+        if answers and not answers["confirm"]:
+            return f"Error: User denied permission to read the files {', '.join(repr(path) for path in paths)} while using read_file tool. Try to complete your task without reading these files."
+
+    max_bytes = max(READ_FILE_MAX_BYTES // len(requests), MIN_BATCH_FILE_BYTES)
+
+    def read_one(request) -> str:
+        if isinstance(request, str):
+            return request
+        path, start_line, end_line = request
+        try:
+            return _read_file_block(path, start_line, end_line, max_bytes)
+        except OSError as e:
+            return f"Error: Could not read the file '{path}': {e}"
+
+    with ThreadPoolExecutor(max_workers=min(len(requests), READ_WORKERS)) as executor:
+        blocks = list(executor.map(read_one, requests))
+
+    all_paths = ", ".join(
+        f"'{arguments.get('path', '')}'" for arguments in file_arguments
+    )
+    return f"""
+[read_file for {all_paths}]
+Result:
+{"\n".join(blocks)}"""
 
 
 def read_file(arguments: Dict, auto_approve=False) -> str:
@@ -44,21 +297,24 @@ def read_file(arguments: Dict, auto_approve=False) -> str:
             - 'path': The path to the file to read.
             - 'start_line' (optional): The starting line number to read from.
             - 'end_line' (optional): The ending line number to read to.
+            - 'file' (optional): A list of dictionaries with the same keys, to read several files at once.
         auto_approve (bool): If True, automatically approve the tool call.
     Returns:
         str: The content of the file or an error message.
     """
 
-    if "path" not in arguments:
-        return "Error: 'path' argument is required for read_file tool."
+    if "file" in arguments:
+        file_arguments = list(arguments["file"])
+        if "path" in arguments:
+            file_arguments.insert(
+                0, {k: v for k, v in arguments.items() if k != "file"}
+            )
+        return read_files(file_arguments, auto_approve)
 
-    path = arguments["path"]
-    if not os.path.isfile(path):
-        return f"Error: The path '{path}' is not a valid file. A valid file path is required for read_file tool."
-
-    ignore_spec = load_gitignore()
-    if ignore_spec is not None and ignore_spec.match_file(str(path)):
-        return f"Error: Permission denied to read the file '{path}'. read_file tool is not allowed on this file. Try to complete your task without reading this file."
+    try:
+        path, start_line, end_line = _parse_file_request(arguments)
+    except ValueError as e:
+        return str(e)
 
     if not auto_approve:
         # Ask for confirmation if not auto-approving
@@ -69,26 +325,18 @@ def read_file(arguments: Dict, auto_approve=False) -> str:
                 default=True,
             ),
         ]
-        answers = inquirer.prompt(questions)
+        with prompt_lock, trace_span("approval", KIND_APPROVAL):
+            answers = inquirer.prompt(questions)
         if answers and not answers["confirm"]:
             return f"Error: User denied permission to read the file '{path}' while using read_file tool. Try to complete your task without reading this file."
 
-    start_line = 1
-    end_line = None
-    if "start_line" in arguments:
-        start_line = int(arguments["start_line"])
-    if "end_line" in arguments:
-        end_line = int(arguments["end_line"]) - 1
-        if start_line > end_line:
-            return f"Error: start_line ({start_line}) cannot be greater than end_line ({end_line}) for read_file tool."
-
-    file_lines, last_line_num = read_lines(path, start_line - 1, end_line)
-    file_contents = "".join(file_lines)
+    file_block = _read_file_block(path, start_line, end_line, READ_FILE_MAX_BYTES)
     return f"""
 [read_file for '{path}']
 Result:
-<file>
-<path>{path}</path>
-<content lines={start_line}-{last_line_num}>
-{file_contents}</content>
-</file>"""
+{file_block}"""
+
+
+async def aread_file(arguments: Dict, auto_approve=False) -> str:
+    """Async version of read_file, run in the tool thread pool."""
+    return await run_in_thread(read_file, arguments, auto_approve)
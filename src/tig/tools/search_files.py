@@ -1,61 +1,389 @@
+import asyncio
+import base64
+import json
+import re
 import subprocess
+import threading
+from collections import OrderedDict
+from contextlib import aclosing
+from dataclasses import dataclass
 from shutil import which
 import os
 import sys
-from typing import Dict
+from typing import AsyncIterator, Dict, Iterator
 import inquirer
+import pathspec
 
+from tig.services.executor import prompt_lock, run_in_thread
+from tig.services.file_index import get_file_index
+from tig.services.trigram_index import REGEX_QUERIES_SUPPORTED, get_trigram_index
+from tig.services.tracing import KIND_APPROVAL, trace_span
+from tig.services.workspace import get_workspace_generation
 
-def exec_ripgrep(rg_args: list[str]):
+
+# Number of files whose matches are shown with context
+MAX_RESULTS = 7
+# Size budget of the formatted results shown with context
+MAX_RESULT_BYTES = 32 * 1024
+# Longest line shown, like rg's --max-columns
+MAX_LINE_COLUMNS = 400
+# Number of files listed with only their match counts
+MAX_COUNTED_FILES = 30
+# ripgrep is stopped once either budget is exhausted
+MAX_TOTAL_MATCHES = 10_000
+MAX_RG_OUTPUT_BYTES = 16 * 1024 * 1024
+# Number of formatted search results kept in memory
+SEARCH_CACHE_SIZE = 64
+
+# (directory, regex, file_pattern, backend, file index and workspace generations) -> formatted results
+_search_cache: OrderedDict[tuple, str] = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+
+def _search_cache_key(
+    directory_path: str, regex: str, file_pattern: str, use_trigram_index: bool
+) -> tuple | None:
     """
-    Executes the ripgrep command with given arguments and returns the stdout.
+    Returns the cache key of a search, or None if it must not be cached: only
+    changes to the indexed workspace files are noticed, the file contents
+    only with inotify.
+    """
+    file_index = get_file_index()
+    file_index.refresh()
+    if (
+        file_index.relative_path(directory_path) is None
+        or file_index.changed_paths_since(file_index.generation) is None
+    ):
+        return None
+    return (
+        os.path.abspath(directory_path),
+        regex,
+        file_pattern,
+        use_trigram_index,
+        file_index.generation,
+        get_workspace_generation(),
+    )
+
+
+def _get_cached_search(key: tuple | None) -> str | None:
+    if key is None:
+        return None
+    with _search_cache_lock:
+        result = _search_cache.get(key)
+        if result is not None:
+            _search_cache.move_to_end(key)
+        return result
+
+
+def _cache_search(key: tuple | None, result: str):
+    if key is None:
+        return
+    with _search_cache_lock:
+        _search_cache[key] = result
+        _search_cache.move_to_end(key)
+        while len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+
+
+class RipgrepError(Exception):
+    pass
+
+
+def exec_ripgrep(rg_args: list[str]) -> Iterator[bytes]:
+    """
+    Executes ripgrep with given arguments and yields its stdout line by line.
+
+    ripgrep is terminated as soon as the caller stops iterating (or closes the
+    generator), so a consumer that has seen enough does not pay for the rest
+    of the search.
 
     Args:
         rg_args: A list of strings representing the command and its arguments.
 
-    Returns:
-        The subprocess result object containing stdout, stderr, and return code.
+    Yields:
+        Raw stdout lines. After stdout is exhausted, raises RipgrepError if
+        ripgrep failed (exit code 2 or more).
 
     Raises:
         FileNotFoundError: If the 'rg' command is not found.
-        subprocess.CalledProcessError: If ripgrep returns a non-zero exit code.
-        Exception: For other potential subprocess errors.
+        RipgrepError: If ripgrep exits with an error.
     """
     command = ["rg"] + rg_args
     # print(f"Executing: {' '.join(command)}", file=sys.stderr)  # Optional: for debugging
 
-    result = subprocess.run(
+    process = subprocess.Popen(
         command,
-        capture_output=True,
-        text=True,
-        encoding="utf-8",
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    # Drained concurrently, so that a chatty stderr cannot block ripgrep
+    stderr_chunks: list[bytes] = []
+    stderr_thread = threading.Thread(
+        target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True
     )
-    return result
+    stderr_thread.start()
+    finished = False
+    try:
+        for line in process.stdout:
+            yield line
+        finished = True
+    finally:
+        if not finished:
+            process.kill()
+        process.stdout.close()
+        returncode = process.wait()
+        stderr_thread.join()
+        process.stderr.close()
+    stderr = b"".join(stderr_chunks).decode("utf-8", errors="replace")
+    if returncode >= 2:
+        raise RipgrepError(stderr.strip())
 
 
-def regex_search_files(
-    arguments: Dict,
-    auto_approve: bool = False,
-) -> str:
+async def aexec_ripgrep(rg_args: list[str]) -> AsyncIterator[bytes]:
     """
-    Performs regex searches on files using ripgrep and formats the results.
+    Async version of exec_ripgrep, running ripgrep with
+    asyncio.create_subprocess_exec. ripgrep is killed if the caller closes the
+    generator early.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "rg",
+        *rg_args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        # A single JSON event holds a whole (possibly very long) line
+        limit=MAX_RG_OUTPUT_BYTES,
+    )
+    # Drained concurrently, so that a chatty stderr cannot block ripgrep
+    stderr_task = asyncio.create_task(process.stderr.read())
+    finished = False
+    try:
+        async for line in process.stdout:
+            yield line
+        finished = True
+    finally:
+        if not finished and process.returncode is None:
+            process.kill()
+        returncode = await process.wait()
+        stderr = (await stderr_task).decode("utf-8", errors="replace")
+    if returncode >= 2:
+        raise RipgrepError(stderr.strip())
+
+
+def _rg_text(data: dict) -> str:
+    """Decodes a ripgrep JSON 'arbitrary data' object ({"text": ...} or {"bytes": ...})."""
+    if "text" in data:
+        return data["text"]
+    return base64.b64decode(data["bytes"]).decode("utf-8", errors="replace")
+
+
+def _format_line(is_match: bool, line_number: int, text: str) -> str:
+    text = text.rstrip("\r\n")
+    if len(text) > MAX_LINE_COLUMNS:
+        text = text[:MAX_LINE_COLUMNS] + " [... omitted end of long line]"
+    separator = "-| " if is_match else " | "
+    return f"{line_number}{separator}{text}"
+
+
+class SearchResults:
+    """
+    Collects search results (from `rg --json` output or the in-process search)
+    and keeps what is shown to the model: the first MAX_RESULTS files with
+    their context lines, within MAX_RESULT_BYTES, and only match counts for
+    the rest.
+    """
+
+    def __init__(self):
+        self.blocks: list[str] = []
+        self.counted_files: dict[str, int] = {}
+        self.total_matches = 0
+        self.bytes_read = 0
+        self.stopped_early = False
+        self._result_bytes = 0
+        self._path: str | None = None
+        self._lines: list[str] | None = None
+        self._last_line_number = 0
+
+    def budget_exhausted(self) -> bool:
+        return (
+            self.total_matches >= MAX_TOTAL_MATCHES
+            or self.bytes_read >= MAX_RG_OUTPUT_BYTES
+        )
+
+    def _showing_more_files(self) -> bool:
+        return len(self.blocks) < MAX_RESULTS and self._result_bytes < MAX_RESULT_BYTES
+
+    def begin_file(self, path: str):
+        self._path = path
+        if self._showing_more_files():
+            self._lines = []
+            self._last_line_number = 0
+
+    def wants_context(self) -> bool:
+        """Whether context lines of the current file are still shown."""
+        return self._lines is not None
+
+    def add_line(self, is_match: bool, line_number: int, text: str):
+        if is_match:
+            self.total_matches += 1
+            if self._lines is None:
+                self.counted_files[self._path] = self.counted_files.get(self._path, 0) + 1
+                return
+        elif self._lines is None:
+            return
+        if self._last_line_number and line_number > self._last_line_number + 1:
+            self._lines.append("-----")
+        self._last_line_number = line_number
+        line = _format_line(is_match, line_number, text)
+        self._lines.append(line)
+        self._result_bytes += len(line) + 1
+        if self._result_bytes >= MAX_RESULT_BYTES:
+            self._lines.append("... (more matches in this file not shown)")
+            self._close_block()
+
+    def end_file(self):
+        self._close_block()
+
+    def feed(self, raw_line: bytes):
+        """Consumes one line of `rg --json` output."""
+        self.bytes_read += len(raw_line)
+        # Once the shown results are full, only count: skip decoding context lines
+        if self._lines is None and not raw_line.startswith(
+            (b'{"type":"begin"', b'{"type":"match"')
+        ):
+            return
+        event = json.loads(raw_line)
+        event_type = event["type"]
+        data = event["data"]
+        if event_type == "begin":
+            self.begin_file(_rg_text(data["path"]))
+        elif event_type in ("match", "context"):
+            self.add_line(
+                event_type == "match", data["line_number"], _rg_text(data["lines"])
+            )
+        elif event_type == "end":
+            self.end_file()
+
+    def _close_block(self):
+        if self._lines is not None:
+            self.blocks.append(f"{self._path}\n" + "\n".join(self._lines))
+            self._lines = None
+
+    def format(self) -> str:
+        self._close_block()
+        formatted_matches = "\n\n".join(["# " + block for block in self.blocks])
+        if self.counted_files:
+            counted = sorted(self.counted_files.items(), key=lambda item: -item[1])
+            formatted_matches += "\n\nMatches not shown (path: number of matches):\n"
+            formatted_matches += "\n".join(
+                f"{path}: {count}" for path, count in counted[:MAX_COUNTED_FILES]
+            )
+            if len(counted) > MAX_COUNTED_FILES:
+                formatted_matches += (
+                    f"\n... and {len(counted) - MAX_COUNTED_FILES} more files"
+                )
+        if self.stopped_early:
+            formatted_matches += f"\n\n(Search stopped after {self.total_matches} matches. Use a more specific regex, file_pattern or path to narrow it down.)"
+        return formatted_matches
 
-    Args:
-        arguments: A dictionary containing:
-            path: The directory to search within.
-            regex: The regular expression pattern (Rust syntax) to search for.
-            file_pattern: An optional glob pattern to filter files (default: '*').
-        auto_approve: If True, automatically approve the tool call.
+
+def search_with_trigram_index(
+    directory_path: str, regex: str, file_pattern: str, results: SearchResults
+) -> bool:
+    """
+    Searches the workspace files below directory_path in-process, using the
+    trigram index to skip files that cannot match, and feeds the matches into
+    `results` in the same shape as ripgrep would.
 
     Returns:
-        A formatted string containing search results with context, or an empty
-        string if no matches are found or an error occurs during execution
-        that is handled (like rg not found or no matches exit code).
+        False if directory_path is outside the indexed workspace.
+
+    Raises:
+        re.error: If the regex is not valid Python regex syntax.
     """
+    file_index = get_file_index()
+    workspace_files = file_index.files_under(file_index.root)
+    rel_dir = file_index.relative_path(directory_path)
+    if workspace_files is None or rel_dir is None:
+        return False
+    pattern = re.compile(regex)
+    glob_spec = (
+        pathspec.PathSpec.from_lines("gitwildmatch", [file_pattern])
+        if file_pattern != "*"
+        else None
+    )
+    prefix = rel_dir + "/" if rel_dir else ""
+    rel_paths = sorted(
+        rel_path
+        for rel_path in workspace_files
+        if rel_path.startswith(prefix)
+        # Like ripgrep, skip hidden files by default
+        and not os.path.basename(rel_path).startswith(".")
+        and (glob_spec is None or glob_spec.match_file(rel_path[len(prefix) :]))
+    )
+    trigram_index = get_trigram_index(file_index.root)
+    if trigram_index.update(file_index):
+        candidates = trigram_index.candidates(rel_paths, regex)
+    else:
+        # The index is still being built, so every file has to be read
+        candidates = rel_paths
+    for rel_path in candidates:
+        try:
+            with open(os.path.join(file_index.root, rel_path), "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        if b"\0" in data[:8192]:
+            # Like ripgrep, skip binary files
+            continue
+        lines = data.decode("utf-8", errors="replace").splitlines()
+        match_lines = [i for i, line in enumerate(lines) if pattern.search(line)]
+        if not match_lines:
+            continue
+        results.begin_file(os.path.join(directory_path, rel_path[len(prefix) :]))
+        context_lines = 2 if results.wants_context() else 0
+        shown: list[int] = []
+        for i in match_lines:
+            start = max(i - context_lines, shown[-1] + 1 if shown else 0)
+            shown.extend(range(start, min(len(lines), i + context_lines + 1)))
+        match_set = set(match_lines)
+        for i in shown:
+            results.add_line(i in match_set, i + 1, lines[i])
+            if results.budget_exhausted():
+                results.stopped_early = True
+                break
+        results.end_file()
+        if results.stopped_early:
+            break
+    return True
+
+
+@dataclass
+class _RipgrepSearch:
+    regex: str
+    directory_path: str
+    file_pattern: str
+    rg_args: list[str]
+    cache_key: tuple | None
+
+    def error(self, e: Exception) -> str:
+        if isinstance(e, RipgrepError):
+            return f"Error using search_files tool for '{self.regex}' in directory: \"{self.directory_path}\" with file_pattern '{self.file_pattern}': {str(e)}"
+        return f"Error using search_files tool for '{self.regex}' in {self.directory_path} with file_pattern '{self.file_pattern}': {str(e)}"
+
+    def finish(self, results: SearchResults) -> str:
+        formatted_results = format_search_results(
+            self.regex, self.directory_path, self.file_pattern, results
+        )
+        _cache_search(self.cache_key, formatted_results)
+        return formatted_results
 
-    if which("rg") is None:
-        return "Error: 'rg' command not found. 'rg' is required for search_files tool. Please ensure ripgrep is installed and in your PATH."
 
+def _prepare_search(arguments: Dict, auto_approve: bool) -> str | _RipgrepSearch:
+    """
+    Validates and approves a search, and answers it from the cache or with the
+    trigram index when possible. Returns either the tool result, or the
+    ripgrep search that is left to run.
+    """
     if "path" not in arguments:
         return "Error: 'path' argument is required for search_files tool."
     directory_path = arguments["path"]
@@ -79,26 +407,45 @@ def regex_search_files(
                 default=True,
             ),
         ]
-        answers = inquirer.prompt(questions)
+        with prompt_lock, trace_span("approval", KIND_APPROVAL):
+            answers = inquirer.prompt(questions)
         if answers and not answers["confirm"]:
             return f"Error: User denied permission to read contents from '{directory_path}' while using search_files tool. Try to complete your task without reading these contents."
 
+    # Without the regex parser the index cannot narrow a search down, ripgrep is then faster
+    use_trigram_index = which("rg") is None or (
+        REGEX_QUERIES_SUPPORTED
+        and os.getenv("TIG_SEARCH_INDEX", "false").strip().lower() == "true"
+    )
+    # Identical searches are answered from the cache until the workspace changes
+    cache_key = _search_cache_key(
+        directory_path, arguments["regex"], file_pattern, use_trigram_index
+    )
+    cached_result = _get_cached_search(cache_key)
+    if cached_result is not None:
+        return cached_result
+
+    if use_trigram_index:
+        results = SearchResults()
+        try:
+            searched = search_with_trigram_index(
+                directory_path, arguments["regex"], file_pattern, results
+            )
+        except re.error as e:
+            return f"Error using search_files tool for '{arguments['regex']}' in directory: \"{directory_path}\" with file_pattern '{file_pattern}': invalid regex: {str(e)}"
+        if not searched and which("rg") is None:
+            return "Error: 'rg' command not found. 'rg' is required for search_files tool outside of the current workspace. Please ensure ripgrep is installed and in your PATH."
+        if searched:
+            formatted_results = format_search_results(
+                arguments["regex"], directory_path, file_pattern, results
+            )
+            _cache_search(cache_key, formatted_results)
+            return formatted_results
+
     rg_args = [
+        "--json",
         "--context",
         "2",  # 2 lines before and after
-        "--context-separator",
-        "-----",  # Custom separator
-        "--heading",  # Don't print file names above matches initially
-        "--line-number",  # Include line numbers for context (we'll strip later if needed)
-        "--color",
-        "never",  # Disable color codes in output for easier parsing
-        "--field-context-separator",
-        " | ",
-        "--field-match-separator",
-        "-| ",
-        "--max-columns",
-        "400",
-        "--max-columns-preview",
         "-g",
         "!node_modules/**",
         "-g",
@@ -126,23 +473,81 @@ def regex_search_files(
 
     # Add the regex pattern and the directory path
     rg_args.append(directory_path)
+    return _RipgrepSearch(
+        arguments["regex"], directory_path, file_pattern, rg_args, cache_key
+    )
+
 
+def regex_search_files(
+    arguments: Dict,
+    auto_approve: bool = False,
+) -> str:
+    """
+    Performs regex searches on files using ripgrep and formats the results.
+    When ripgrep is not installed, or TIG_SEARCH_INDEX=true is set, files in
+    the workspace are searched in-process with the help of a trigram index.
+
+    Args:
+        arguments: A dictionary containing:
+            path: The directory to search within.
+            regex: The regular expression pattern (Rust syntax) to search for.
+            file_pattern: An optional glob pattern to filter files (default: '*').
+        auto_approve: If True, automatically approve the tool call.
+
+    Returns:
+        A formatted string containing search results with context, or an empty
+        string if no matches are found or an error occurs during execution
+        that is handled (like rg not found or no matches exit code).
+    """
+    search = _prepare_search(arguments, auto_approve)
+    if isinstance(search, str):
+        return search
+    results = SearchResults()
     try:
-        result = exec_ripgrep(rg_args)
-        if result and result.returncode == 0:
-            raw_output = result.stdout
-        elif result and result.returncode == 1 and not result.stderr:
-            return f"[search_files for '{arguments['regex']}' in directory: \"{directory_path}\" with file_pattern '{file_pattern}']\nNo matches found."
-        else:
-            return f"Error using search_files tool for '{arguments['regex']}' in directory: \"{directory_path}\" with file_pattern '{file_pattern}': {result.stderr.strip()}"
-    except (FileNotFoundError, subprocess.CalledProcessError, Exception) as e:
-        return f"Error using search_files tool for '{arguments['regex']}' in {directory_path} with file_pattern '{file_pattern}': {str(e)}"
+        rg_output = exec_ripgrep(search.rg_args)
+        try:
+            for raw_line in rg_output:
+                results.feed(raw_line)
+                if results.budget_exhausted():
+                    results.stopped_early = True
+                    break
+        finally:
+            # Stops ripgrep if it is still running
+            rg_output.close()
+    except Exception as e:
+        return search.error(e)
+    return search.finish(results)
 
-    if not raw_output.strip():
-        return f"[search_files for '{arguments['regex']}' in directory: \"{directory_path}\" with file_pattern '{file_pattern}']\nNo matches found."
 
-    MAX_RESULTS = 7
-    output_lines = raw_output.strip().split("\n\n")[:MAX_RESULTS]
+async def aregex_search_files(
+    arguments: Dict,
+    auto_approve: bool = False,
+) -> str:
+    """
+    Async version of regex_search_files: ripgrep runs as an asyncio subprocess
+    and the rest (approval, cache, in-process search) in the tool thread pool.
+    """
+    search = await run_in_thread(_prepare_search, arguments, auto_approve)
+    if isinstance(search, str):
+        return search
+    results = SearchResults()
+    try:
+        async with aclosing(aexec_ripgrep(search.rg_args)) as rg_output:
+            async for raw_line in rg_output:
+                results.feed(raw_line)
+                if results.budget_exhausted():
+                    results.stopped_early = True
+                    break
+    except Exception as e:
+        return search.error(e)
+    return search.finish(results)
+
+
+def format_search_results(
+    regex: str, directory_path: str, file_pattern: str, results: SearchResults
+) -> str:
+    if results.total_matches == 0:
+        return f"[search_files for '{regex}' in directory: \"{directory_path}\" with file_pattern '{file_pattern}']\nNo matches found."
 
-    formatted_matches = "\n\n".join(["# " + result for result in output_lines])
-    return f"[search_files for '{arguments['regex']}' in directory: \"{directory_path}\" with file_pattern '{file_pattern}']\nResults:\n\n{formatted_matches}\n"
+    formatted_matches = results.format()
+    return f"[search_files for '{regex}' in directory: \"{directory_path}\" with file_pattern '{file_pattern}']\nResults:\n\n{formatted_matches}\n"
@@ -1,6 +1,9 @@
 import os
 import inquirer
 
+from tig.services.executor import prompt_lock, run_in_thread
+from tig.services.workspace import bump_workspace_generation
+from tig.services.tracing import KIND_APPROVAL, trace_span
 from tig.utils.syntax_checker import check_syntax
 
 
@@ -45,7 +48,8 @@ def write_to_file(arguments: dict, mode: str, auto_approve: bool = False) -> str
                 default=True,
             ),
         ]
-        answers = inquirer.prompt(questions)
+        with prompt_lock, trace_span("approval", KIND_APPROVAL):
+            answers = inquirer.prompt(questions)
         if answers and not answers["confirm"]:
             feedback = input(
                 "Instruct Tig on what to do instead as you have rejected the changes: "
@@ -54,4 +58,10 @@ def write_to_file(arguments: dict, mode: str, auto_approve: bool = False) -> str
     os.makedirs(os.path.dirname(absolute_file_path), exist_ok=True)
     with open(absolute_file_path, "w") as f:
         f.write(content)
+    bump_workspace_generation()
     return f"[write_to_file for '{file_path}'] Result:\nThe content was successfully written to '{file_path}'.\n"
+
+
+async def awrite_to_file(arguments: dict, mode: str, auto_approve: bool = False) -> str:
+    """Async version of write_to_file, run in the tool thread pool."""
+    return await run_in_thread(write_to_file, arguments, mode, auto_approve)
@@ -16,5 +16,5 @@ def print_intro(
             f"\n{ANSI_RED}[IMPORTANT!]{ANSI_RESET} Auto-approve mode is enabled. All actions will be executed without confirmation."
         )
     print(
-        "\nGive Tig a task to do. Type '/exit' to quit, '/mode <mode_name>' to switch modes.\n"
+        "\nGive Tig a task to do. Type '/exit' to quit, '/mode <mode_name>' to switch modes, '/usage' to show the session's token usage.\n"
     )
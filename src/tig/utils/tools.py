@@ -57,4 +57,22 @@ TOOL_PARAM_NAMES = [
     "ignore_case",
     "start_line",
     "end_line",
+    "file",
 ]
+
+
+# Parameters that wrap a nested block of parameters and may be repeated,
+# e.g. one <file> block per file in a batched read_file call
+NESTED_PARAM_NAMES = ["file"]
+
+
+# Tools without side effects: several of them can be called in one response,
+# and are then run concurrently
+READ_ONLY_TOOL_NAMES = [
+    "read_file",
+    "search_files",
+    "list_files",
+    "list_code_definition_names",
+]
+# Most read-only tool calls run from a single response
+MAX_PARALLEL_TOOL_CALLS = 8
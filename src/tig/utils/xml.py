@@ -1,7 +1,24 @@
-from tig.utils.tools import TOOL_NAMES, TOOL_PARAM_NAMES
+import re
 
+from tig.utils.tools import (
+    NESTED_PARAM_NAMES,
+    MAX_PARALLEL_TOOL_CALLS,
+    READ_ONLY_TOOL_NAMES,
+    TOOL_NAMES,
+    TOOL_PARAM_NAMES,
+)
 
-def parse_tool_call(assistant_message: str) -> dict[str, dict[str, str]]:
+# Matches the opening tag of any known parameter, e.g. "<path>"
+_PARAM_OPENING_TAG = re.compile(
+    "<(" + "|".join(re.escape(name) for name in dict.fromkeys(TOOL_PARAM_NAMES)) + ")>"
+)
+# Matches the opening tag of any known tool, e.g. "<read_file>"
+_TOOL_OPENING_TAG = re.compile(
+    "<(" + "|".join(re.escape(name) for name in TOOL_NAMES) + ")>"
+)
+
+
+def parse_tool_call(assistant_message: str) -> dict[str, dict[str, str | list]]:
     """
     Parses an assistant message string assumed to contain at most one
     XML-like tool call block.
@@ -15,13 +32,13 @@ def parse_tool_call(assistant_message: str) -> dict[str, dict[str, str]]:
         A Dictionary containing:
         - Key: The name of the tool called (str)
         - value: A dictionary of parameters (dict[str, str]), where keys are parameter
-          names and values are the extracted string values. Empty if no tool found
-          or no parameters present.
+          names and values are the extracted string values (or a list of parameter
+          dictionaries for nested parameters such as read_file's <file>). Empty if
+          no tool found or no parameters present.
     """
     found_tool_name: str | None = None
     tool_body_start_index: int = -1
     tool_body_end_index: int = -1
-    params: dict[str, str] = {}
 
     # 1. Find the first complete tool call block <tool_name>...</tool_name>
     for name in TOOL_NAMES:
@@ -51,52 +68,302 @@ def parse_tool_call(assistant_message: str) -> dict[str, dict[str, str]]:
     tool_body = assistant_message[tool_body_start_index:tool_body_end_index]
 
     # 4. Parse parameters within the tool body
+    return {found_tool_name: _parse_params(found_tool_name, tool_body)}
+
+
+def parse_tool_calls(assistant_message: str) -> list[dict[str, dict[str, str | list]]]:
+    """
+    Parses every complete tool call block of an assistant message, in the
+    order they appear, each in the format returned by parse_tool_call. An
+    opening tag without its closing tag is skipped.
+    """
+    tool_calls = []
+    current_pos = 0
+    while True:
+        match = _TOOL_OPENING_TAG.search(assistant_message, current_pos)
+        if match is None:
+            break
+        tool_name = match.group(1)
+        closing_tag = f"</{tool_name}>"
+        end_index = assistant_message.find(closing_tag, match.end())
+        if end_index == -1:
+            current_pos = match.end()
+            continue
+        tool_body = assistant_message[match.end() : end_index]
+        tool_calls.append({tool_name: _parse_params(tool_name, tool_body)})
+        current_pos = end_index + len(closing_tag)
+    return tool_calls
+
+
+def _parse_params(tool_name: str, tool_body: str) -> dict[str, str | list]:
+    """
+    Parses the parameters of a tool body in a single pass, jumping from one
+    parameter tag to the next with a compiled regex. Nested parameters (see
+    NESTED_PARAM_NAMES) are parsed recursively and collected in a list of
+    parameter dictionaries, one per occurrence.
+    """
+    params: dict[str, str | list] = {}
+    # Parameters with no closing tag left, so that repeated unclosed tags do not
+    # rescan the rest of the body every time
+    unclosed: set[str] = set()
     current_pos = 0
-    while current_pos < len(tool_body):
-        found_param_in_iteration = False
-        # Check if any known parameter tag starts at the current position
-        for param_name in TOOL_PARAM_NAMES:
-            param_opening_tag = f"<{param_name}>"
-            if tool_body[current_pos:].startswith(param_opening_tag):
-                param_value_start_index = current_pos + len(param_opening_tag)
-                param_closing_tag = f"</{param_name}>"
-
-                param_value_end_index = -1
-                # --- Special Case: write_to_file content ---
-                # Handle potential closing tags within the content itself
-                if found_tool_name == "write_to_file" and param_name == "content":
-                    # Find the *last* occurrence of the closing tag within the tool body,
-                    # starting the search *after* the opening tag.
-                    param_value_end_index = tool_body.rfind(
-                        param_closing_tag, param_value_start_index
-                    )
-                else:
-                    # Standard Case: Find the *first* closing tag after the opening tag.
-                    param_value_end_index = tool_body.find(
-                        param_closing_tag, param_value_start_index
-                    )
-
-                # If a valid closing tag was found for this parameter
-                if param_value_end_index != -1:
-                    param_value = tool_body[
-                        param_value_start_index:param_value_end_index
-                    ].strip()
-                    params[param_name] = param_value
-
-                    # Move current_pos past the entire parameter block
-                    current_pos = param_value_end_index + len(param_closing_tag)
-                    found_param_in_iteration = True
-                    break  # Found a param, restart search for the next param from the new position
-                else:
-                    # Found an opening tag but no closing tag before the end of the tool body.
-                    # This might indicate a truncated message or invalid XML.
-                    # We'll skip this broken param and continue searching after its opening tag.
-                    current_pos = param_value_start_index
-                    found_param_in_iteration = True
-                    break  # Skip the broken param opening tag
-
-        # If no parameter tag started at current_pos, advance by one character
-        if not found_param_in_iteration:
-            current_pos += 1
-
-    return {found_tool_name: params}
+    while True:
+        # Jump straight to the next known parameter opening tag
+        match = _PARAM_OPENING_TAG.search(tool_body, current_pos)
+        if match is None:
+            break
+        param_name = match.group(1)
+        param_value_start_index = match.end()
+        param_closing_tag = f"</{param_name}>"
+
+        # --- Special Case: write_to_file content ---
+        # Handle potential closing tags within the content itself
+        if param_name in unclosed:
+            param_value_end_index = -1
+        elif tool_name == "write_to_file" and param_name == "content":
+            # Find the *last* occurrence of the closing tag within the tool body,
+            # starting the search *after* the opening tag.
+            param_value_end_index = tool_body.rfind(
+                param_closing_tag, param_value_start_index
+            )
+        else:
+            # Standard Case: Find the *first* closing tag after the opening tag.
+            param_value_end_index = tool_body.find(
+                param_closing_tag, param_value_start_index
+            )
+
+        if param_value_end_index == -1:
+            # Found an opening tag but no closing tag before the end of the tool body.
+            # This might indicate a truncated message or invalid XML.
+            # We'll skip this broken param and continue searching after its opening tag.
+            unclosed.add(param_name)
+            current_pos = param_value_start_index
+            continue
+
+        param_value = tool_body[param_value_start_index:param_value_end_index].strip()
+        if param_name in NESTED_PARAM_NAMES:
+            params.setdefault(param_name, []).append(
+                _parse_params(tool_name, param_value)
+            )
+        else:
+            params[param_name] = param_value
+        # Move current_pos past the entire parameter block
+        current_pos = param_value_end_index + len(param_closing_tag)
+    return params
+
+
+# Markup shown differently (or hidden) while a response is streamed,
+# mirroring the cleanup TigWorkflow.handle_response does on a full response
+THINKING_OPENING_TAG = "<thinking>"
+THINKING_CLOSING_TAG = "</thinking>"
+_HIDDEN_MARKUP = ("```xml",)
+# Every markup the stream parser stops at, and the longest of them
+_STREAM_MARKUP = (
+    THINKING_OPENING_TAG,
+    THINKING_CLOSING_TAG,
+    *_HIDDEN_MARKUP,
+    *(f"<{name}>" for name in TOOL_NAMES),
+)
+_MAX_MARKUP_LENGTH = max(len(markup) for markup in _STREAM_MARKUP)
+
+
+class ToolCallStreamParser:
+    """
+    Incremental counterpart of parse_tool_calls for streamed responses.
+
+    Text is fed in as it is generated. `feed()` returns the part of the new text
+    that can be shown to the user (everything outside of tool calls), holding
+    back only what could still turn out to be the start of a tag, and the
+    whitespace leading up to a tool call. Completed tool calls are collected
+    in `tool_calls`. Read-only tools (see READ_ONLY_TOOL_NAMES) may be followed
+    by more calls, but as soon as any other tool call is complete the parser is
+    `done`, and the rest of the generation can be skipped.
+
+    Only the text not yet decided on is kept in a working buffer, and searches
+    start where the previous one stopped, so the whole stream is parsed in
+    linear time.
+    """
+
+    def __init__(
+        self, thinking_header: str = "", thinking_footer: str = ""
+    ) -> None:
+        self.tool_calls: list[dict[str, dict[str, str | list]]] = []
+        self.done = False
+        self._thinking_header = thinking_header
+        self._thinking_footer = thinking_footer
+        # All the text fed in, joined on demand
+        self._chunks: list[str] = []
+        self._length = 0
+        # The end of the text from absolute position `_buffer_start` on
+        self._buffer = ""
+        self._buffer_start = 0
+        # Position up to which the text has been shown (or deliberately hidden)
+        self._display_pos = 0
+        # Displayable whitespace held back in case a tool call follows
+        self._held_whitespace = ""
+        # Name and body start of the tool call being received
+        self._tool_name: str | None = None
+        self._tool_body_start = -1
+        # Position from which to look for the tool's closing tag
+        self._closing_search_pos = 0
+
+    @property
+    def text(self) -> str:
+        """The text received so far, up to the end of the last tool call once `done`."""
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    @property
+    def tool_call(self) -> dict[str, dict[str, str | list]] | None:
+        """The first tool call of the response, once complete."""
+        return self.tool_calls[0] if self.tool_calls else None
+
+    def feed(self, delta: str) -> str:
+        """Adds generated text, returning the part of it that can be displayed now."""
+        if self.done:
+            return ""
+        self._chunks.append(delta)
+        self._length += len(delta)
+        self._buffer += delta
+        display = self._held_whitespace
+        while not self.done:
+            if self._tool_name is None:
+                display += self._advance_display()
+                if self._tool_name is None:
+                    break
+                # Otherwise it would show as blank lines, e.g. between batched calls
+                display = display.rstrip()
+            elif not self._find_tool_end():
+                break
+        self._trim_buffer()
+        shown = display.rstrip()
+        self._held_whitespace = display[len(shown) :]
+        return shown
+
+    def flush(self) -> str:
+        """Returns the held back text once the stream has ended."""
+        if self._tool_name is not None or self.done:
+            return ""
+        display = self._held_whitespace + self._slice(self._display_pos)
+        self._held_whitespace = ""
+        self._display_pos = self._length
+        self._trim_buffer()
+        return display
+
+    # --- working buffer, addressed with positions in the whole text ---------
+
+    def _find(self, sub: str, start: int) -> int:
+        index = self._buffer.find(sub, start - self._buffer_start)
+        return -1 if index == -1 else index + self._buffer_start
+
+    def _startswith(self, prefix: str, start: int) -> bool:
+        return self._buffer.startswith(prefix, start - self._buffer_start)
+
+    def _slice(self, start: int, end: int | None = None) -> str:
+        offset = self._buffer_start
+        return self._buffer[start - offset : None if end is None else end - offset]
+
+    def _trim_buffer(self):
+        """Drops the text that no longer needs to be searched."""
+        if self._tool_name is None:
+            keep_from = self._display_pos
+        else:
+            keep_from = self._closing_search_pos
+        if keep_from > self._buffer_start:
+            self._buffer = self._slice(keep_from)
+            self._buffer_start = keep_from
+
+    def _advance_display(self) -> str:
+        parts = []
+        # Next occurrences of the characters markup starts with (-1 if none),
+        # searched again only once passed
+        tag_start: int | None = None
+        fence_start: int | None = None
+        while True:
+            if tag_start is None or -1 < tag_start < self._display_pos:
+                tag_start = self._find("<", self._display_pos)
+            if fence_start is None or -1 < fence_start < self._display_pos:
+                fence_start = self._find("`", self._display_pos)
+            candidates = [pos for pos in (tag_start, fence_start) if pos != -1]
+            if not candidates:
+                parts.append(self._slice(self._display_pos))
+                self._display_pos = self._length
+                break
+            markup_start = min(candidates)
+            parts.append(self._slice(self._display_pos, markup_start))
+            self._display_pos = markup_start
+            if self._startswith(THINKING_OPENING_TAG, markup_start):
+                parts.append(self._thinking_header)
+                self._display_pos += len(THINKING_OPENING_TAG)
+                continue
+            if self._startswith(THINKING_CLOSING_TAG, markup_start):
+                parts.append(self._thinking_footer)
+                self._display_pos += len(THINKING_CLOSING_TAG)
+                continue
+            hidden = next(
+                (m for m in _HIDDEN_MARKUP if self._startswith(m, markup_start)),
+                None,
+            )
+            if hidden is not None:
+                self._display_pos += len(hidden)
+                continue
+            tool_name = next(
+                (
+                    name
+                    for name in TOOL_NAMES
+                    if self._startswith(f"<{name}>", markup_start)
+                ),
+                None,
+            )
+            if tool_name is not None:
+                # Everything from here on is the tool call, which is not displayed
+                self._tool_name = tool_name
+                self._tool_body_start = markup_start + len(tool_name) + 2
+                self._closing_search_pos = self._tool_body_start
+                self._display_pos = self._length
+                break
+            if self._could_be_markup(
+                self._slice(markup_start, markup_start + _MAX_MARKUP_LENGTH)
+            ):
+                # Wait for more text to decide
+                break
+            parts.append(self._slice(markup_start, markup_start + 1))
+            self._display_pos += 1
+        return "".join(parts)
+
+    @staticmethod
+    def _could_be_markup(rest: str) -> bool:
+        # `rest` is cut at the longest markup, so a longer text never matches
+        return any(
+            len(rest) < len(markup) and markup.startswith(rest)
+            for markup in _STREAM_MARKUP
+        )
+
+    def _find_tool_end(self) -> bool:
+        """Looks for the closing tag of the current tool call, returning whether it was found."""
+        tool_name = self._tool_name
+        closing_tag = f"</{tool_name}>"
+        end_index = self._find(closing_tag, self._closing_search_pos)
+        if end_index == -1:
+            # The closing tag may be split across deltas
+            self._closing_search_pos = max(
+                self._tool_body_start, self._length - len(closing_tag) + 1
+            )
+            return False
+        tool_end = end_index + len(closing_tag)
+        # The body has mostly been trimmed from the buffer, so it is cut from the whole text
+        self.tool_calls.append(
+            {tool_name: _parse_params(tool_name, self.text[self._tool_body_start : end_index])}
+        )
+        self._tool_name = None
+        self._display_pos = tool_end
+        if (
+            tool_name not in READ_ONLY_TOOL_NAMES
+            or len(self.tool_calls) >= MAX_PARALLEL_TOOL_CALLS
+        ):
+            # Keep the text up to the end of the tool call, like the history would
+            self._chunks = [self.text[:tool_end]]
+            self._length = tool_end
+            self.done = True
+        return True
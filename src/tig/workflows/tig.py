@@ -1,4 +1,6 @@
+import asyncio
 import re
+import time
 from typing import Dict, List, Any
 
 from llama_index.core.llms.llm import LLM
@@ -12,18 +14,40 @@ from llama_index.core.workflow import (
     StopEvent,
 )
 from tig.modes import MODES
-from tig.utils.xml import parse_tool_call
-from tig.prompts.system import get_system_prompt
-from tig.prompts.environment import get_environment_reminder_prompt
+from tig.utils.tools import MAX_PARALLEL_TOOL_CALLS, READ_ONLY_TOOL_NAMES
+from tig.utils.xml import ToolCallStreamParser, parse_tool_calls
+from tig.prompts.system import get_system_prompt_blocks
+from tig.prompts.environment import EnvironmentReminder
+from tig.services.context import ContextCompactor
+from tig.services.llms import (
+    TokenUsage,
+    copy_messages,
+    get_token_usage,
+    mark_cache_breakpoints,
+)
+from tig.services.replay import get_transcript_recorder
+from tig.services.tracing import (
+    KIND_LLM,
+    KIND_TOOL,
+    Tracer,
+    set_span_attributes,
+    trace_span,
+    traced_step,
+)
+from tig.services.usage import (
+    SessionUsage,
+    TaskUsage,
+    format_tool_outputs,
+)
 from tig.tools import (
-    list_files,
-    ask_followup_questions,
-    list_code_definitions,
-    read_file,
-    regex_search_files,
-    write_to_file,
-    apply_diff,
-    execute_command,
+    alist_files,
+    aask_followup_questions,
+    alist_code_definitions,
+    aread_file,
+    aregex_search_files,
+    awrite_to_file,
+    aapply_diff,
+    aexecute_command,
 )
 
 ANSI_GREEN = "\033[32m"
@@ -37,14 +61,24 @@ class NewTaskCreated(Event):
 class PromptGenerated(Event):
     prompt: str
     is_system_prompt: bool = False
+    # Part of the system prompt that changes from task to task, sent after the cacheable `prompt`
+    volatile_prompt: str = ""
+    # Tool whose output the prompt is, if any
+    tool_name: str = ""
 
 
 class LLMResponded(Event):
     response: str
+    # Whether the response was already printed while it was streamed
+    streamed: bool = False
 
 
 class ToolCallRequired(Event):
     tool: Dict
+    # Further read-only tool calls of the same response, run concurrently with `tool`
+    more_tools: List[Dict] = []
+    # Names of the tool calls of the response that are not run
+    skipped_tools: List[str] = []
 
 
 class TigWorkflow(Workflow):
@@ -53,53 +87,197 @@ class TigWorkflow(Workflow):
         *args: Any,
         llm: LLM,
         mode: str,
+        provider: str | None = None,
+        model: str | None = None,
         auto_approve: bool = False,
         verbose_prompt: bool = False,
+        stream: bool = False,
+        tracer: Tracer | None = None,
+        session_usage: SessionUsage | None = None,
         **kwargs: Any,
     ) -> None:
         super().__init__(*args, **kwargs)
         self.llm = llm
+        self.provider = provider
         if mode not in MODES:
             raise ValueError(f"Invalid mode: {mode}")
         self.mode = mode
         self.chat_history: List[ChatMessage] = []
         self.auto_approve = auto_approve
         self.verbose_prompt = verbose_prompt
+        self.stream = stream
+        self.compactor = ContextCompactor()
+        self.usage = TaskUsage(provider, model)
+        self.session_usage = session_usage
+        if session_usage is not None:
+            session_usage.add_task(self.usage)
+        self.recorder = get_transcript_recorder()
+        self.tracer = tracer
 
     @step
+    @traced_step
     async def start_new_task(self, ctx: Context, ev: StartEvent) -> NewTaskCreated:
         task = ev.get("task")
         await ctx.set("task", task)
         return NewTaskCreated()
 
     @step
+    @traced_step
     async def generate_system_prompt(
         self, ctx: Context, ev: NewTaskCreated
     ) -> PromptGenerated:
         task = await ctx.get("task")
-        system_prompt = get_system_prompt(self.mode, task)
-        return PromptGenerated(prompt=system_prompt, is_system_prompt=True)
+        static_prompt, volatile_prompt = get_system_prompt_blocks(self.mode, task)
+        self.environment_reminder = EnvironmentReminder(task)
+        return PromptGenerated(
+            prompt=static_prompt,
+            volatile_prompt=volatile_prompt,
+            is_system_prompt=True,
+        )
 
     @step
+    @traced_step
     async def prompt_llm(self, ctx: Context, ev: PromptGenerated) -> LLMResponded:
         prompt = ev.prompt
         if self.verbose_prompt:
-            print(prompt)
+            print(prompt + ev.volatile_prompt)
         if ev.is_system_prompt:
+            # Kept as separate messages so that the static part can be cached
             self.chat_history.append(ChatMessage(role="system", content=prompt))
+            if ev.volatile_prompt:
+                self.chat_history.append(
+                    ChatMessage(role="system", content=ev.volatile_prompt)
+                )
         else:
-            self.chat_history.append(
-                ChatMessage(
-                    role="user",
-                    content=prompt
-                    + get_environment_reminder_prompt(await ctx.get("task")),
+            message = ChatMessage(
+                role="user",
+                content=prompt + self.environment_reminder.next_prompt(),
+            )
+            self.chat_history.append(message)
+            if ev.tool_name:
+                self.usage.record_tool_output(ev.tool_name, message)
+        with trace_span("context.compact") as span:
+            saved = self.compactor.compact(self.chat_history)
+            if span is not None:
+                span.set(tokens_saved=saved, messages=len(self.chat_history))
+        mark_cache_breakpoints(self.chat_history, self.provider)
+        with trace_span("llm.chat", KIND_LLM, provider=self.provider, stream=self.stream) as span:
+            started_at = time.perf_counter()
+            if self.stream:
+                response_text, usage = await self.stream_llm_response()
+                self.chat_history.append(
+                    ChatMessage(role="assistant", content=response_text)
                 )
+                event = LLMResponded(response=response_text, streamed=True)
+            else:
+                response = await self.llm.achat(messages=copy_messages(self.chat_history))
+                self.chat_history.append(response.message)
+                response_text = response.message.content or ""
+                usage = get_token_usage(response.raw)
+                event = LLMResponded(response=str(response))
+            if span is not None:
+                span.set(
+                    generation_sec=time.perf_counter() - started_at,
+                    response_bytes=len(response_text.encode()),
+                )
+                if usage is not None:
+                    span.set(
+                        input_tokens=usage.input_tokens,
+                        output_tokens=usage.output_tokens,
+                        cached_input_tokens=usage.cached_input_tokens,
+                    )
+        self.report_token_usage(usage, response_text)
+        self.record_response(response_text, usage, started_at)
+        return event
+
+    def record_response(
+        self, response_text: str, usage: TokenUsage | None, started_at: float
+    ):
+        """Appends the LLM call to the transcript being recorded, if any (see TIG_RECORD_TRANSCRIPT)."""
+        if self.recorder is None:
+            return
+        self.recorder.record(
+            self.chat_history[:-1],
+            response_text,
+            usage,
+            time.perf_counter() - started_at,
+        )
+
+    def report_token_usage(self, usage: TokenUsage | None, response_text: str):
+        """Records the token usage and cost of an LLM call, showing how much of the prompt was cached."""
+        turn = self.usage.record_turn(usage, self.chat_history, response_text)
+        if self.session_usage is not None:
+            self.session_usage.record_turn(turn)
+        if self.verbose_prompt:
+            usage = turn.usage
+            cost = "" if turn.cost is None else f", ~${turn.cost:.4f}"
+            estimated = " (estimated)" if turn.estimated else ""
+            print(
+                f"\nTokens{estimated}: {usage.input_tokens} input ({usage.cached_input_tokens} read from cache, {usage.cache_write_tokens} written to cache), {usage.output_tokens} output{cost}\n"
             )
-        response = await self.llm.achat(messages=self.chat_history)
-        self.chat_history.append(response.message)
-        return LLMResponded(response=str(response))
+
+    def print_usage(self):
+        """Prints the token usage and cost of the task, and the tool outputs that took up the most context."""
+        if not self.usage.turns:
+            return
+        print(f"Task usage: {self.usage.totals.format()}")
+        largest = format_tool_outputs(self.usage.largest_tool_outputs())
+        if largest:
+            print(f"Largest tool outputs sent to the LLM:\n{largest}")
+        print()
+
+    async def stream_llm_response(self) -> tuple[str, TokenUsage | None]:
+        """
+        Streams the LLM response, printing the text outside of the tool call as it
+        arrives. Generation stops as soon as the tool call is complete, so the tool
+        can run without waiting for whatever the model would write after it.
+        """
+        parser = ToolCallStreamParser(
+            thinking_header="\n# Thought process" + "-" * 63 + "\n",
+            thinking_footer="\n" + "-" * 80 + "\n",
+        )
+        printed_any = False
+        usage: TokenUsage | None = None
+        started_at = time.perf_counter()
+        first_token_at: float | None = None
+
+        def show(text: str):
+            nonlocal printed_any
+            if not printed_any:
+                text = text.lstrip()
+                if not text:
+                    return
+                print(f"\n🐯 {ANSI_GREEN}Tig:{ANSI_RESET} ", end="")
+                printed_any = True
+            print(text, end="", flush=True)
+
+        stream = await self.llm.astream_chat(messages=copy_messages(self.chat_history))
+        try:
+            async for chunk in stream:
+                delta = chunk.delta or ""
+                if delta and first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    set_span_attributes(ttft_sec=first_token_at - started_at)
+                chunk_usage = get_token_usage(chunk.raw)
+                if chunk_usage is not None:
+                    usage = usage.merge(chunk_usage) if usage else chunk_usage
+                if self.verbose_prompt:
+                    print(delta, end="", flush=True)
+                    parser.feed(delta)
+                else:
+                    show(parser.feed(delta))
+                if parser.done:
+                    break
+        finally:
+            await stream.aclose()
+        if not self.verbose_prompt:
+            show(parser.flush().rstrip())
+        if printed_any or self.verbose_prompt:
+            print("\n")
+        return parser.text, usage
 
     @step
+    @traced_step
     async def handle_response(
         self, ev: LLMResponded
     ) -> ToolCallRequired | PromptGenerated:
@@ -126,57 +304,108 @@ class TigWorkflow(Workflow):
         clean_response = re.sub(
             r"<thinking>", "\n# Thought process" + "-" * 63 + "\n", clean_response
         )
-        if self.verbose_prompt:
+        if ev.streamed:
+            pass
+        elif self.verbose_prompt:
             print(f"\n{response}\n")
         else:
             if clean_response.strip():
                 print(f"\n🐯 {ANSI_GREEN}Tig:{ANSI_RESET} {clean_response}\n")
-        tool = parse_tool_call(response.strip())
-        if not tool:
+        tools = parse_tool_calls(response.strip())
+        if not tools:
             return PromptGenerated(
                 prompt="You did not use any tool, please use appropriate tool using valid tool format."
             )
-        return ToolCallRequired(tool=tool)
+        # A run of read-only tool calls is run together, any other tool on its own
+        run_count = 1
+        while (
+            run_count < min(len(tools), MAX_PARALLEL_TOOL_CALLS)
+            and list(tools[run_count - 1])[0] in READ_ONLY_TOOL_NAMES
+            and list(tools[run_count])[0] in READ_ONLY_TOOL_NAMES
+        ):
+            run_count += 1
+        return ToolCallRequired(
+            tool=tools[0],
+            more_tools=tools[1:run_count],
+            skipped_tools=[list(tool)[0] for tool in tools[run_count:]],
+        )
 
     @step
+    @traced_step
     async def use_tool(self, ev: ToolCallRequired) -> PromptGenerated | StopEvent:
-        tool_name = list(ev.tool.keys())[0]
-        tool_arguments = ev.tool[tool_name]
-        print(f"\n🛠️ Using tool: {tool_name}\n")
+        if not ev.more_tools:
+            result = await self.run_tool(ev.tool)
+        else:
+            tools = [ev.tool] + ev.more_tools
+            print(f"\n🛠️ Using tools: {', '.join(list(tool)[0] for tool in tools)}\n")
+            results = await asyncio.gather(
+                *(self.run_tool(tool, announce=False) for tool in tools)
+            )
+            # Read-only tools always answer with a prompt
+            result = PromptGenerated(
+                prompt="\n\n".join(result.prompt for result in results),
+                tool_name=", ".join(dict.fromkeys(result.tool_name for result in results)),
+            )
+        if ev.skipped_tools and isinstance(result, PromptGenerated):
+            result.prompt += f"\n\nThe following tools were not used, as only read-only tools ({', '.join(READ_ONLY_TOOL_NAMES)}) can be used together in one message, at most {MAX_PARALLEL_TOOL_CALLS} at a time: {', '.join(ev.skipped_tools)}. Use them again in a new message if they are still needed."
+        return result
+
+    async def run_tool(self, tool: Dict, announce: bool = True) -> PromptGenerated | StopEvent:
+        tool_name = list(tool.keys())[0]
+        tool_arguments = tool[tool_name]
+        if announce:
+            print(f"\n🛠️ Using tool: {tool_name}\n")
+        with trace_span(f"tool.{tool_name}", KIND_TOOL) as span:
+            result = await self.call_tool(tool_name, tool_arguments)
+            if isinstance(result, PromptGenerated):
+                result.tool_name = tool_name
+                if span is not None:
+                    span.set(bytes_returned=len(result.prompt.encode()))
+        return result
+
+    async def call_tool(
+        self, tool_name: str, tool_arguments: Dict
+    ) -> PromptGenerated | StopEvent:
         try:
             if tool_name == "list_files":
-                return PromptGenerated(prompt=list_files(tool_arguments))
+                return PromptGenerated(prompt=await alist_files(tool_arguments))
             elif tool_name == "ask_followup_question":
                 return PromptGenerated(
-                    prompt=ask_followup_questions(tool_arguments),
+                    prompt=await aask_followup_questions(tool_arguments),
                 )
             elif tool_name == "read_file":
                 return PromptGenerated(
-                    prompt=read_file(tool_arguments, self.auto_approve),
+                    prompt=await aread_file(tool_arguments, self.auto_approve),
                 )
             elif tool_name == "list_code_definition_names":
                 return PromptGenerated(
-                    prompt=list_code_definitions(tool_arguments, self.auto_approve),
+                    prompt=await alist_code_definitions(tool_arguments, self.auto_approve),
                 )
             elif tool_name == "search_files":
                 return PromptGenerated(
-                    prompt=regex_search_files(tool_arguments, self.auto_approve),
+                    prompt=await aregex_search_files(tool_arguments, self.auto_approve),
                 )
             elif tool_name == "write_to_file":
                 return PromptGenerated(
-                    prompt=write_to_file(tool_arguments, self.mode, self.auto_approve),
+                    prompt=await awrite_to_file(tool_arguments, self.mode, self.auto_approve),
                 )
             elif tool_name == "apply_diff":
                 return PromptGenerated(
-                    prompt=apply_diff(tool_arguments, self.mode, self.auto_approve),
+                    prompt=await aapply_diff(tool_arguments, self.mode, self.auto_approve),
                 )
             elif tool_name == "execute_command":
                 return PromptGenerated(
-                    prompt=execute_command(tool_arguments),
+                    prompt=await aexecute_command(tool_arguments),
                 )
             elif tool_name == "attempt_completion":
                 if "result" in tool_arguments:
                     print(f"\n{tool_arguments['result']}\n")
+                if self.verbose_prompt:
+                    reminder = self.environment_reminder
+                    print(
+                        f"Environment reminders: {reminder.reminders_sent} sent, ~{reminder.tokens_sent} tokens (~{reminder.tokens_saved} tokens saved over full reminders)\n"
+                    )
+                self.print_usage()
                 return StopEvent(message="Task completed successfully.")
             else:
                 return PromptGenerated(